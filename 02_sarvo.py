@@ -1,10 +1,12 @@
-from gpiozero import AngularServo
 from time import sleep
 
+from servo_client import open_servo
+
 # GPIO 18番ピン（物理ピン 12番）を使用。
 # SG90などのマイクロサーボ向けにパルス幅を設定しています。
-# servo = AngularServo(ピン番号, min_pulse_width=最小パルス幅, max_pulse_width=最大パルス幅)
-servo = AngularServo(18, min_pulse_width=0.0005, max_pulse_width=0.0024)
+# servo = open_servo(ピン番号, min_pulse_width=最小パルス幅, max_pulse_width=最大パルス幅)
+# servod (servo_daemon.py) が動いていればそちらのサーボを使い、無ければ AngularServo を作ります
+servo = open_servo(18, min_pulse_width=0.0005, max_pulse_width=0.0024)
 
 try:
     while True:
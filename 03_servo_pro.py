@@ -1,12 +1,13 @@
-from gpiozero import AngularServo
 from time import sleep  
 
-from gpiozero.pins.pigpio import PiGPIOFactory
-factory = PiGPIOFactory()
+from pin_factory import create_factory
+from servo_client import open_servo
 
-servo = AngularServo(18, min_pulse_width=0.5/1000,
-                      max_pulse_width=2.5/1000,
-                      pin_factory=factory)
+# servod (servo_daemon.py) が動いていればそちらのサーボを使い、
+# 無ければ pigpio Factory で AngularServo を作ります
+servo = open_servo(18, min_pulse_width=0.5/1000,
+                   max_pulse_width=2.5/1000,
+                   factory=create_factory)
 
 try:
     while True:
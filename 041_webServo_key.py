@@ -1,18 +1,125 @@
-from flask import Flask, render_template_string, request
-from gpiozero import AngularServo
-from gpiozero.pins.pigpio import PiGPIOFactory
+# 最初に import する (--profile-startup のとき、以降の import の時間を計測する)
+from startup import profile
+from flask import Flask, jsonify, render_template_string, request
+import argparse
 import os
 import sys
 
-# --- 初期設定 (前回と同じ) ---
+import servo_events
+import servo_protocol
+import servo_sequence
+import servo_udp
+from motion_log import record_servo
+from pin_factory import create_factory
+from control_loop import ControlLoop
+from servo_client import open_servo
+from servo_metrics import Registry, instrument_app, worker_gauges
+from servo_worker import ServoWorker
+from startup import HardwareNotReady, LazyInit, add_not_ready_handler
+
+# WebSocket はオプション (pip install flask-sock)。無ければ従来の POST のみで動きます。
 try:
-    factory = PiGPIOFactory()
-    servo = AngularServo(18, min_pulse_width=0.0005, max_pulse_width=0.0024, pin_factory=factory)
-except Exception as e:
-    print("エラー: 'sudo pigpiod' を実行してデーモンを起動してください。")
-    sys.exit(1)
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+profile.mark("import")
+
+MIN_ANGLE = -90
+MAX_ANGLE = 90
+
+# --- 初期設定 (前回と同じ) ---
+# サーボ・書き込みワーカー・シーケンスは set_worker() で入る (--lazy-init ではバックグラウンドで初期化)
+servo = None
+worker = None
+sequences = None
+hardware = None
+# --control-loop のときの ControlLoop の引数 (None なら ServoWorker)
+control_loop_options = None
+# GET /events で角度の変化を全ブラウザへ配る
+events = servo_events.StateBroadcaster(lambda: {"angle": require_worker().angle(0), "ready": True})
+# --udp-port のときの UDP の受信 (servo_udp.UdpListener)
+udp = None
+
+
+def connect_hardware():
+    """pigpiod に接続してサーボを初期化し、書き込み用のワーカーを返す。失敗したら例外。"""
+    # gpiozero は open_servo の中で import するので、HTTP サーバーを先に起動できる
+    # このサーバーがサーボを持つので servod は使わない。キャリブレーションのプロファイルがあれば使う
+    servo = open_servo(18, min_angle=MIN_ANGLE, max_angle=MAX_ANGLE,
+                       min_pulse_width=0.0005, max_pulse_width=0.0024, factory=create_factory, use_daemon=False)
+    # SERVO_MOTION_LOG が指定されていれば角度の書き込みを記録する
+    servo = record_servo(servo)
+
+    # servo_id -> サーボ (WebSocket のバイナリフレームで指定する番号)
+    # --control-loop なら 50 Hz のフレームごとに目標へ向けて書き込む (ハンドラは目標を渡すだけ)
+    if control_loop_options is not None:
+        return ControlLoop({0: servo}, write_seconds=write_seconds, **control_loop_options).start()
+    # サーボへの書き込みは専用スレッドが担当 (ハンドラはキューに積むだけ)
+    return ServoWorker({0: servo}, write_seconds=write_seconds).start()
+
+
+def init_hardware():
+    """connect_hardware() を呼び、失敗したらメッセージを出して終了する。"""
+    try:
+        return connect_hardware()
+    except Exception as e:
+        print("エラー: 'sudo pigpiod' を実行してデーモンを起動してください。")
+        print(f"詳細: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def set_worker(new_worker):
+    global servo, worker, sequences
+    servo = new_worker.servos[0]
+    # POST /sequence のジョブを実行する (キーフレームの列を 1 リクエストで送る)
+    sequences = servo_sequence.SequenceRunner(new_worker)
+    # worker を最後に入れる (--lazy-init では worker が入った時点でリクエストを受け付け始める)
+    worker = new_worker
+
+
+def require_worker():
+    """ハードウェアの初期化が終わっていなければ HardwareNotReady (503) を送出する。"""
+    if worker is None:
+        raise HardwareNotReady(hardware.error if hardware is not None and hardware.error else "初期化中です")
+    return worker
+
+
+def get_sequences():
+    require_worker()
+    return sequences
+
+
+def submit_udp(servo_id, angle):
+    """UDP で受け取った指令を POST /move と同じくワーカーに渡す。"""
+    require_worker().submit(servo_id, angle)
+    target_angle.set(angle)
+
+
+# --- メトリクス (GET /metrics, Prometheus テキスト形式) ---
+metrics = Registry()
+http_errors = metrics.counter("servo_http_errors_total", "エラーで返したリクエスト・フレーム数", ["endpoint", "reason"])
+write_seconds = metrics.histogram("servo_write_duration_seconds", "servo.angle の書き込みにかかった時間 (秒)")
+target_angle = metrics.gauge("servo_target_angle_degrees", "最後に受け付けた目標角度")
+current_angle = metrics.gauge("servo_angle_degrees", "サーボの現在の角度")
+current_angle.set_function(lambda: servo.angle)
+hardware_ready = metrics.gauge("servo_hardware_ready", "ハードウェアの初期化が終わっていれば 1")
+hardware_ready.set_function(lambda: 0 if worker is None else 1)
+event_subscribers = metrics.gauge("servo_events_subscribers", "GET /events の接続数")
+event_subscribers.set_function(lambda: events.stats()["subscribers"])
+worker_gauges(metrics, lambda: worker)
+udp_packets = metrics.gauge("servo_udp_packets", "UDP で受け取ったパケット数 (起動からの累計)", ["result"])
+for key in ("received", "applied", "dropped") + servo_udp.DROP_REASONS:
+    udp_packets.labels(key).set_function(lambda key=key: udp.stats()[key])
 
 app = Flask(__name__)
+instrument_app(app, metrics)
+# 初期化前 (--lazy-init) にサーボを使うリクエストには 503 "hardware not ready" を返す
+add_not_ready_handler(app, http_errors)
+servo_sequence.add_routes(app, get_sequences, http_errors, MIN_ANGLE, MAX_ANGLE)
+# GET /events (Server-Sent Events で角度の変化を配信)
+servo_events.add_routes(app, lambda: events, http_errors)
+sock = Sock(app) if Sock is not None else None
 
 # --- HTML/JS (ここがパワーアップ！) ---
 HTML_TEMPLATE = """
@@ -79,6 +186,35 @@ HTML_TEMPLATE = """
             }, SEND_DELAY);
         }
 
+        // WebSocket が使えればバイナリフレーム (servo_id:uint8 + 角度x100:int16) で送る
+        // 使えない・切断された場合は従来の POST /move にフォールバック
+        const SERVO_ID = 0;
+        let ws = null;
+        function connectWs() {
+            if (!{{ ws_enabled|tojson }} || !('WebSocket' in window)) return;
+            const proto = location.protocol === 'https:' ? 'wss://' : 'ws://';
+            ws = new WebSocket(proto + location.host + '/ws');
+            ws.binaryType = 'arraybuffer';
+            ws.onmessage = function(event) {
+                const view = new DataView(event.data);
+                const raw = view.getInt16(1, true);
+                if (raw !== -32768) {
+                    // サーバーが実際に設定した角度を表示
+                    document.getElementById('val').innerText = raw / 100;
+                }
+            };
+            ws.onclose = function() { ws = null; };
+        }
+        connectWs();
+
+        function sendFrame(angle) {
+            const buf = new ArrayBuffer(3);
+            const view = new DataView(buf);
+            view.setUint8(0, SERVO_ID);
+            view.setInt16(1, Math.round(angle * 100), true);
+            ws.send(buf);
+        }
+
         // サーバーに送信する関数
         function send(angle) {
             // 範囲チェック (-90 〜 90)
@@ -91,6 +227,10 @@ HTML_TEMPLATE = """
             currentAngle = parseInt(angle);
 
             // 送信
+            if (ws && ws.readyState === WebSocket.OPEN) {
+                sendFrame(angle);
+                return;
+            }
             fetch('/move', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/x-www-form-urlencoded'},
@@ -98,6 +238,22 @@ HTML_TEMPLATE = """
             }).catch(err => console.error('Error:', err));
         }
 
+        // 他のブラウザからの操作も含め、サーボの角度の変化を受け取る (GET /events)
+        // スライダーを動かしている間・送信待ちの間は上書きしない
+        let dragging = false;
+        document.getElementById('slider').addEventListener('pointerdown', () => { dragging = true; });
+        document.addEventListener('pointerup', () => { dragging = false; });
+        if ('EventSource' in window) {
+            const events = new EventSource('/events');
+            events.onmessage = function(event) {
+                const state = JSON.parse(event.data);
+                if (state.angle === null || dragging || sendTimer) return;
+                const angle = Math.round(state.angle);
+                document.getElementById('slider').value = angle;
+                updateDisplay(angle);
+            };
+        }
+
         // ★ここがキーボード監視の主役★
         document.addEventListener('keydown', function(event) {
             // 矢印右 or Dキー
@@ -125,16 +281,99 @@ def index():
         ip = os.popen('hostname -I').read().split()[0]
     except:
         ip = "unknown"
-    return render_template_string(HTML_TEMPLATE, angle=int(servo.angle), ip=ip)
+    # 初期化前は 0 を表示
+    angle = int(servo.angle or 0) if worker is not None else 0
+    return render_template_string(HTML_TEMPLATE, angle=angle, ip=ip, ws_enabled=sock is not None)
 
 @app.route('/move', methods=['POST'])
 def move():
     try:
         angle = float(request.form.get('angle'))
-        servo.angle = angle
-        return "OK"
-    except:
+        if not (MIN_ANGLE <= angle <= MAX_ANGLE):
+            raise ValueError(f"角度が範囲外です: {angle}")
+    except (TypeError, ValueError) as e:
+        # 角度が無い・数値でない・範囲外
+        http_errors.labels('/move', 'invalid_angle').inc()
+        return f"Bad Request: {e}", 400
+
+    require_worker()
+    try:
+        worker.submit(0, angle)
+        target_angle.set(angle)
+        return jsonify(status="queued", **worker.stats()), 202
+    except Exception as e:
+        http_errors.labels('/move', 'worker').inc()
+        print(f"サーボエラー: {e}", file=sys.stderr)
         return "Error", 500
 
+if sock is not None:
+    @sock.route('/ws')
+    def ws_control(ws):
+        # 1 フレーム受信するたびに角度を設定し、実際の角度を同じ形式で返す
+        while True:
+            data = ws.receive()
+            if not isinstance(data, (bytes, bytearray)) or len(data) != servo_protocol.FRAME_SIZE:
+                continue
+            servo_id, angle = servo_protocol.decode(data)
+            if angle is None or not (MIN_ANGLE <= angle <= MAX_ANGLE):
+                # エラー応答の番兵値 (ANGLE_ERROR) や範囲外の角度は送らない
+                http_errors.labels('/ws', 'invalid_angle').inc()
+                ws.send(servo_protocol.encode_error(servo_id))
+                continue
+            if worker is None:
+                # ハードウェアの初期化前 (--lazy-init)
+                http_errors.labels('/ws', 'not_ready').inc()
+                ws.send(servo_protocol.encode_error(servo_id))
+                continue
+            try:
+                # ワーカー経由で設定し、後続のフレームで上書きされた場合はその結果を返す
+                future = worker.submit(servo_id, angle)
+                target_angle.set(angle)
+                applied = future.result(timeout=1.0)
+                ws.send(servo_protocol.encode(servo_id, applied))
+            except Exception:
+                http_errors.labels('/ws', 'worker').inc()
+                ws.send(servo_protocol.encode_error(servo_id))
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="サーボモーター Web コントロール (キーボード/ボタン操作)")
+    parser.add_argument("--port", type=int, default=8000, help="待ち受けポート (既定: 8000)")
+    parser.add_argument(
+        "--lazy-init",
+        action="store_true",
+        help="HTTP サーバーを先に起動し、pigpiod への接続はバックグラウンドで行う (それまでは 503)",
+    )
+    parser.add_argument(
+        "--control-loop",
+        action="store_true",
+        help="リクエストごとではなく 50 Hz (サーボの PWM 周期) ごとに最大 1 回書き込む制御ループを使う",
+    )
+    parser.add_argument(
+        "--max-velocity",
+        type=float,
+        default=None,
+        help="--control-loop で目標へ向かう最大速度 (度/秒, 既定: 制限なし)",
+    )
+    parser.add_argument(
+        "--udp-port",
+        type=int,
+        default=None,
+        help="このポートで UDP の指令 (通し番号, servo_id, 角度 の 7 バイト) も受け付ける (既定: 無効)",
+    )
+    parser.add_argument("--profile-startup", action="store_true", help="フェーズごとの起動時間と import 時間を表示する")
+    args = parser.parse_args()
+    if args.control_loop:
+        control_loop_options = {"max_velocity": args.max_velocity}
+    profile.mark("Flask アプリの準備")
+    if args.lazy_init:
+        # 接続に失敗しても終了せず、リトライしながらページは表示する
+        hardware = LazyInit(connect_hardware, set_worker).start()
+        profile.mark("ハードウェア初期化 (バックグラウンドで開始)")
+    else:
+        set_worker(init_hardware())
+        profile.mark("ハードウェア初期化")
+    if args.udp_port is not None:
+        udp = servo_udp.UdpListener(submit_udp, args.udp_port, min_angle=MIN_ANGLE, max_angle=MAX_ANGLE).start()
+        print(f"UDP: {udp.address[0]}:{udp.address[1]} で指令を受け付けます")
+    profile.report()
+    app.run(host='0.0.0.0', port=args.port, debug=False)
\ No newline at end of file
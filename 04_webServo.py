@@ -1,26 +1,114 @@
-from flask import Flask, render_template_string, request
-from gpiozero import AngularServo
-from gpiozero.pins.pigpio import PiGPIOFactory
+# 最初に import する (--profile-startup のとき、以降の import の時間を計測する)
+from startup import profile
+from flask import Flask, jsonify, render_template_string, request
+import argparse
 import os
 import sys
 
-# pigpioデーモンが起動していることを前提とします
-# (venv_flask) の環境では os.environ で factory を設定する必要があります
-try:
-    factory = PiGPIOFactory()
+import servo_events
+import servo_ipc
+import servo_sequence
+from motion_log import record_servo
+from pin_factory import create_factory
+from control_loop import ControlLoop
+from servo_client import open_servo
+from servo_metrics import Registry, instrument_app, worker_gauges
+from servo_worker import ServoWorker
+from startup import HardwareNotReady, LazyInit, add_not_ready_handler
+
+profile.mark("import")
+
+MIN_ANGLE = -90
+MAX_ANGLE = 90
+
+
+def connect_hardware():
+    """pigpiod に接続してサーボを初期化し、書き込み用のワーカーを返す。失敗したら例外。"""
+    # pigpioデーモンが起動していることを前提とします
+    # (venv_flask) の環境では os.environ で factory を設定する必要があります
     # GPIO 18番ピン, ジッター解消のためpigpio Factoryを使用
-    servo = AngularServo(18, min_pulse_width=0.0005, max_pulse_width=0.0024, pin_factory=factory)
-except Exception as e:
-    # pigpiodが起動していない、または接続できない場合の処理
-    print("--- 🚨 エラー 🚨 ---")
-    print("pigpiod (pigpioデーモン) が起動していません。")
-    print("ターミナルで [ sudo pigpiod ] を実行してから、再度プログラムを起動してください。")
-    print(f"詳細: {e}", file=sys.stderr)
-    sys.exit(1)
+    # (gpiozero は open_servo の中で import するので、HTTP サーバーを先に起動できる)
+    # このサーバーがサーボを持つので servod は使わない。キャリブレーションのプロファイルがあれば使う
+    servo = open_servo(18, min_angle=MIN_ANGLE, max_angle=MAX_ANGLE,
+                       min_pulse_width=0.0005, max_pulse_width=0.0024, factory=create_factory, use_daemon=False)
+    # SERVO_MOTION_LOG が指定されていれば角度の書き込みを記録する
+    servo = record_servo(servo)
+
+    # --control-loop なら 50 Hz のフレームごとに目標へ向けて書き込む (ハンドラは目標を渡すだけ)
+    if control_loop_options is not None:
+        return ControlLoop({0: servo}, write_seconds=write_seconds, **control_loop_options).start()
+    # サーボへの書き込みは専用スレッドが担当 (ハンドラはキューに積むだけ)
+    return ServoWorker({0: servo}, write_seconds=write_seconds).start()
+
+
+def init_hardware():
+    """connect_hardware() を呼び、失敗したらメッセージを出して終了する。"""
+    try:
+        return connect_hardware()
+    except Exception as e:
+        # pigpiodが起動していない、または接続できない場合の処理
+        print("--- 🚨 エラー 🚨 ---")
+        print("pigpiod (pigpioデーモン) が起動していません。")
+        print("ターミナルで [ sudo pigpiod ] を実行してから、再度プログラムを起動してください。")
+        print(f"詳細: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ServoWorker (単一プロセス) または servo_ipc.HardwareClient (マルチワーカー)
+# どちらも submit() / stats() / angle() を持ちます
+backend = None
+# POST /sequence のジョブを実行する SequenceRunner (使えない構成では None)
+sequences = None
+# --lazy-init のとき、バックグラウンドでハードウェアを初期化する LazyInit
+hardware = None
+# --control-loop のときの ControlLoop の引数 (None なら ServoWorker)
+control_loop_options = None
+# GET /events で角度の変化を全ブラウザへ配る (--workers では None)
+events = servo_events.StateBroadcaster(lambda: {"angle": require_backend().angle(0), "ready": True})
+
+
+def set_backend(new_backend, with_sequences=True):
+    global backend, sequences
+    # backend を最後に入れる (--lazy-init では backend が入った時点でリクエストを受け付け始める)
+    sequences = servo_sequence.SequenceRunner(new_backend) if with_sequences else None
+    backend = new_backend
+
+
+def require_backend():
+    """ハードウェアの初期化が終わっていなければ HardwareNotReady (503) を送出する。"""
+    if backend is None:
+        raise HardwareNotReady(hardware.error if hardware is not None and hardware.error else "初期化中です")
+    return backend
+
+
+def get_sequences():
+    require_backend()
+    return sequences
 
 
 app = Flask(__name__)
 
+# --- メトリクス (GET /metrics, Prometheus テキスト形式) ---
+# マルチワーカーでは HTTP の値はワーカーごと、書き込み時間はハードウェア所有プロセス側にあるため出ません
+metrics = Registry()
+http_errors = metrics.counter("servo_http_errors_total", "エラーで返したリクエスト数", ["endpoint", "reason"])
+write_seconds = metrics.histogram("servo_write_duration_seconds", "servo.angle の書き込みにかかった時間 (秒)")
+target_angle = metrics.gauge("servo_target_angle_degrees", "最後に受け付けた目標角度")
+current_angle = metrics.gauge("servo_angle_degrees", "サーボの現在の角度")
+current_angle.set_function(lambda: backend.angle(0))
+hardware_ready = metrics.gauge("servo_hardware_ready", "ハードウェアの初期化が終わっていれば 1")
+hardware_ready.set_function(lambda: 0 if backend is None else 1)
+event_subscribers = metrics.gauge("servo_events_subscribers", "GET /events の接続数")
+event_subscribers.set_function(lambda: events.stats()["subscribers"] if events is not None else 0)
+worker_gauges(metrics, lambda: backend)
+instrument_app(app, metrics)
+# 初期化前 (--lazy-init) にサーボを使うリクエストには 503 "hardware not ready" を返す
+add_not_ready_handler(app, http_errors)
+# POST /sequence (キーフレームの列を 1 リクエストで送る), GET・DELETE /sequence/<id>
+servo_sequence.add_routes(app, get_sequences, http_errors, MIN_ANGLE, MAX_ANGLE)
+# GET /events (Server-Sent Events で角度の変化を配信)
+servo_events.add_routes(app, lambda: events, http_errors)
+
 # --- HTMLテンプレート（ウェブページのデザイン）---
 # Pythonコード内に直接HTMLを記述します (Jinja2テンプレート互換)
 HTML_TEMPLATE = """
@@ -66,6 +154,22 @@ HTML_TEMPLATE = """
                 }
             });
         }
+
+        // 他のブラウザからの操作も含め、サーボの角度の変化を受け取る (GET /events)
+        // スライダーを動かしている間は上書きしない
+        const slider = document.getElementById('servoRange');
+        let dragging = false;
+        slider.addEventListener('pointerdown', () => { dragging = true; });
+        document.addEventListener('pointerup', () => { dragging = false; });
+        if ('EventSource' in window) {
+            const events = new EventSource('/events');
+            events.onmessage = function(event) {
+                const state = JSON.parse(event.data);
+                if (state.angle === null || dragging) return;
+                slider.value = Math.round(state.angle);
+                updateAngle(Math.round(state.angle));
+            };
+        }
     </script>
 </body>
 </html>
@@ -82,25 +186,93 @@ def index():
         pi_ip = "localhost"
         
     # テンプレートに変数を渡して表示
-    # servo.angleは初期値として使われます
-    return render_template_string(HTML_TEMPLATE, angle=int(servo.angle), pi_ip=pi_ip)
+    # servo.angleは初期値として使われます (初期化前は 0)
+    angle = int(backend.angle(0) or 0) if backend is not None else 0
+    return render_template_string(HTML_TEMPLATE, angle=angle, pi_ip=pi_ip)
 
 @app.route('/move_servo', methods=['POST'])
 def move_servo():
     # POSTリクエストから角度データを受け取る
     try:
         new_angle = float(request.form.get('angle'))
-        
-        # サーボの角度を設定
-        servo.angle = new_angle
-        
-        # 成功を返す
-        return "OK", 200
+        if not (MIN_ANGLE <= new_angle <= MAX_ANGLE):
+            raise ValueError(f"角度が範囲外です: {new_angle}")
+    except (TypeError, ValueError) as e:
+        # 角度が無い・数値でない・範囲外
+        http_errors.labels('/move_servo', 'invalid_angle').inc()
+        return f"Bad Request: {e}", 400
+
+    require_backend()
+    try:
+        # サーボの角度設定はワーカーに任せてすぐに返す
+        backend.submit(0, new_angle)
+        target_angle.set(new_angle)
+
+        # 受付を返す (キューの状態を見てクライアントが送信間隔を調整できる)
+        return jsonify(status="queued", **backend.stats()), 202
     except Exception as e:
+        http_errors.labels('/move_servo', 'backend').inc()
         print(f"サーボエラー: {e}", file=sys.stderr)
         return "Internal Server Error", 500
 
 # Piの外部からアクセスできるようにhost='0.0.0.0'で起動
 if __name__ == '__main__':
-    # 0.0.0.0で起動することで、LAN内の他のデバイスからアクセス可能になります。
-    app.run(host='0.0.0.0', port=8000, debug=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="サーボモーター Web コントロール")
+    parser.add_argument("--port", type=int, default=8000, help="待ち受けポート (既定: 8000)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="HTTP ワーカー数。指定するとハードウェア所有プロセス + 複数ワーカーで起動 (既定: 0 = 開発サーバー)",
+    )
+    parser.add_argument(
+        "--worker-type",
+        choices=["process", "thread"],
+        default="process",
+        help="HTTP ワーカーの種類 (既定: process = prefork)",
+    )
+    parser.add_argument("--ipc-socket", default=servo_ipc.DEFAULT_SOCKET_PATH, help="ハードウェア所有プロセスとの Unix ソケット")
+    parser.add_argument(
+        "--lazy-init",
+        action="store_true",
+        help="HTTP サーバーを先に起動し、pigpiod への接続はバックグラウンドで行う (それまでは 503)",
+    )
+    parser.add_argument(
+        "--control-loop",
+        action="store_true",
+        help="リクエストごとではなく 50 Hz (サーボの PWM 周期) ごとに最大 1 回書き込む制御ループを使う",
+    )
+    parser.add_argument(
+        "--max-velocity",
+        type=float,
+        default=None,
+        help="--control-loop で目標へ向かう最大速度 (度/秒, 既定: 制限なし)",
+    )
+    parser.add_argument("--profile-startup", action="store_true", help="フェーズごとの起動時間と import 時間を表示する")
+    args = parser.parse_args()
+    if args.lazy_init and args.workers > 0:
+        parser.error("--lazy-init は --workers と同時には使えません")
+    if args.control_loop:
+        control_loop_options = {"max_velocity": args.max_velocity}
+    profile.mark("Flask アプリの準備")
+
+    if args.workers > 0:
+        profile.report()
+        # prefork ではジョブの状態がワーカープロセスごとに分かれるため、シーケンスはスレッドワーカーのみ
+        use_sequences = args.worker_type == "thread"
+        # ワーカーは 1 本で 1 接続ずつ処理するので、接続したままの /events は使えない
+        events = None
+        servo_ipc.serve(app, init_hardware, lambda client: set_backend(client, use_sequences),
+                        port=args.port, workers=args.workers,
+                        worker_type=args.worker_type, socket_path=args.ipc_socket)
+    else:
+        if args.lazy_init:
+            # 接続に失敗しても終了せず、リトライしながらページは表示する
+            hardware = LazyInit(connect_hardware, set_backend).start()
+            profile.mark("ハードウェア初期化 (バックグラウンドで開始)")
+        else:
+            set_backend(init_hardware())
+            profile.mark("ハードウェア初期化")
+        profile.report()
+        # 0.0.0.0で起動することで、LAN内の他のデバイスからアクセス可能になります。
+        app.run(host='0.0.0.0', port=args.port, debug=False)
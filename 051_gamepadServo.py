@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+051_gamepadServo.py
+
+ゲームパッド・ジョイスティックのアナログ軸でサーボ角度を制御します (05 のゲームパッド版)。
+05 はキー 1 回で STEP 度ずつしか動かせませんが、こちらはスティックの倒し具合に応じて動きます。
+
+  velocity (既定) : 倒した分だけの速さで動き続け、離すとその角度で止まる (最大 --max-speed 度/秒)
+  position        : スティックの位置がそのまま角度になる (中央 = 0 度)
+
+軸の値には不感帯 (--deadband) と応答曲線 (--expo, 中央付近を鈍くする) をかけます。
+入力は非ブロッキングで読み、サーボへの書き込みは --rate 回/秒 (既定 50 = サーボの PWM 周期) までに
+まとめます (角度が変わらないフレームは書き込みません)。
+
+--record で読んだ入力イベントをファイルに保存し、--replay で同じ処理に通して再生できます
+(ゲームパッド無しで動作を確認できます。--speed 0 なら待たずに再生して結果だけ表示)。
+
+使用方法:
+  1) Raspberry Pi 上で pigpiod を起動:
+       sudo systemctl start pigpiod
+  2) ゲームパッドを USB / Bluetooth で接続 (/dev/input/eventN を読むので input グループが必要):
+       sudo usermod -aG input $USER
+  3) スクリプトを実行:
+       python3 051_gamepadServo.py
+       python3 051_gamepadServo.py --device /dev/input/event3 --axis ABS_RX --expo 0.5
+       python3 051_gamepadServo.py --record pad.bin
+       SERVO_PIN_FACTORY=mock python3 051_gamepadServo.py --replay pad.bin --speed 0
+
+操作:
+  スティック (--axis)       : サーボを左右へ
+  ボタン (--center-button) : 角度を 0 に戻す
+  Ctrl-C                   : 終了
+
+注意:
+  - pigpiod が起動していないと接続に失敗します。
+  - サーボの配線と電源は安全に行ってください。
+"""
+
+import argparse
+import sys
+import time
+
+from gamepad_input import (AXES, BUTTONS, EV_ABS, EV_KEY, DeviceSource, ReplaySource, VirtualClock,
+                           find_device, normalize, shape)
+from motion_log import record_servo
+from pin_factory import create_factory
+from servo_client import open_servo
+
+# 設定
+SERVO_PIN = 18          # PWM 出力に使う GPIO 番号
+MIN_ANGLE = -90
+MAX_ANGLE = 90
+INITIAL_ANGLE = 0
+WRITE_RESOLUTION = 0.1  # これ未満の角度の変化は書き込まない (度)
+
+
+def clamp(v, lo, hi):
+    return max(lo, min(hi, v))
+
+
+def event_code(value, names):
+    """"ABS_X" のような名前か数値 (0x00 も可) をイベントのコードにする。"""
+    if value in names:
+        return names[value]
+    try:
+        return int(value, 0)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} は {', '.join(names)} か数値で指定してください")
+
+
+def control_loop(servo, source, axis, axis_range, args, angle=INITIAL_ANGLE,
+                 clock=time.monotonic, out=sys.stdout):
+    """入力イベントを読みながら、--rate 回/秒のフレームごとにサーボを動かす。終了時の統計を返す。
+
+    source は DeviceSource か ReplaySource (read(timeout) がイベントのリスト、入力が終わったら None)。
+    """
+    period = 1.0 / args.rate
+    minimum, maximum, raw = axis_range
+    written = angle
+    stats = {"events": 0, "frames": 0, "writes": 0, "errors": 0}
+    next_frame = clock()
+    try:
+        while True:
+            events = source.read(max(0.0, next_frame - clock()))
+            if events is None:
+                break
+            stats["events"] += len(events)
+            for _, type_, code, value in events:
+                if type_ == EV_ABS and code == axis:
+                    raw = value
+                elif type_ == EV_KEY and code == args.center_button and value == 1:
+                    angle = INITIAL_ANGLE
+
+            now = clock()
+            if now < next_frame:
+                continue
+            # 次のフレームの時刻 (処理が 1 フレーム以上遅れたら今から数え直す)
+            next_frame = max(next_frame + period, now)
+            stats["frames"] += 1
+
+            x = shape(normalize(raw, minimum, maximum), args.deadband, args.expo)
+            if args.invert:
+                x = -x
+            if args.mode == "velocity":
+                angle = clamp(angle + x * args.max_speed * period, MIN_ANGLE, MAX_ANGLE)
+            else:
+                angle = clamp(x * (MAX_ANGLE - MIN_ANGLE) / 2 + (MAX_ANGLE + MIN_ANGLE) / 2, MIN_ANGLE, MAX_ANGLE)
+            if abs(angle - written) < WRITE_RESOLUTION:
+                continue
+            try:
+                servo.angle = angle
+                written = angle
+                stats["writes"] += 1
+            except Exception as e:
+                stats["errors"] += 1
+                print(f"サーボ制御エラー: {e}", file=sys.stderr)
+            if not args.quiet:
+                out.write(f"\r角度: {angle:7.1f}°  ")
+                out.flush()
+    except KeyboardInterrupt:
+        pass
+    stats["angle"] = written
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ゲームパッドのアナログ軸でサーボ角度を制御する")
+    parser.add_argument("--device", help="入力デバイス (既定: /dev/input/by-id/*-event-joystick の最初の 1 つ)")
+    parser.add_argument("--replay", metavar="FILE", help="デバイスの代わりに --record で保存した入力イベントを再生する")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="--replay の再生速度 (倍, 既定: 1。0 なら待たずに再生)")
+    parser.add_argument("--record", metavar="FILE", help="デバイスから読んだ入力イベントをファイルに保存する")
+    parser.add_argument("--axis", type=lambda v: event_code(v, AXES), default="ABS_X",
+                        help=f"使う軸 ({', '.join(AXES)} か数値, 既定: ABS_X)")
+    parser.add_argument("--axis-min", type=int, default=None,
+                        help="軸の最小値 (既定: デバイスから読む。--replay では -32768)")
+    parser.add_argument("--axis-max", type=int, default=None,
+                        help="軸の最大値 (既定: デバイスから読む。--replay では 32767)")
+    parser.add_argument("--invert", action="store_true", help="軸の向きを逆にする")
+    parser.add_argument("--mode", choices=["velocity", "position"], default="velocity",
+                        help="velocity: 倒した分の速さで動かす, position: 位置をそのまま角度にする (既定: velocity)")
+    parser.add_argument("--deadband", type=float, default=0.08,
+                        help="不感帯 (軸の振れ幅に対する割合, 既定: 0.08)")
+    parser.add_argument("--expo", type=float, default=0.3,
+                        help="応答曲線 (0 = 直線, 1 = 3 次曲線, 既定: 0.3)")
+    parser.add_argument("--max-speed", type=float, default=180.0,
+                        help="velocity で倒しきったときの速さ (度/秒, 既定: 180)")
+    parser.add_argument("--rate", type=float, default=50.0, help="サーボへの書き込みの上限 (回/秒, 既定: 50)")
+    parser.add_argument("--center-button", type=lambda v: event_code(v, BUTTONS), default="BTN_SOUTH",
+                        help=f"角度を 0 に戻すボタン ({', '.join(BUTTONS)} か数値, 既定: BTN_SOUTH)")
+    parser.add_argument("--quiet", action="store_true", help="角度を表示しない")
+    args = parser.parse_args()
+    if not 0 <= args.deadband < 1:
+        parser.error("--deadband は 0 以上 1 未満で指定してください")
+    if not 0 <= args.expo <= 1:
+        parser.error("--expo は 0〜1 で指定してください")
+    if args.rate <= 0:
+        parser.error("--rate は正の数で指定してください")
+    if args.axis_min is not None and args.axis_max is not None and args.axis_min >= args.axis_max:
+        parser.error("--axis-min は --axis-max より小さくしてください")
+
+    clock = time.monotonic
+    if args.replay is not None:
+        if args.speed == 0:
+            # 待たずに、記録どおりの時刻の流れで再生する
+            clock = VirtualClock()
+            source = ReplaySource(args.replay, clock=clock, sleep=clock.sleep)
+        else:
+            source = ReplaySource(args.replay, speed=args.speed)
+    else:
+        device = args.device or find_device()
+        if device is None:
+            print("ゲームパッドが見つかりません。接続を確認するか --device /dev/input/eventN を指定してください。")
+            sys.exit(1)
+        source = DeviceSource(device, record=args.record)
+
+    # サーボ初期化 (servod が動いていればそちらを使い、無ければ pigpio factory で作る)
+    try:
+        servo = open_servo(SERVO_PIN, min_pulse_width=0.0005, max_pulse_width=0.0025, factory=create_factory)
+        # SERVO_MOTION_LOG が指定されていれば角度の書き込みを記録する
+        servo = record_servo(servo)
+    except Exception as e:
+        print("--- 🚨 pigpio 接続エラー 🚨 ---")
+        print("pigpiod が起動していない、または接続に失敗しました。")
+        print("ターミナルで 'sudo systemctl start pigpiod' を実行してから再度実行してください。")
+        print(f"詳細: {e}")
+        sys.exit(1)
+
+    servo.angle = INITIAL_ANGLE
+    stats = None
+    try:
+        with source:
+            if isinstance(source, DeviceSource):
+                value, minimum, maximum = source.absinfo(args.axis)
+                print(f"{source.path}: 軸 {args.axis:#04x} の範囲 {minimum}〜{maximum} (Ctrl-C で終了)")
+            else:
+                value, minimum, maximum = 0, -32768, 32767
+                print(f"{args.replay}: {len(source.events)} イベントを再生します")
+            minimum = minimum if args.axis_min is None else args.axis_min
+            maximum = maximum if args.axis_max is None else args.axis_max
+            if minimum >= maximum:
+                # アナログ軸でない (ボタンなど) か、片方だけ指定した値がデバイスの範囲と合っていない
+                print(f"軸 {args.axis:#04x} の範囲 {minimum}〜{maximum} は使えません。"
+                      "--axis で別の軸を選ぶか、--axis-min / --axis-max で範囲を指定してください。")
+                sys.exit(1)
+            if args.axis_min is not None or args.axis_max is not None:
+                # 中央 (= 動かない) から始める
+                value = (minimum + maximum) / 2
+            start = clock()
+            stats = control_loop(servo, source, args.axis, (minimum, maximum, value), args, clock=clock)
+            elapsed = clock() - start
+    except OSError as e:
+        print(f"入力デバイスを開けません: {e}")
+        print("input グループに入っているか確認してください (sudo usermod -aG input $USER)。")
+    finally:
+        print('\n終了します...')
+        try:
+            servo.close()
+        except:
+            pass
+
+    if stats is not None:
+        rate = stats["writes"] / elapsed if elapsed > 0 else 0.0
+        print(f"イベント {stats['events']} 個, {elapsed:.2f}秒, フレーム {stats['frames']}, "
+              f"書き込み {stats['writes']} 回 ({rate:.1f} 回/秒), 最後の角度 {stats['angle']:.1f}°")
+    print('Goodbye')
+
+
+if __name__ == '__main__':
+    main()
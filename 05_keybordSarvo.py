@@ -11,6 +11,7 @@
        source venv/bin/activate
   3) スクリプトを実行:
        python3 05_keybordSarvo.py
+       python3 05_keybordSarvo.py --control-loop --max-velocity 180   # 50 Hz で目標へ滑らかに動かす
 
 操作:
   ← or a : サーボを左へ（角度を減らす）
@@ -23,15 +24,14 @@
   - サーボの配線と電源は安全に行ってください。
 """
 
+import argparse
 import sys
-import termios
-import tty
-import time
-import os
-import signal
 
-from gpiozero import AngularServo
-from gpiozero.pins.pigpio import PiGPIOFactory
+from control_loop import ControlLoop
+from key_input import CTRL_C, CTRL_D, KEY_LEFT, KEY_RIGHT, RawKeyboard
+from motion_log import record_servo
+from pin_factory import create_factory
+from servo_client import open_servo
 
 # 設定
 SERVO_PIN = 18          # PWM 出力に使う GPIO 番号
@@ -39,46 +39,87 @@ MIN_ANGLE = -90
 MAX_ANGLE = 90
 STEP = 5                # 1回のキー入力で変化する角度（度）
 INITIAL_ANGLE = 0
+STATUS_ROW = 5          # 角度を表示する行 (画面の上から)
 
 
 def clamp(v, lo, hi):
     return max(lo, min(hi, v))
 
 
-def get_key():
-    """端末から1文字または矢印シーケンスを読み取る。"""
-    fd = sys.stdin.fileno()
-    old = termios.tcgetattr(fd)
-    try:
-        tty.setraw(fd)
-        ch1 = sys.stdin.read(1)
-        if ch1 == "\x1b":
-            # エスケープシーケンス（矢印キーなど）
-            ch2 = sys.stdin.read(1)
-            ch3 = sys.stdin.read(1)
-            return ch1 + ch2 + ch3
-        else:
-            return ch1
-    finally:
-        termios.tcsetattr(fd, termios.TCSADRAIN, old)
-
-
-def print_instructions(angle):
-    os.system('printf "\033c"')  # 画面クリア（端末互換）
-    print("Keyboard Servo Control")
-    print("----------------------")
-    print("Controls: ← / a = left  | → / d = right | s = center | q = quit")
-    print()
-    print(f"Current angle: {angle}°")
-    print()
-    print("※ Ctrl+C でも終了できます")
+def apply_keys(angle, keys):
+    """まとめて届いたキーを順に適用し、(新しい角度, 終了するか) を返す。
+
+    キーリピートで溜まった連打はここで 1 つの角度に合算され、サーボへの書き込みは 1 回で済みます。
+    """
+    for key in keys:
+        if key == KEY_LEFT or key == 'a':  # 左
+            angle = clamp(angle - STEP, MIN_ANGLE, MAX_ANGLE)
+        elif key == KEY_RIGHT or key == 'd':  # 右
+            angle = clamp(angle + STEP, MIN_ANGLE, MAX_ANGLE)
+        elif key == 's':
+            angle = 0
+        elif key in ('q', CTRL_C, CTRL_D):
+            return angle, True
+        # 未処理のキーは無視
+    return angle, False
+
+
+def print_instructions(angle, out=sys.stdout):
+    """画面全体を描く (起動時に 1 回だけ)。raw モードなので改行は \\r\\n。"""
+    lines = [
+        "Keyboard Servo Control",
+        "----------------------",
+        "Controls: ← / a = left  | → / d = right | s = center | q = quit",
+        "",
+        f"Current angle: {angle}°",
+        "",
+        "※ Ctrl+C でも終了できます",
+    ]
+    # \033[2J = 画面クリア, \033[H = カーソルを左上へ (サブプロセスを起動せずにエスケープシーケンスで行う)
+    out.write("\033[2J\033[H" + "\r\n".join(lines) + "\r\n")
+    out.flush()
+
+
+def update_status(angle, out=sys.stdout):
+    """角度の行だけを書き換える。"""
+    out.write(f"\0337\033[{STATUS_ROW};1H\033[2KCurrent angle: {angle}°\0338")
+    out.flush()
+
+
+def control_loop(servo, keyboard, angle=INITIAL_ANGLE, out=sys.stdout, loop=None):
+    """キー入力を待ち、届いたキーをまとめて 1 回の移動にする。終了時の角度を返す。
+
+    loop (ControlLoop) を渡すと、直接書き込まずに目標角度として渡す (書き込みは 50 Hz のフレームごと)。
+    """
+    while True:
+        new_angle, quit = apply_keys(angle, keyboard.read_keys())
+        if new_angle != angle:
+            angle = new_angle
+            try:
+                if loop is not None:
+                    loop.submit(0, angle)
+                else:
+                    servo.angle = angle
+            except Exception as e:
+                out.write(f"サーボ制御エラー: {e}\r\n")
+            update_status(angle, out)
+        if quit:
+            return angle
 
 
 def main():
-    # pigpio factory とサーボ初期化
+    parser = argparse.ArgumentParser(description="キーボードでサーボ角度を制御する")
+    parser.add_argument("--control-loop", action="store_true",
+                        help="キー入力ごとではなく 50 Hz (サーボの PWM 周期) ごとに目標へ向けて書き込む")
+    parser.add_argument("--max-velocity", type=float, default=None,
+                        help="--control-loop で目標へ向かう最大速度 (度/秒, 既定: 制限なし)")
+    args = parser.parse_args()
+
+    # サーボ初期化 (servod が動いていればそちらを使い、無ければ pigpio factory で作る)
     try:
-        factory = PiGPIOFactory()
-        servo = AngularServo(SERVO_PIN, min_pulse_width=0.0005, max_pulse_width=0.0025, pin_factory=factory)
+        servo = open_servo(SERVO_PIN, min_pulse_width=0.0005, max_pulse_width=0.0025, factory=create_factory)
+        # SERVO_MOTION_LOG が指定されていれば角度の書き込みを記録する
+        servo = record_servo(servo)
     except Exception as e:
         print("--- 🚨 pigpio 接続エラー 🚨 ---")
         print("pigpiod が起動していない、または接続に失敗しました。")
@@ -88,49 +129,21 @@ def main():
 
     angle = INITIAL_ANGLE
     servo.angle = angle
-
-    # Ctrl+C を graceful に処理
-    def handler(signum, frame):
-        raise KeyboardInterrupt
-
-    signal.signal(signal.SIGINT, handler)
+    loop = ControlLoop({0: servo}, max_velocity=args.max_velocity).start() if args.control_loop else None
 
     try:
-        print_instructions(angle)
-        while True:
-            key = get_key()
-            changed = False
-
-            # 矢印キーはエスケープシーケンス
-            if key == '\x1b[D' or key == 'a':  # 左
-                angle = clamp(angle - STEP, MIN_ANGLE, MAX_ANGLE)
-                changed = True
-            elif key == '\x1b[C' or key == 'd':  # 右
-                angle = clamp(angle + STEP, MIN_ANGLE, MAX_ANGLE)
-                changed = True
-            elif key == 's':
-                angle = 0
-                changed = True
-            elif key == 'q':
-                break
-            else:
-                # 未処理のキーは無視
-                continue
-
-            if changed:
-                try:
-                    servo.angle = angle
-                except Exception as e:
-                    print(f"サーボ制御エラー: {e}")
-                print_instructions(angle)
-
-            # 過負荷防止
-            time.sleep(0.05)
-
+        # raw モードは終了まで維持する (Ctrl+C は CTRL_C キーとして届く)
+        with RawKeyboard() as keyboard:
+            print_instructions(angle)
+            control_loop(servo, keyboard, angle, loop=loop)
     except KeyboardInterrupt:
-        print('\n終了します...')
+        # raw モードに入る前に Ctrl+C された場合
+        pass
 
     finally:
+        print('\n終了します...')
+        if loop is not None:
+            loop.stop()
         try:
             servo.close()
         except:
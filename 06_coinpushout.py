@@ -1,26 +1,70 @@
 import argparse
+import os
+import sys
 from time import sleep, monotonic
 
-from gpiozero import AngularServo
-from gpiozero.pins.pigpio import PiGPIOFactory
+import cycle_optimizer
+import trajectory
+from deadline import DeadlineExecutor, JitterStats
+from motion_log import record_servo
+from pin_factory import create_factory
+from servo_client import open_servo
+from stall_sensor import MockADC, StallMonitor
 
 
 # --- 固定設定 ---
 SERVO_PIN = 18  # ラズパイのGPIOピン番号
 
-# pigpioデーモンを利用してジッターを防止
-factory = PiGPIOFactory()
+# --optimize で保存し、--settings で読み込む設定ファイルの既定の名前
+DEFAULT_SETTINGS = "coinpush_settings.json"
 
-# サーボの設定 (SG90などの一般的なサーボに合わせてパルス幅を調整)
-# min_pulse_width=0.0005 (0.5ms), max_pulse_width=0.0024 (2.4ms) はSG90の典型値
-servo = AngularServo(
-    SERVO_PIN,
-    min_angle=0,
-    max_angle=180,
-    min_pulse_width=0.0005,
-    max_pulse_width=0.0024,
-    pin_factory=factory,
-)
+# pigpiod への接続とサーボは init_servo() で作る (--optimize では実機を使わない)
+# servod (servo_daemon.py) を使う場合 factory は None のまま
+factory = None
+servo = None
+
+
+def init_servo(use_daemon: bool | None = None):
+    global servo
+
+    def make_factory():
+        global factory
+        # pigpioデーモンを利用してジッターを防止
+        factory = create_factory()
+        return factory
+
+    # サーボの設定 (SG90などの一般的なサーボに合わせてパルス幅を調整)
+    # min_pulse_width=0.0005 (0.5ms), max_pulse_width=0.0024 (2.4ms) はSG90の典型値
+    # servod が動いていればそちらのサーボを使う (use_daemon=False なら常にこのプロセスで持つ)
+    servo = open_servo(
+        SERVO_PIN,
+        min_angle=0,
+        max_angle=180,
+        min_pulse_width=0.0005,
+        max_pulse_width=0.0024,
+        factory=make_factory,
+        use_daemon=use_daemon,
+    )
+    # SERVO_MOTION_LOG が指定されていれば角度の書き込みを記録する
+    servo = record_servo(servo)
+
+
+# ランプ移動の各ステップの遅れ (run() の最後にまとめて表示)
+jitter = JitterStats()
+executor = DeadlineExecutor(jitter)
+
+# 電流 / 位置フィードバックによるストール検出 (--stall-sensor 指定時に StallMonitor が入る)
+stall = None
+stall_action = "stop"
+backoff_angle = 10.0
+
+
+def back_off(direction: float, angle: float):
+    """噛み込んだ位置から移動方向と逆へ backoff_angle 度戻して負荷を抜く。"""
+    back = min(servo.max_angle, max(servo.min_angle, angle - direction * backoff_angle))
+    print(f"{back:.1f}度へ戻します")
+    servo.angle = back
+    sleep(0.3)
 
 
 def move_with_ramp(
@@ -30,54 +74,50 @@ def move_with_ramp(
     ramp_delay: float,
     stuck_threshold: float,
     stuck_max_steps: int,
+    profile: str = "linear",
+    max_accel: float | None = None,
 ) -> float:
     """角度をランプ移動で target へ。
 
     - ramp_step が None の場合は即移動。
-        - 連続して角度変化が stuck_threshold 未満のステップが
-            stuck_max_steps 回続いたら機械的噛み込みとみなし KeyboardInterrupt を送出。
+    - 最高速度は ramp_step / ramp_delay (度/秒)。profile が trapezoid / scurve の場合は
+      max_accel (度/秒^2) で加減速する。軌道は trajectory.plan() で一括生成 (キャッシュ済み)。
+    - ストール検出 (stall) が有効なら各ステップでセンサーの値を確認し、過電流、または
+      実際の位置の変化が stuck_threshold 未満で指令に追従しないステップが stuck_max_steps 回
+      続いたら機械的噛み込みとみなし (stall_action が backoff なら少し戻して) KeyboardInterrupt を送出。
     """
     if ramp_step is None:
         servo.angle = target
         return target
 
-    step = ramp_step if target > current else -ramp_step
-    a = current
-    prev_a = a
-    stuck_count = 0
+    traj = trajectory.plan(current, target, profile, ramp_step / ramp_delay, max_accel, ramp_delay)
+    direction = 1.0 if target > current else -1.0
+    if stall is not None:
+        stall.reset()
 
     # 理論上の移動時間からタイムアウト(安全係数2倍)を自動計算
-    total_delta = abs(target - current)
-    if ramp_step > 0:
-        steps = max(1, int(total_delta / ramp_step))
-    else:
-        steps = 1
-    theoretical_time = steps * ramp_delay
+    theoretical_time = max(traj.duration, ramp_delay)
     move_timeout = theoretical_time * 2.0
     start_t = monotonic()
 
-    while (step > 0 and a < target) or (step < 0 and a > target):
+    def step(a):
         if monotonic() - start_t > move_timeout:
             print("移動タイムアウト: 想定時間の2倍を超えたためサーボを解放します")
             servo.detach()
             raise KeyboardInterrupt
-        a += step
-        # オーバーシュート補正
-        if (step > 0 and a > target) or (step < 0 and a < target):
-            a = target
 
         servo.angle = a
-        # 実質的に動いていないかチェック
-        if abs(a - prev_a) < stuck_threshold:
-            stuck_count += 1
-            if stuck_count >= stuck_max_steps:
-                print("警告: サーボが機械的に噛み込んだ可能性があるため停止します")
+        # 実際の電流・位置で噛み込みをチェック (リングバッファを読むだけなのでブロックしない)
+        if stall is not None:
+            reason = stall.check(a, stuck_threshold, stuck_max_steps)
+            if reason:
+                print(f"警告: サーボが機械的に噛み込んだ可能性があるため停止します ({reason})")
+                if stall_action == "backoff":
+                    back_off(direction, a)
                 raise KeyboardInterrupt
-        else:
-            stuck_count = 0
 
-        prev_a = a
-        sleep(ramp_delay)
+    # 各ステップは 開始時刻 + 軌道上の時刻 に実行 (sleep の誤差が積み上がらない)
+    executor.run(traj.times, traj.angles, step)
 
     return target
 
@@ -91,35 +131,38 @@ def run(
     ramp_delay: float,
     stuck_threshold: float,
     stuck_max_steps: int,
+    profile: str = "linear",
+    max_accel: float | None = None,
 ):
     count = 0
     print(
         f"開始: angle1={angle1}, angle2={angle2}, wait={wait_time}s, "
         f"loops={'infinite' if loops is None else loops}, ramp_step={ramp_step}, ramp_delay={ramp_delay}s, "
-        f"stuck_threshold={stuck_threshold}, stuck_max_steps={stuck_max_steps}"
+        f"stuck_threshold={stuck_threshold}, stuck_max_steps={stuck_max_steps}, "
+        f"profile={profile}, max_accel={max_accel}"
     )
     try:
         current = servo.angle if servo.angle is not None else angle2
         # 初期位置へ（angle2 側に合わせる）
-        current = move_with_ramp(angle2, current, ramp_step, ramp_delay, stuck_threshold, stuck_max_steps)
+        current = move_with_ramp(angle2, current, ramp_step, ramp_delay, stuck_threshold, stuck_max_steps, profile, max_accel)
         sleep(wait_time)
         if loops is None:
             while True:
                 print(f"Angle: {angle2}")
-                current = move_with_ramp(angle2, current, ramp_step, ramp_delay, stuck_threshold, stuck_max_steps)
+                current = move_with_ramp(angle2, current, ramp_step, ramp_delay, stuck_threshold, stuck_max_steps, profile, max_accel)
                 sleep(wait_time)
                 print(f"Angle: {angle1}")
-                current = move_with_ramp(angle1, current, ramp_step, ramp_delay, stuck_threshold, stuck_max_steps)
+                current = move_with_ramp(angle1, current, ramp_step, ramp_delay, stuck_threshold, stuck_max_steps, profile, max_accel)
                 sleep(wait_time)
         else:
             for _ in range(loops):
                 count += 1
                 print(f"[Loop {count}/{loops}] Angle: {angle2}")
-                current = move_with_ramp(angle2, current, ramp_step, ramp_delay, stuck_threshold, stuck_max_steps)
+                current = move_with_ramp(angle2, current, ramp_step, ramp_delay, stuck_threshold, stuck_max_steps, profile, max_accel)
                 sleep(wait_time)
 
                 print(f"[Loop {count}/{loops}] Angle: {angle1}")
-                current = move_with_ramp(angle1, current, ramp_step, ramp_delay, stuck_threshold, stuck_max_steps)
+                current = move_with_ramp(angle1, current, ramp_step, ramp_delay, stuck_threshold, stuck_max_steps, profile, max_accel)
                 sleep(wait_time)
     except KeyboardInterrupt:
         print("\n停止しました (Ctrl+C)")
@@ -128,6 +171,85 @@ def run(
             servo.detach()
         except Exception:
             pass
+        if ramp_step is not None:
+            print(jitter.format_summary())
+
+
+def run_wave(
+    angle1: float,
+    angle2: float,
+    wait_time: float,
+    loops: int | None,
+    ramp_step: float | None,
+    ramp_delay: float,
+    profile: str = "linear",
+    max_accel: float | None = None,
+):
+    """run() と同じ往復を pigpio の DMA 波形で再生する (Python はタイミングに関与しない)。"""
+    import wave_engine
+
+    max_velocity = ramp_step / ramp_delay if ramp_step is not None else None
+    print(
+        f"開始 (wave): angle1={angle1}, angle2={angle2}, wait={wait_time}s, "
+        f"loops={'infinite' if loops is None else loops}, max_velocity={max_velocity}, "
+        f"profile={profile}, max_accel={max_accel}"
+    )
+    current = servo.angle if servo.angle is not None else angle2
+    sw = wave_engine.ServoWave(
+        factory.connection,
+        SERVO_PIN,
+        min_angle=servo.min_angle,
+        max_angle=servo.max_angle,
+        min_pulse_width=servo.min_pulse_width,
+        max_pulse_width=servo.max_pulse_width,
+        # キャリブレーションのプロファイルがあれば波形も同じ変換で作る
+        pulse_us=getattr(servo, "pulse_us", None),
+    )
+    # gpiozero の PWM を止めてから波形に切り替える
+    servo.detach()
+    try:
+        sw.prepare()
+        chain = wave_engine.coin_cycle_chain(
+            sw, current, angle1, angle2, wait_time, loops, profile, max_velocity, max_accel
+        )
+        sw.play(chain)
+        print("完了しました")
+    except KeyboardInterrupt:
+        print("\n停止しました (Ctrl+C)")
+    finally:
+        try:
+            sw.stop()
+        except Exception:
+            pass
+
+
+def run_optimize(args, settings_path: str):
+    """シミュレーションで往復が最も速いパラメーターを探し、設定ファイルに保存する。"""
+    before = cycle_optimizer.evaluate(
+        args.angle1, args.angle2, args.wait, args.ramp_step, args.ramp_delay, args.profile,
+        args.max_accel, args.servo_speed, args.max_speed, args.min_dwell,
+    )
+    print(
+        f"探索: angle1={args.angle1}, angle2={args.angle2}, max_speed={args.max_speed}度/秒, "
+        f"min_dwell={args.min_dwell}秒, servo_speed={args.servo_speed}度/秒, "
+        f"max_accel={'制限なし' if args.accel_limit is None else args.accel_limit}"
+    )
+    print(cycle_optimizer.format_result("現在", before))
+    best = cycle_optimizer.optimize(
+        args.angle1, args.angle2, args.max_speed, args.min_dwell, args.servo_speed, args.accel_limit
+    )
+    if best is None:
+        print("制約を満たすパラメーターが見つかりませんでした", file=sys.stderr)
+        sys.exit(1)
+    print(cycle_optimizer.format_result("最適", best))
+    bounds = {
+        "max_speed": args.max_speed,
+        "min_dwell": args.min_dwell,
+        "servo_speed": args.servo_speed,
+        "max_accel": args.accel_limit,
+    }
+    cycle_optimizer.save_settings(settings_path, args.angle1, args.angle2, best, bounds)
+    print(f"保存しました: {settings_path}  (python3 06_coinpushout.py --settings {settings_path} で使用)")
 
 
 def positive_int(value: str) -> int:
@@ -151,7 +273,48 @@ def positive_float(value: str) -> float:
     return v
 
 
+def non_negative_float(value: str) -> float:
+    v = float(value)
+    if v < 0:
+        raise argparse.ArgumentTypeError("0 以上の数を指定してください")
+    return v
+
+
+# 設定ファイルの項目 (cycle_optimizer.SETTINGS_KEYS) と、コマンドラインで使う型
+SETTINGS_TYPES = {
+    "angle1": angle_type,
+    "angle2": angle_type,
+    "wait": non_negative_float,
+    "ramp_step": positive_float,
+    "ramp_delay": positive_float,
+    "max_accel": positive_float,
+}
+
+
+def check_settings(settings: dict) -> dict:
+    """設定ファイルの値をコマンドライン引数と同じ範囲で確認する。不正なら ValueError。"""
+    checked = {}
+    for key, value in settings.items():
+        if key == "profile":
+            if value not in trajectory.PROFILES:
+                raise ValueError(f"profile は {', '.join(trajectory.PROFILES)} のどれかにしてください: {value!r}")
+            checked[key] = value
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{key} が数値ではありません: {value!r}")
+        try:
+            checked[key] = SETTINGS_TYPES[key](value)
+        except argparse.ArgumentTypeError as e:
+            raise ValueError(f"{key}: {e} ({value!r})") from None
+    return checked
+
+
 if __name__ == "__main__":
+    # --settings があれば、その内容を各引数の既定値にする (コマンドラインの指定が優先)
+    pre = argparse.ArgumentParser(add_help=False)
+    pre.add_argument("--settings")
+    pre_args, _ = pre.parse_known_args()
+
     parser = argparse.ArgumentParser(
         description="サーボを angle1 と angle2 の間で往復させます。"
     )
@@ -183,27 +346,157 @@ if __name__ == "__main__":
         "--stuck-threshold",
         type=positive_float,
         default=0.1,
-        help="機械的噛み込み検出用の最小有効角度変化(度) (既定: 0.1)",
+        help="噛み込み検出 (--stall-sensor position) で動いたとみなす最小の角度変化(度) (既定: 0.1)",
     )
     parser.add_argument(
         "--stuck-max-steps",
         type=positive_int,
         default=10,
-        help="上記しきい値未満の変化が連続した場合に停止するステップ数 (既定: 10)",
+        help="位置が指令に追従しないステップがこの回数続いたら停止 (既定: 10)",
+    )
+    parser.add_argument(
+        "--stall-sensor",
+        choices=["none", "current", "position"],
+        default="none",
+        help="噛み込み検出に使う ADC (MCP3008) の入力: current=電流検出抵抗, position=位置フィードバック (既定: none)",
+    )
+    parser.add_argument("--adc-channel", type=int, default=0, help="MCP3008 のチャンネル (既定: 0)")
+    parser.add_argument("--adc-rate", type=positive_float, default=200.0, help="ADC のサンプリング周波数 Hz (既定: 200)")
+    parser.add_argument("--mock-adc", default=None, help="MCP3008 の代わりに記録したトレースファイルを再生する")
+    parser.add_argument("--shunt-ohms", type=positive_float, default=0.5, help="電流検出抵抗の値 Ω (既定: 0.5)")
+    parser.add_argument("--current-limit", type=positive_float, default=0.8, help="停止する電流 A (既定: 0.8)")
+    parser.add_argument(
+        "--feedback-range",
+        type=float,
+        nargs=2,
+        default=[0.0, 1.0],
+        metavar=("AT_0", "AT_180"),
+        help="位置フィードバックの 0度 / 180度 での ADC 値 (既定: 0 1)",
+    )
+    parser.add_argument(
+        "--follow-tolerance",
+        type=positive_float,
+        default=10.0,
+        help="位置フィードバックと指令角の差の許容値(度) (既定: 10)",
+    )
+    parser.add_argument(
+        "--stall-action",
+        choices=["stop", "backoff"],
+        default="stop",
+        help="噛み込み検出時の動作: stop=その場で停止, backoff=少し戻してから停止 (既定: stop)",
+    )
+    parser.add_argument("--backoff-angle", type=positive_float, default=10.0, help="backoff で戻す角度(度) (既定: 10)")
+
+    parser.add_argument(
+        "--profile",
+        choices=trajectory.PROFILES,
+        default="linear",
+        help="ランプ移動の速度プロファイル: linear=等速, trapezoid=台形, scurve=S字 (既定: linear)",
+    )
+    parser.add_argument(
+        "--max-accel",
+        type=positive_float,
+        default=1500.0,
+        help="trapezoid / scurve の最大加速度(度/秒^2) (既定: 1500)",
+    )
+
+    parser.add_argument(
+        "--engine",
+        choices=["ramp", "wave"],
+        default="ramp",
+        help="ramp=Python のループで書き込み, wave=pigpio の DMA 波形で再生 (既定: ramp)",
+    )
+
+    parser.add_argument(
+        "--settings",
+        default=None,
+        help=f"設定ファイル (JSON)。あれば読み込んで既定値にし、--optimize では結果を保存 (既定の保存先: {DEFAULT_SETTINGS})",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="実機を使わずシミュレーションで 1 分あたりの往復回数が最大になる設定を探して保存する",
+    )
+    parser.add_argument("--max-speed", type=positive_float, default=300.0, help="--optimize: 指令速度の上限(度/秒) (既定: 300)")
+    parser.add_argument("--min-dwell", type=non_negative_float, default=0.5, help="--optimize: 目標角に着いてからの最小待ち時間(秒) (既定: 0.5)")
+    parser.add_argument(
+        "--servo-speed",
+        type=positive_float,
+        default=500.0,
+        help="--optimize: サーボ自体の最高速度(度/秒)。SG90 は約 0.12秒/60度 = 500 (既定: 500)",
+    )
+    parser.add_argument(
+        "--accel-limit",
+        type=positive_float,
+        default=None,
+        help="--optimize: 加速度の上限(度/秒^2)。指定すると linear は候補から外す (既定: 制限なし)",
     )
 
+    if pre_args.settings and os.path.exists(pre_args.settings):
+        try:
+            settings = check_settings(cycle_optimizer.load_settings(pre_args.settings))
+        except (OSError, ValueError) as e:
+            parser.error(f"設定ファイルが不正です: {pre_args.settings}: {e}")
+        parser.set_defaults(**settings)
+
     args = parser.parse_args()
 
     if args.angle1 == args.angle2:
         parser.error("angle1 と angle2 が同じです。異なる角度を指定してください。")
 
-    run(
-        args.angle1,
-        args.angle2,
-        args.wait,
-        args.loops,
-        args.ramp_step,
-        args.ramp_delay,
-        args.stuck_threshold,
-        args.stuck_max_steps,
-    )
+    if args.optimize:
+        run_optimize(args, args.settings or DEFAULT_SETTINGS)
+        sys.exit(0)
+
+    if args.settings and not os.path.exists(args.settings):
+        parser.error(f"設定ファイルが見つかりません: {args.settings}")
+
+    # DMA 波形は pigpiod の接続を直接使うので servod は使わない
+    init_servo(use_daemon=False if args.engine == "wave" else None)
+
+    if args.stall_sensor != "none":
+        if args.mock_adc:
+            adc = MockADC.from_file(args.mock_adc)
+        else:
+            from gpiozero import MCP3008
+
+            adc = MCP3008(channel=args.adc_channel)
+        stall = StallMonitor(
+            adc,
+            mode=args.stall_sensor,
+            rate=args.adc_rate,
+            shunt_ohms=args.shunt_ohms,
+            current_limit=args.current_limit,
+            min_angle=servo.min_angle,
+            max_angle=servo.max_angle,
+            feedback_min=args.feedback_range[0],
+            feedback_max=args.feedback_range[1],
+            follow_tolerance=args.follow_tolerance,
+        ).start()
+        stall_action = args.stall_action
+        backoff_angle = args.backoff_angle
+
+    if args.engine == "wave":
+        run_wave(
+            args.angle1,
+            args.angle2,
+            args.wait,
+            args.loops,
+            args.ramp_step,
+            args.ramp_delay,
+            args.profile,
+            args.max_accel,
+        )
+    else:
+        run(
+            args.angle1,
+            args.angle2,
+            args.wait,
+            args.loops,
+            args.ramp_step,
+            args.ramp_delay,
+            args.stuck_threshold,
+            args.stuck_max_steps,
+            args.profile,
+            args.max_accel,
+        )
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+bench_calibration.py
+
+キャリブレーション (servo_calibration.py) の角度 -> パルス幅の変換コストを計測するベンチマーク。
+
+変換だけ (1 回あたりの ns):
+  linear    : AngularServo と同じ線形変換 (multi_servo.angle_to_pulse_us)
+  spline    : LUT を使わずに毎回 3 次補間を計算した場合 (二分探索 + 多項式)
+  lut       : 読み込み時に作った LUT の参照 + 線形補間 (CalibratedServo が書き込みごとに行う変換)
+servo.angle への書き込み (1 回あたりの ns):
+  servo     : 今までの AngularServo
+  calibrated: CalibratedServo (LUT で変換して同じ AngularServo に書く)
+
+サーボは gpiozero の MockFactory で作るので実機は不要です。プロファイルは --points で指定した点
+(既定は SG90 の実測例) から作り、ファイルには保存しません。
+
+使用方法:
+  python3 bench_calibration.py
+  python3 bench_calibration.py --writes 200000 --json
+"""
+
+import argparse
+import json
+
+from gpiozero import AngularServo
+from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+from bench_motion_log import time_writes
+from calibrate_servo import parse_points
+from multi_servo import angle_to_pulse_us
+from servo_calibration import Calibration, CalibrationProfile
+
+SG90_POINTS = "-90:520,-45:930,0:1430,45:1960,90:2450"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="キャリブレーションの変換コストのベンチマーク")
+    parser.add_argument("--writes", type=int, default=50000, help="1 回の計測での変換・書き込み数 (既定: 50000)")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数 (既定: 5)")
+    parser.add_argument("--points", type=parse_points, default=parse_points(SG90_POINTS),
+                        help=f"プロファイルの点 (既定: {SG90_POINTS})")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    profile = CalibrationProfile("bench", args.points)
+    calibration = Calibration(profile)
+
+    def linear(angle):
+        angle_to_pulse_us(angle, -90, 90, 0.0005, 0.0024)
+
+    def spline(angle):
+        profile.interpolate(angle)
+
+    def lut(angle):
+        calibration.servo_angle(angle)
+
+    factory = MockFactory(pin_class=MockPWMPin)
+    servo = AngularServo(18, min_pulse_width=0.0005, max_pulse_width=0.0024, pin_factory=factory)
+    calibrated = calibration.wrap(
+        AngularServo(19, min_pulse_width=calibration.min_pulse_width,
+                     max_pulse_width=calibration.max_pulse_width, pin_factory=factory)
+    )
+
+    def servo_write(angle):
+        servo.angle = angle
+
+    def calibrated_write(angle):
+        calibrated.angle = angle
+
+    results = {
+        "linear_ns": time_writes(linear, args.writes, args.repeat),
+        "spline_ns": time_writes(spline, args.writes, args.repeat),
+        "lut_ns": time_writes(lut, args.writes, args.repeat),
+        "servo_ns": time_writes(servo_write, args.writes, args.repeat),
+        "calibrated_ns": time_writes(calibrated_write, args.writes, args.repeat),
+        "lut_entries": len(profile.lut.values),
+    }
+    servo.close()
+    calibrated.close()
+    results["overhead_ns"] = results["calibrated_ns"] - results["servo_ns"]
+    results["overhead_percent"] = results["overhead_ns"] / results["servo_ns"] * 100
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"変換: 線形 (AngularServo と同じ)     : {results['linear_ns']:8.0f} ns")
+    print(f"変換: 3 次補間を毎回計算           : {results['spline_ns']:8.0f} ns")
+    print(f"変換: LUT ({results['lut_entries']} 点) の参照 + 補間 : {results['lut_ns']:8.0f} ns")
+    print(f"書き込み: AngularServo             : {results['servo_ns']:8.0f} ns")
+    print(f"書き込み: CalibratedServo          : {results['calibrated_ns']:8.0f} ns")
+    print(f"キャリブレーションのオーバーヘッド : {results['overhead_ns']:8.0f} ns ({results['overhead_percent']:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
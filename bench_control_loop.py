@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+bench_control_loop.py
+
+固定周期の制御ループ (control_loop.py) の効果を計測するベンチマーク。
+
+Web UI のスライダーを動かしたときのように、目標角度のリクエストが不規則に届く入力
+(数 ms 間隔の連続イベントと、30〜120 ms の途切れの繰り返し。目標は正弦波に沿って動く) を
+再現し、同じ入力を
+
+  worker : 今までの ServoWorker (リクエストが届くたびに書き込む)
+  loop   : ControlLoop (50 Hz のフレームごとに最大 1 回、slew 制限つきで書き込む)
+
+に送って、サーボへの書き込みを記録します。サーボが受け取るのは 20 ms のフレームの頭の
+パルスだけなので、フレームの境目ごとの角度を「サーボが実際に見た動き」として評価します。
+
+  writes/s      : 1 秒あたりの書き込み回数
+  wasted        : 同じフレーム内で後の書き込みに上書きされた (サーボに届かなかった) 書き込み
+  max step      : 1 フレームでの角度の変化の最大値 (度)
+  jerk rms      : フレームごとの変化量の差の二乗平均平方根 (度/フレーム², 小さいほど滑らか)
+  max gap ms    : 動いている間に角度が変わらなかった最長の時間
+  tracking rms  : 入力の目標角度との差の二乗平均平方根 (度, slew 制限による遅れ)
+
+サーボは gpiozero の MockFactory で作るので実機は不要です。
+
+使用方法:
+  python3 bench_control_loop.py
+  python3 bench_control_loop.py --duration 5 --max-velocity 400 --json
+"""
+
+import argparse
+import bisect
+import json
+import math
+import random
+import threading
+import time
+
+from gpiozero import AngularServo
+from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+from control_loop import FRAME_RATE, ControlLoop
+from servo_worker import ServoWorker
+
+FRAME = 1.0 / FRAME_RATE
+
+
+class LoggingServo:
+    """書き込みの (時刻, 角度) を記録する AngularServo の代理。"""
+
+    def __init__(self, servo):
+        self._servo = servo
+        self._lock = threading.Lock()
+        self.log = []
+
+    @property
+    def angle(self):
+        return self._servo.angle
+
+    @angle.setter
+    def angle(self, value):
+        self._servo.angle = value
+        with self._lock:
+            self.log.append((time.perf_counter(), value))
+
+
+def make_inputs(duration, seed, amplitude=80.0, period=2.0):
+    """[(開始からの秒, 目標角度), ...]: 連続イベント (2〜6 ms 間隔, 3〜8 個) と 30〜120 ms の途切れの繰り返し。"""
+    rng = random.Random(seed)
+    events = []
+    t = 0.0
+    while t < duration:
+        for _ in range(rng.randint(3, 8)):
+            t += rng.uniform(0.002, 0.006)
+            events.append((t, amplitude * math.sin(2 * math.pi * t / period)))
+        t += rng.uniform(0.030, 0.120)
+    return [e for e in events if e[0] < duration]
+
+
+def run(mode, inputs, duration, max_velocity, factory, pin):
+    servo = LoggingServo(AngularServo(pin, min_pulse_width=0.0005, max_pulse_width=0.0024, pin_factory=factory))
+    if mode == "worker":
+        backend = ServoWorker({0: servo}).start()
+    else:
+        backend = ControlLoop({0: servo}, max_velocity=max_velocity).start()
+    start = time.perf_counter()
+    for t, angle in inputs:
+        delay = start + t - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        backend.submit(0, angle)
+    # 最後の目標に追いつくまで待つ
+    time.sleep(max(0.0, start + duration - time.perf_counter()) + 0.5)
+    backend.stop()
+    stats = backend.stats()
+    servo._servo.close()
+    return evaluate(servo.log, inputs, start, duration, stats)
+
+
+def evaluate(log, inputs, start, duration, stats):
+    """書き込みのログをフレームの境目で標本化して評価する。"""
+    times = [t - start for t, _ in log]
+    angles = [a for _, a in log]
+    frames = int(duration / FRAME)
+
+    # フレームの境目でサーボが見る角度 (その時点までの最後の書き込み)
+    sampled = []
+    written_frames = set()
+    for k in range(1, frames + 1):
+        i = bisect.bisect_right(times, k * FRAME) - 1
+        sampled.append(angles[i] if i >= 0 else None)
+    for t in times:
+        if t < frames * FRAME:
+            written_frames.add(int(t / FRAME))
+    writes = sum(1 for t in times if t < frames * FRAME)
+
+    # 入力の目標 (その時点までの最後のリクエスト)
+    input_times = [t for t, _ in inputs]
+    targets = []
+    for k in range(1, frames + 1):
+        i = bisect.bisect_right(input_times, k * FRAME) - 1
+        targets.append(inputs[i][1] if i >= 0 else None)
+
+    pairs = [(a, b) for a, b in zip(sampled, sampled[1:]) if a is not None and b is not None]
+    steps = [b - a for a, b in pairs]
+    jerks = [d2 - d1 for d1, d2 in zip(steps, steps[1:])]
+    gap = longest = 0
+    for d in steps:
+        gap = gap + 1 if d == 0 else 0
+        longest = max(longest, gap)
+    tracking = [a - t for a, t in zip(sampled, targets) if a is not None and t is not None]
+    return {
+        "writes": writes,
+        "writes_per_s": writes / (frames * FRAME),
+        "wasted_writes": writes - len(written_frames),
+        "max_step_deg": max((abs(d) for d in steps), default=0.0),
+        "jerk_rms": math.sqrt(sum(j * j for j in jerks) / len(jerks)) if jerks else 0.0,
+        "max_gap_ms": longest * FRAME * 1000,
+        "tracking_rms_deg": math.sqrt(sum(e * e for e in tracking) / len(tracking)) if tracking else 0.0,
+        "stats": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="固定周期の制御ループの書き込み回数と滑らかさのベンチマーク")
+    parser.add_argument("--duration", type=float, default=3.0, help="入力を送る秒数 (既定: 3)")
+    parser.add_argument("--max-velocity", type=float, default=360.0, help="ControlLoop の slew 制限 (度/秒, 既定: 360)")
+    parser.add_argument("--seed", type=int, default=1, help="入力の乱数シード (既定: 1)")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.duration, args.seed)
+    factory = MockFactory(pin_class=MockPWMPin)
+    results = {
+        "inputs": len(inputs),
+        "worker": run("worker", inputs, args.duration, None, factory, 18),
+        "loop": run("loop", inputs, args.duration, args.max_velocity, factory, 19),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"入力: {results['inputs']} リクエスト / {args.duration:g}秒, slew 制限 {args.max_velocity:g} 度/秒")
+    print(f"{'mode':<7} {'writes/s':>9} {'wasted':>7} {'max step':>9} {'jerk rms':>9} {'max gap ms':>11} {'tracking rms':>13}")
+    for mode in ("worker", "loop"):
+        r = results[mode]
+        print(f"{mode:<7} {r['writes_per_s']:>9.1f} {r['wasted_writes']:>7d} {r['max_step_deg']:>9.2f} "
+              f"{r['jerk_rms']:>9.2f} {r['max_gap_ms']:>11.0f} {r['tracking_rms_deg']:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+bench_e2e.py
+
+ブラウザの操作 (HTTP 送信) からサーボのパルス幅が実際に変わるまでのエンドツーエンド遅延のベンチマーク。
+
+pigpiod の代役 (fake_pigpiod.py) をこのプロセス内で起動し、04_webServo.py / 041_webServo_key.py を
+PIGPIO_ADDR / PIGPIO_PORT でそこにつないだサブプロセスとして起動します。
+入力トレース (スライダーのドラッグ、キーリピートの連打など) を記録された時刻どおりに HTTP で再生し、
+各コマンドについて
+  - HTTP 送信 -> 応答 (http)
+  - HTTP 送信 -> 代役 pigpiod が GPIO 18 への書き込みを受信 (e2e)
+を計測して、スループットと遅延のパーセンタイルを出力します。
+時刻はどちらもこのプロセスの time.monotonic() で測るので、プロセス間の時計のずれはありません。
+
+後続のコマンドで上書きされて書き込まれなかったコマンドは superseded (ServoWorker が同じサーボへの
+古い目標を捨てるため)、直前と同じ角度でパルス幅が変わらないコマンドは unchanged として数えます。
+
+実機は不要です。結果は --json で JSON として出力でき、コミット ID も含むのでコミット間の比較に使えます。
+
+トレースは組み込みの名前 (slider, keyrepeat) か JSON ファイルで指定します。
+JSON ファイルは [[時刻(秒), 角度], ...] のリスト、または {"name": ..., "events": [...]} の形式です。
+
+使用方法:
+  python3 bench_e2e.py
+  python3 bench_e2e.py --script 041 --trace keyrepeat --latency 0.002 --json > before.json
+  python3 bench_e2e.py --trace my_trace.json --repeat 5
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from bench_workers import free_port, wait_for_port
+from fake_pigpiod import CMD_PWM, CMD_SERVO, FakePigpiod
+from multi_servo import angle_to_pulse_us
+
+HERE = Path(__file__).resolve().parent
+
+SERVO_GPIO = 18
+
+# スクリプトごとの起動方法とサーボの設定 (両スクリプトとも -90〜90 度, 0.5〜2.4 ms)
+SCRIPTS = {
+    "04": {"file": "04_webServo.py", "path": "/move_servo"},
+    "041": {"file": "041_webServo_key.py", "path": "/move"},
+}
+MIN_ANGLE, MAX_ANGLE = -90, 90
+MIN_PULSE_WIDTH, MAX_PULSE_WIDTH = 0.0005, 0.0024
+
+# 照合するときのパルス幅の許容誤差 (µs)。gpiozero は PWM のデューティ比で設定するので丸めが入る
+PULSE_TOLERANCE_US = 3
+
+
+def slider_trace():
+    """スライダーのドラッグ。041 の UI は 50 ms のデバウンス後に送るので、約 60 ms 間隔で値が届く。"""
+    events = []
+    t = 0.0
+    for sweep in range(4):
+        angles = range(-90, 91, 6) if sweep % 2 == 0 else range(90, -91, -6)
+        for a in angles:
+            events.append((round(t, 4), a))
+            t += 0.06
+        t += 0.5  # 手を止める
+    return events
+
+
+def keyrepeat_trace():
+    """矢印キーの押しっぱなし。キーリピート (約 30 回/秒) で 25 度ずつ送る。"""
+    step = 25
+    events = []
+    t = 0.0
+    angle = 0
+    for burst in range(10):
+        direction = 1 if burst % 2 == 0 else -1
+        for _ in range(12):
+            angle = max(MIN_ANGLE, min(MAX_ANGLE, angle + direction * step))
+            events.append((round(t, 4), angle))
+            t += 1 / 30
+        t += 0.4
+    return events
+
+
+TRACES = {"slider": slider_trace, "keyrepeat": keyrepeat_trace}
+
+
+def load_trace(spec):
+    """トレース名または JSON ファイルから (名前, [(時刻, 角度), ...]) を返す。"""
+    if spec in TRACES:
+        return spec, TRACES[spec]()
+    with open(spec) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        name, events = data.get("name", Path(spec).stem), data["events"]
+    else:
+        name, events = Path(spec).stem, data
+    events = sorted((float(t), float(a)) for t, a in events)
+    if not events:
+        raise ValueError(f"トレースが空です: {spec}")
+    return name, events
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=HERE,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def percentiles(values):
+    if not values:
+        return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+    values = sorted(values)
+    n = len(values)
+    return {
+        "p50_ms": statistics.median(values) * 1000,
+        "p90_ms": values[min(n - 1, int(n * 0.90))] * 1000,
+        "p99_ms": values[min(n - 1, int(n * 0.99))] * 1000,
+        "max_ms": values[-1] * 1000,
+    }
+
+
+def fmt(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def replay(port, path, events):
+    """トレースを時刻どおりに送信し、[(送信時刻, 応答時刻, 角度, 成功)] を返す。
+
+    ブラウザの fetch と同じく 1 コマンドごとに接続する。遅れた場合は待たずに次を送る。
+    """
+    sent = []
+    start = time.monotonic()
+    for t, angle in events:
+        delay = start + t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        t0 = time.monotonic()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request(
+                "POST",
+                path,
+                body=f"angle={angle}",
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+            )
+            resp = conn.getresponse()
+            resp.read()
+            conn.close()
+            ok = resp.status < 300
+        except OSError:
+            ok = False
+        sent.append((t0, time.monotonic(), angle, ok))
+    return sent
+
+
+def wait_idle(daemon, quiet=0.3, timeout=5.0):
+    """代役 pigpiod へのコマンドが quiet 秒途切れるまで待つ (ワーカーのキューが空になるのを待つ)。"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with daemon.lock:
+            last = daemon.commands[-1][0] if daemon.commands else 0.0
+        if time.monotonic() - last >= quiet:
+            return
+        time.sleep(0.05)
+
+
+def pin_writes(daemon, since):
+    """since 以降の GPIO 18 への書き込みを [(時刻, パルス幅 µs)] で返す。"""
+    with daemon.lock:
+        commands = [c for c in daemon.commands if c[0] >= since]
+        rng = daemon.pwm_range.get(SERVO_GPIO, 255)
+        freq = daemon.pwm_frequency.get(SERVO_GPIO, 800)
+    writes = []
+    for t, cmd, gpio, value, result in commands:
+        if gpio != SERVO_GPIO or result < 0:
+            continue
+        if cmd == CMD_SERVO:
+            writes.append((t, float(value)))
+        elif cmd == CMD_PWM:
+            writes.append((t, value / rng * 1_000_000 / freq))
+    return writes
+
+
+def match(sent, writes):
+    """各コマンドについて、そのパルス幅の書き込みが最初に届いた時刻までの遅延を求める。
+
+    直前のコマンドと同じ角度 (パルス幅が変わらない) のコマンドは unchanged として数える。
+    同じ角度の次のコマンドが送られるまでに書き込みが見つからなければ上書きされたとみなす。
+    """
+    latencies = []
+    superseded = unchanged = 0
+    w = 0
+    previous = None
+    for i, (t0, _, angle, ok) in enumerate(sent):
+        if not ok:
+            continue
+        if angle == previous:
+            unchanged += 1
+            continue
+        previous = angle
+        expected = angle_to_pulse_us(angle, MIN_ANGLE, MAX_ANGLE, MIN_PULSE_WIDTH, MAX_PULSE_WIDTH)
+        limit = next((s[0] for s in sent[i + 1:] if s[2] == angle), float("inf"))
+        while w < len(writes) and writes[w][0] < t0:
+            w += 1
+        found = next((t for t, us in writes[w:] if t < limit and abs(us - expected) <= PULSE_TOLERANCE_US), None)
+        if found is None:
+            superseded += 1
+        else:
+            latencies.append(found - t0)
+    return latencies, superseded, unchanged
+
+
+def start_server(script, daemon):
+    port = free_port()
+    env = dict(os.environ, PIGPIO_ADDR="127.0.0.1", PIGPIO_PORT=str(daemon.port))
+    env.pop("SERVO_PIN_FACTORY", None)
+    server = subprocess.Popen(
+        [sys.executable, str(HERE / SCRIPTS[script]["file"]), "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+    except TimeoutError:
+        server.kill()
+        raise
+    return server, port
+
+
+def run_one(script, trace_name, events, daemon, repeat):
+    server, port = start_server(script, daemon)
+    try:
+        wait_idle(daemon)
+        sent = []
+        writes = []
+        elapsed = 0.0
+        for _ in range(repeat):
+            since = time.monotonic()
+            round_sent = replay(port, SCRIPTS[script]["path"], events)
+            wait_idle(daemon)
+            round_writes = pin_writes(daemon, since)
+            end = round_writes[-1][0] if round_writes else round_sent[-1][1]
+            elapsed += max(end, round_sent[-1][1]) - since
+            sent += round_sent
+            writes += round_writes
+    finally:
+        server.terminate()
+        server.wait(5)
+
+    ok = [s for s in sent if s[3]]
+    latencies, superseded, unchanged = match(sent, writes)
+    return {
+        "script": SCRIPTS[script]["file"],
+        "trace": trace_name,
+        "commands": len(sent),
+        "http_errors": len(sent) - len(ok),
+        "applied": len(latencies),
+        "superseded": superseded,
+        "unchanged": unchanged,
+        "pin_writes": len(writes),
+        "commands_per_s": len(ok) / elapsed if elapsed > 0 else 0.0,
+        "http": percentiles([s[1] - s[0] for s in ok]),
+        "e2e": percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 送信からパルス幅の変化までのエンドツーエンド遅延を計測")
+    parser.add_argument("--script", choices=["04", "041", "both"], default="both", help="計測するスクリプト (既定: both)")
+    parser.add_argument("--trace", nargs="+", default=list(TRACES),
+                        help=f"再生するトレース ({' / '.join(TRACES)} または JSON ファイル, 既定: 全て)")
+    parser.add_argument("--repeat", type=int, default=1, help="各トレースの再生回数 (既定: 1)")
+    parser.add_argument("--latency", type=float, default=0.0, help="代役 pigpiod の 1 コマンドあたりの遅延(秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="代役 pigpiod のランダム遅延の最大値(秒)")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    scripts = list(SCRIPTS) if args.script == "both" else [args.script]
+    traces = [load_trace(spec) for spec in args.trace]
+
+    results = []
+    with FakePigpiod(latency=args.latency, jitter=args.jitter, seed=0) as daemon:
+        for script in scripts:
+            for name, events in traces:
+                results.append(run_one(script, name, events, daemon, args.repeat))
+
+    if args.json:
+        report = {
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "pigpiod_latency": args.latency,
+            "pigpiod_jitter": args.jitter,
+            "results": results,
+        }
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'script':<20} {'trace':<10} {'cmds':>5} {'applied':>7} {'superseded':>10} {'unchanged':>9} "
+          f"{'http p50':>9} {'e2e p50':>8} {'e2e p99':>8} {'e2e max':>8}  (ms)")
+    for r in results:
+        e2e = r["e2e"]
+        print(
+            f"{r['script']:<20} {r['trace']:<10} {r['commands']:>5} {r['applied']:>7} {r['superseded']:>10} {r['unchanged']:>9} "
+            f"{fmt(r['http']['p50_ms']):>9} {fmt(e2e['p50_ms']):>8} {fmt(e2e['p99_ms']):>8} {fmt(e2e['max_ms']):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+bench_events.py
+
+GET /events (servo_events.py の Server-Sent Events) の負荷テスト。
+04_webServo.py をサブプロセスで起動し、何もしないで接続しているだけの購読者
+(0 人 / 1 人 / --subscribers 人) のそれぞれで、サーバープロセスの
+
+  cpu %     : 計測時間中の CPU 使用率 (/proc/<pid>/stat の utime + stime)
+  rss MiB   : 常駐メモリ (/proc/<pid>/status の VmRSS)
+  threads   : スレッド数 (1 接続 1 スレッド + producer 1 本)
+
+を測ります。状態を読むのは producer の 1 本だけなので、購読者が増えても CPU は増えず、
+メモリはスレッドのスタックの分だけ増えるはずです。
+最後に POST /move_servo を 1 回送り、全購読者にイベントが届くまでの時間を測ります。
+
+実機は不要です (SERVO_PIN_FACTORY=mock でモックのピンを使用)。Linux の /proc を使います。
+
+使用方法:
+  python3 bench_events.py
+  python3 bench_events.py --subscribers 50 --duration 10 --json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from bench_workers import free_port, wait_for_port
+
+HERE = Path(__file__).resolve().parent
+CLOCK_TICK = os.sysconf("SC_CLK_TCK")
+
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        # comm に空白が入ることがあるので ")" の後ろから数える
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICK
+
+
+def proc_status(pid):
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            status[key] = value.split()
+    return {"rss_mib": int(status["VmRSS"][0]) / 1024, "threads": int(status["Threads"][0])}
+
+
+class Subscriber:
+    """GET /events を開いたままにする購読者 (生のソケット)。"""
+
+    def __init__(self, port):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self.sock.sendall(b"GET /events HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n")
+        self.buffer = b""
+        self.events = 0
+
+    def read(self):
+        """届いた分を読み、data: の行の数を数える。"""
+        chunk = self.sock.recv(65536)
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split(b"\n")
+        self.events += sum(1 for line in lines if line.startswith(b"data: "))
+        return chunk
+
+    def close(self):
+        self.sock.close()
+
+
+def wait_events(subscribers, count, timeout):
+    """全購読者が count 個以上のイベントを受け取るまで読み、かかった秒数を返す。"""
+    selector = selectors.DefaultSelector()
+    for s in subscribers:
+        s.sock.setblocking(False)
+        selector.register(s.sock, selectors.EVENT_READ, s)
+    start = time.perf_counter()
+    deadline = start + timeout
+    try:
+        while any(s.events < count for s in subscribers):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError("イベントが全購読者に届きません")
+            for key, _ in selector.select(remaining):
+                key.data.read()
+        return time.perf_counter() - start
+    finally:
+        selector.close()
+        for s in subscribers:
+            s.sock.setblocking(True)
+
+
+def move(port, angle):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("POST", "/move_servo", body=f"angle={angle}",
+                 headers={"Content-Type": "application/x-www-form-urlencoded"})
+    conn.getresponse().read()
+    conn.close()
+
+
+def measure(pid, duration):
+    """何もせずに duration 秒待ち、その間の CPU 使用率と終了時のメモリ・スレッド数を返す。"""
+    cpu = cpu_seconds(pid)
+    start = time.perf_counter()
+    time.sleep(duration)
+    elapsed = time.perf_counter() - start
+    return {"cpu_percent": (cpu_seconds(pid) - cpu) / elapsed * 100, **proc_status(pid)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GET /events の購読者数と CPU・メモリの負荷テスト")
+    parser.add_argument("--subscribers", type=int, default=50, help="同時に接続する購読者数 (既定: 50)")
+    parser.add_argument("--duration", type=float, default=5.0, help="1 条件あたりの計測秒数 (既定: 5)")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    port = free_port()
+    env = dict(os.environ, SERVO_PIN_FACTORY="mock", SERVO_DAEMON="off")
+    server = subprocess.Popen(
+        [sys.executable, str(HERE / "04_webServo.py"), "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    subscribers = []
+    results = []
+    try:
+        wait_for_port(port)
+        # 起動直後の初期化が落ち着くまで待つ
+        time.sleep(1.0)
+        for count in sorted({0, 1, args.subscribers}):
+            while len(subscribers) < count:
+                subscribers.append(Subscriber(port))
+            # 最初のイベント (接続時の状態) を全員が受け取ってから計測
+            wait_events(subscribers, 1, 10.0)
+            results.append({"subscribers": count, **measure(server.pid, args.duration)})
+
+        # 角度を 1 回変えて、全購読者に届くまでの時間
+        start = time.perf_counter()
+        move(port, 45)
+        fanout = time.perf_counter() - start + wait_events(subscribers, 2, 10.0)
+    finally:
+        for s in subscribers:
+            s.close()
+        server.terminate()
+        server.wait(5)
+
+    base = results[0]
+    report = {
+        "results": results,
+        "fanout_ms": fanout * 1000,
+        "cpu_percent_delta": results[-1]["cpu_percent"] - base["cpu_percent"],
+        "rss_mib_delta": results[-1]["rss_mib"] - base["rss_mib"],
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'subscribers':>11} {'cpu %':>7} {'rss MiB':>8} {'threads':>8}")
+    for r in results:
+        print(f"{r['subscribers']:>11} {r['cpu_percent']:>7.2f} {r['rss_mib']:>8.1f} {r['threads']:>8}")
+    print(f"0 人 -> {args.subscribers} 人: CPU {report['cpu_percent_delta']:+.2f} ポイント, "
+          f"メモリ {report['rss_mib_delta']:+.1f} MiB")
+    print(f"角度の変更が {args.subscribers} 人全員に届くまで: {report['fanout_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
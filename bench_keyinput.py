@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+bench_keyinput.py
+
+05_keybordSarvo.py のキー入力処理のベンチマーク。
+疑似端末 (pty) にキー入力を流し込み、処理できたキー数/秒と 1 キーあたりの CPU 時間、
+サーボへの書き込み回数を測ります。
+
+  - event : 現在の方式 (raw モードを維持し、selectors で待って届いたキーをまとめて処理)
+  - legacy: 以前の方式 (1 キーごとに tcgetattr/setraw/tcsetattr, 画面クリアに os.system, 毎回 sleep 0.05)
+            setraw は既定で入力を破棄する (TCSAFLUSH) ため、処理中に届いたキーは失われます (lost)
+
+入力の流し方:
+  - flood : 全キーを一度に書き込む (キーリピートが溜まった状態)
+  - repeat: --rate 回/秒で書き込む (キーを押しっぱなしにした状態)
+
+実機は不要です (gpiozero の MockFactory を使用)。
+
+使用方法:
+  python3 bench_keyinput.py
+  python3 bench_keyinput.py --keys 2000 --rate 30 --json
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import select
+import termios
+import threading
+import time
+import tty
+from pathlib import Path
+
+from gpiozero import AngularServo
+from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+from key_input import RawKeyboard
+
+HERE = Path(__file__).resolve().parent
+
+# legacy 方式で入力が途絶えたとみなすまでの時間 (秒)。計測時間からは差し引く
+IDLE_TIMEOUT = 0.5
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location("keybord_servo", HERE / "05_keybordSarvo.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CountingServo:
+    """書き込み回数を数える AngularServo のラッパー。"""
+
+    def __init__(self, servo):
+        self._servo = servo
+        self.writes = 0
+
+    @property
+    def angle(self):
+        return self._servo.angle
+
+    @angle.setter
+    def angle(self, value):
+        self.writes += 1
+        self._servo.angle = value
+
+
+def key_sequence(count):
+    """右 10 回 -> 左 7 回 を繰り返すキー列 (矢印キーと a/d を混ぜる)。"""
+    keys = []
+    for i in range(count):
+        right = i % 17 < 10
+        if i % 2 == 0:
+            keys.append(b"\x1b[C" if right else b"\x1b[D")
+        else:
+            keys.append(b"d" if right else b"a")
+    return keys
+
+
+def feed(master, keys, rate):
+    """keys を master 側に書き込み、最後に q を送る。rate が None なら一度に書き込む。"""
+    if rate is None:
+        os.write(master, b"".join(keys))
+    else:
+        start = time.monotonic()
+        for i, key in enumerate(keys):
+            delay = start + i / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            os.write(master, key)
+    os.write(master, b"q")
+
+
+def legacy_loop(script, fd, servo, out, writer):
+    """以前の 05_keybordSarvo.py のループを再現したもの (比較用)。処理したキー数を返す。
+
+    破棄されて q が届かない場合に備え、送信が終わって IDLE_TIMEOUT 秒入力が無ければ終える。
+    """
+    angle = script.INITIAL_ANGLE
+    handled = 0
+    while True:
+        old = termios.tcgetattr(fd)
+        try:
+            tty.setraw(fd)
+            if not select.select([fd], [], [], IDLE_TIMEOUT)[0] and not writer.is_alive():
+                return handled
+            key = os.read(fd, 1).decode()
+            if key == "\x1b":
+                key += os.read(fd, 1).decode() + os.read(fd, 1).decode()
+        finally:
+            termios.tcsetattr(fd, termios.TCSADRAIN, old)
+        angle, quit = script.apply_keys(angle, [key])
+        if quit:
+            return handled
+        handled += 1
+        servo.angle = angle
+        # 画面クリア (ここでは出力を捨てる)
+        os.system('printf "\\033c" > /dev/null')
+        out.write(f"Current angle: {angle}°\r\n")
+        time.sleep(0.05)
+
+
+def run_one(script, engine, keys, rate):
+    master, slave = os.openpty()
+    factory = MockFactory(pin_class=MockPWMPin)
+    servo = CountingServo(AngularServo(18, min_pulse_width=0.0005, max_pulse_width=0.0025, pin_factory=factory))
+    writer = threading.Thread(target=feed, args=(master, keys, rate), daemon=True)
+    out = open(os.devnull, "w")
+    try:
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_before = time.thread_time()
+        start = time.perf_counter()
+        if engine == "event":
+            with RawKeyboard(slave) as keyboard:
+                writer.start()
+                script.control_loop(servo, keyboard, script.INITIAL_ANGLE, out)
+            # 読み込みは失われないので、q までの全キーを処理している
+            handled = len(keys)
+        else:
+            writer.start()
+            handled = legacy_loop(script, slave, servo, out, writer)
+        elapsed = time.perf_counter() - start
+        if engine == "legacy" and handled < len(keys):
+            elapsed -= IDLE_TIMEOUT
+        cpu = time.thread_time() - cpu_before
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        # os.system で起動したシェルの CPU 時間も含める
+        cpu += (children_after.ru_utime - children_before.ru_utime) + (children_after.ru_stime - children_before.ru_stime)
+        writer.join()
+    finally:
+        out.close()
+        os.close(master)
+        os.close(slave)
+        factory.close()
+
+    return {
+        "engine": engine,
+        "input": "flood" if rate is None else f"repeat@{rate:g}/s",
+        "keys": len(keys),
+        "handled": handled,
+        "lost": len(keys) - handled,
+        "keys_per_s": handled / elapsed,
+        "cpu_us_per_key": cpu / max(handled, 1) * 1_000_000,
+        "servo_writes": servo.writes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="05_keybordSarvo.py のキー入力処理のベンチマーク")
+    parser.add_argument("--keys", type=int, default=1000, help="event 方式で送るキー数 (既定: 1000)")
+    parser.add_argument("--legacy-keys", type=int, default=60, help="legacy 方式で送るキー数 (遅いので少なめ, 既定: 60)")
+    parser.add_argument("--rate", type=float, default=30.0, help="repeat 入力のキー/秒 (既定: 30 = 一般的なキーリピート)")
+    parser.add_argument("--no-legacy", action="store_true", help="legacy 方式の計測を省略")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    script = load_script()
+    repeat_keys = max(1, int(args.rate * 2))  # repeat は約 2 秒分
+    results = [
+        run_one(script, "event", key_sequence(args.keys), None),
+        run_one(script, "event", key_sequence(repeat_keys), args.rate),
+    ]
+    if not args.no_legacy:
+        results += [
+            run_one(script, "legacy", key_sequence(args.legacy_keys), None),
+            run_one(script, "legacy", key_sequence(repeat_keys), args.rate),
+        ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'engine':<7} {'input':<14} {'keys':>6} {'lost':>5} {'keys/s':>10} {'CPU µs/key':>11} {'servo writes':>13}")
+    for r in results:
+        print(
+            f"{r['engine']:<7} {r['input']:<14} {r['keys']:>6} {r['lost']:>5} {r['keys_per_s']:>10.1f} "
+            f"{r['cpu_us_per_key']:>11.1f} {r['servo_writes']:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
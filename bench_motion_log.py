@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+bench_motion_log.py
+
+モーションログ (motion_log.py) の記録のオーバーヘッドを計測するベンチマーク。
+servo.angle への 1 回の書き込みにかかる時間を、記録なしの AngularServo と
+RecordingServo で包んだものとで比較し、MotionRecorder.record() 単体の時間も測ります。
+
+サーボは gpiozero の MockFactory で作るので実機は不要です。
+
+使用方法:
+  python3 bench_motion_log.py
+  python3 bench_motion_log.py --writes 200000 --json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from gpiozero import AngularServo
+from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+from motion_log import MotionRecorder, RecordingServo
+
+
+def time_writes(write, writes, repeat):
+    """write(angle) を writes 回呼ぶのを repeat 回繰り返し、1 回あたりの ns の中央値を返す。"""
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        for i in range(writes):
+            write((i % 180) - 90)
+        runs.append((time.perf_counter_ns() - t0) / writes)
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="モーションログの記録オーバーヘッドのベンチマーク")
+    parser.add_argument("--writes", type=int, default=50000, help="1 回の計測での書き込み数 (既定: 50000)")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数 (既定: 5)")
+    parser.add_argument("--capacity", type=int, default=65536, help="ログの容量 (既定: 65536)")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    factory = MockFactory(pin_class=MockPWMPin)
+    servo = AngularServo(18, min_pulse_width=0.0005, max_pulse_width=0.0024, pin_factory=factory)
+    with tempfile.TemporaryDirectory() as tmp:
+        recorder = MotionRecorder(os.path.join(tmp, "motion.bin"), args.capacity)
+        recording = RecordingServo(servo, recorder)
+
+        def plain_write(angle):
+            servo.angle = angle
+
+        def recording_write(angle):
+            recording.angle = angle
+
+        def record_only(angle):
+            recorder.record(0, angle)
+
+        results = {
+            "servo_ns": time_writes(plain_write, args.writes, args.repeat),
+            "recording_servo_ns": time_writes(recording_write, args.writes, args.repeat),
+            "record_only_ns": time_writes(record_only, args.writes, args.repeat),
+        }
+        recorder.close()
+    servo.close()
+    results["overhead_ns"] = results["recording_servo_ns"] - results["servo_ns"]
+    results["overhead_percent"] = results["overhead_ns"] / results["servo_ns"] * 100
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"記録なし (AngularServo)       : {results['servo_ns']:8.0f} ns/書き込み")
+    print(f"記録あり (RecordingServo)     : {results['recording_servo_ns']:8.0f} ns/書き込み")
+    print(f"MotionRecorder.record() 単体  : {results['record_only_ns']:8.0f} ns/書き込み")
+    print(f"記録のオーバーヘッド          : {results['overhead_ns']:8.0f} ns ({results['overhead_percent']:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
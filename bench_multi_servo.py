@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+bench_multi_servo.py
+
+MultiServo (multi_servo.py) のベンチマーク。
+1 / 4 / 8 / 16 台のサーボについて、1 ティックで全サーボの角度を変えたときの
+ソケット往復回数とティック時間を、従来方式 (1 コマンドごとに応答待ち) と
+まとめ送り方式で比較します。
+
+pigpiod の代わりにローカルの代役サーバー (fake_pigpiod.py) を使うので実機は不要です。
+
+使用方法:
+  python3 bench_multi_servo.py
+  python3 bench_multi_servo.py --ticks 2000 --json
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from fake_pigpiod import FakePigpiod
+from multi_servo import MultiServo
+
+# 16 台分の GPIO (BCM 番号)
+PINS = [4, 5, 6, 12, 13, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26]
+
+
+def bench(port, count, ticks, batched):
+    with MultiServo(PINS[:count], port=port, host="127.0.0.1", batched=batched) as ms:
+        tick_times = []
+        for t in range(ticks):
+            # 毎ティック全サーボの角度を変える
+            angle = (t % 2) * 90 - 45
+            targets = [angle] * count
+            t0 = time.perf_counter()
+            ms.set_targets(targets)
+            tick_times.append(time.perf_counter() - t0)
+        tick_times.sort()
+        return {
+            "servos": count,
+            "mode": "batched" if batched else "per-command",
+            "round_trips_per_tick": ms.round_trips / ticks,
+            "tick_mean_us": statistics.fmean(tick_times) * 1e6,
+            "tick_p99_us": tick_times[min(len(tick_times) - 1, int(len(tick_times) * 0.99))] * 1e6,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="複数サーボのまとめ送りベンチマーク")
+    parser.add_argument("--ticks", type=int, default=500, help="計測するティック数 (既定: 500)")
+    parser.add_argument("--servos", type=int, nargs="+", default=[1, 4, 8, 16], help="サーボ台数 (既定: 1 4 8 16)")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    results = []
+    with FakePigpiod() as daemon:
+        for count in args.servos:
+            for batched in (False, True):
+                results.append(bench(daemon.port, count, args.ticks, batched))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'servos':>6} {'mode':<12} {'trips/tick':>10} {'mean us':>10} {'p99 us':>10}")
+    for r in results:
+        print(
+            f"{r['servos']:>6} {r['mode']:<12} {r['round_trips_per_tick']:>10.1f} "
+            f"{r['tick_mean_us']:>10.1f} {r['tick_p99_us']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
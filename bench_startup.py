@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py
+
+スクリプトの起動時間のベンチマーク。servod (servo_daemon.py) を使う場合と使わない場合で、
+プロセスの起動からサーボへの最初の書き込みが終わるまでの時間を比較します。
+
+  direct : スクリプトのプロセスで gpiozero を import し、pin factory を作って AngularServo を初期化する (従来)
+  daemon : 常駐している servod に servo_client でつなぐ (gpiozero を import しない)
+
+各モードで 02_sarvo.py と同じ手順 (open_servo -> angle = 0) を行う小さなスクリプトを
+サブプロセスで起動し、起動から最初の書き込み完了まで (first_write) とプロセス終了まで (total) を測ります。
+pigpiod の代わりにローカルの代役サーバー (fake_pigpiod.py) を使うので実機は不要です。
+Raspberry Pi 上で --real を付けると、起動中の本物の pigpiod を使います。
+
+使用方法:
+  python3 bench_startup.py
+  python3 bench_startup.py --runs 20 --json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_pigpiod import FakePigpiod
+
+HERE = Path(__file__).resolve().parent
+
+# 子プロセスで実行するスクリプト。最初の書き込みが終わった時刻 (time.time()) を出力する
+CHILD = """
+import sys, time
+sys.path.insert(0, {here!r})
+from pin_factory import create_factory
+from servo_client import open_servo
+servo = open_servo(18, min_pulse_width=0.0005, max_pulse_width=0.0024, factory=create_factory, use_daemon={use_daemon})
+servo.angle = 0
+print(time.time(), flush=True)
+servo.close()
+"""
+
+
+def run_child(mode, env):
+    code = CHILD.format(here=str(HERE), use_daemon=mode == "daemon")
+    start = time.time()
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    total = time.time() - start
+    return float(out.stdout.split()[-1]) - start, total
+
+
+def wait_for_socket(path, proc, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("servod が終了しました")
+        if os.path.exists(path):
+            return
+        time.sleep(0.05)
+    raise TimeoutError(f"servod が起動しません: {path}")
+
+
+def bench(mode, runs, env):
+    run_child(mode, env)  # ディスクキャッシュを温める
+    first, total = [], []
+    for _ in range(runs):
+        f, t = run_child(mode, env)
+        first.append(f)
+        total.append(t)
+    return {
+        "mode": mode,
+        "runs": runs,
+        "first_write_ms": statistics.median(first) * 1000,
+        "first_write_max_ms": max(first) * 1000,
+        "total_ms": statistics.median(total) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="servod あり / なしのスクリプト起動時間のベンチマーク")
+    parser.add_argument("--runs", type=int, default=10, help="各モードの起動回数 (既定: 10)")
+    parser.add_argument("--latency", type=float, default=0.0, help="代役 pigpiod の 1 コマンドあたりの遅延(秒)")
+    parser.add_argument("--real", action="store_true", help="代役を使わず本物の pigpiod を使う (Raspberry Pi 上)")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop("SERVO_PIN_FACTORY", None)
+    env.pop("SERVO_MOTION_LOG", None)
+    daemon = None
+    if not args.real:
+        daemon = FakePigpiod(latency=args.latency).start()
+        env["PIGPIO_ADDR"] = "127.0.0.1"
+        env["PIGPIO_PORT"] = str(daemon.port)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # 常駐中の servod とぶつからないよう、ベンチマーク用の servod は一時ディレクトリのソケットで起動する
+        env["SERVOD_SOCKET"] = os.path.join(tmp, "servod.sock")
+        try:
+            results.append(bench("direct", args.runs, env))
+            servod = subprocess.Popen([sys.executable, str(HERE / "servo_daemon.py")], env=env,
+                                      stdout=subprocess.DEVNULL)
+            try:
+                wait_for_socket(env["SERVOD_SOCKET"], servod)
+                results.append(bench("daemon", args.runs, env))
+            finally:
+                servod.terminate()
+                servod.wait()
+        finally:
+            if daemon is not None:
+                daemon.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'mode':<8} {'first write ms':>15} {'max ms':>10} {'total ms':>10}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['first_write_ms']:>15.1f} {r['first_write_max_ms']:>10.1f} {r['total_ms']:>10.1f}")
+    direct, servod = results
+    print(f"servod を使うと最初の書き込みまで {direct['first_write_ms'] / servod['first_write_ms']:.1f} 倍速くなります")
+
+
+if __name__ == "__main__":
+    main()
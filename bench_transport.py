@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+bench_transport.py
+
+041_webServo_key.py の 2 つの送信経路を比較するベンチマーク。
+  - POST /move (フォーム形式, 1 コマンド = 1 HTTP リクエスト)
+  - WebSocket /ws (3 バイトのバイナリフレーム, 接続は張りっぱなし)
+
+実機は不要です。SERVO_PIN_FACTORY=mock でモックのピンを使い、
+Flask アプリを同じプロセス内の Werkzeug サーバーで起動して計測します。
+
+使用方法:
+  pip install flask-sock      # WebSocket 側の計測に必要
+  python3 bench_transport.py
+  python3 bench_transport.py --count 2000 --json
+"""
+
+import argparse
+import http.client
+import importlib.util
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+from werkzeug.serving import make_server
+
+import servo_protocol
+
+HERE = Path(__file__).resolve().parent
+
+
+def load_app(script_name):
+    """数字で始まるスクリプトを mock の pin factory でモジュールとして読み込む。"""
+    os.environ["SERVO_PIN_FACTORY"] = "mock"
+    sys.path.insert(0, str(HERE))
+    spec = importlib.util.spec_from_file_location(Path(script_name).stem, HERE / script_name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def angles(count):
+    """-90〜90 を往復する角度列 (毎回値が変わるようにする)。"""
+    for i in range(count):
+        phase = i % 360
+        yield phase - 90 if phase < 180 else 270 - phase
+
+
+def summarize(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    n = len(latencies)
+    return {
+        "transport": name,
+        "commands": n,
+        "commands_per_s": n / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(n - 1, int(n * 0.99))] * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+def bench_post(port, count):
+    latencies = []
+    start = time.perf_counter()
+    for angle in angles(count):
+        t0 = time.perf_counter()
+        # Werkzeug の開発サーバーは keep-alive しないので、ブラウザの fetch と同じく毎回接続し直しになる
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.request(
+            "POST",
+            "/move",
+            body=f"angle={angle}",
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        resp = conn.getresponse()
+        resp.read()
+        conn.close()
+        if resp.status >= 300:
+            raise RuntimeError(f"POST /move が失敗しました: {resp.status}")
+        latencies.append(time.perf_counter() - t0)
+    return summarize("post", latencies, time.perf_counter() - start)
+
+
+def bench_ws(port, count):
+    from simple_websocket import Client
+
+    ws = Client.connect(f"ws://127.0.0.1:{port}/ws")
+    latencies = []
+    try:
+        start = time.perf_counter()
+        for angle in angles(count):
+            t0 = time.perf_counter()
+            ws.send(servo_protocol.encode(0, angle))
+            _, applied = servo_protocol.decode(ws.receive())
+            if applied is None:
+                raise RuntimeError("WebSocket でエラー応答を受信しました")
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+    finally:
+        ws.close()
+    return summarize("websocket", latencies, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="POST /move と WebSocket /ws の速度比較")
+    parser.add_argument("--count", "-n", type=int, default=500, help="送信するコマンド数 (既定: 500)")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    # リクエストごとのアクセスログは計測の邪魔になるので抑止
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    module = load_app("041_webServo_key.py")
+    module.set_worker(module.init_hardware())
+    server = make_server("127.0.0.1", 0, module.app, threaded=True)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = [bench_post(port, args.count)]
+    if module.sock is not None:
+        results.append(bench_ws(port, args.count))
+    else:
+        print("flask-sock が無いため WebSocket の計測をスキップしました", file=sys.stderr)
+
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'transport':<10} {'cmds/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for r in results:
+        print(
+            f"{r['transport']:<10} {r['commands_per_s']:>10.1f} "
+            f"{r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['max_ms']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
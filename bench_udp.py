@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+bench_udp.py
+
+041_webServo_key.py の UDP エンドポイント (--udp-port, servo_udp.py) の負荷テスト。
+041 をサブプロセスで起動し、複数の送信プロセスから localhost へデータグラムを送り続けて、
+
+  sent/s      : 送ったパケット数/秒
+  received/s  : UdpListener が受け取ったパケット数/秒 (維持できた受信レート)
+  applied/s   : ワーカーに渡した指令の数/秒 (まとめて読んだ分は最新の 1 つだけ)
+  lost        : 送ったが受け取られなかった数 (カーネルの受信バッファあふれ)
+  stale / superseded : 通し番号が古くて捨てた数 / まとめて読んだ中で新しい方に置き換えた数
+
+を GET /metrics の servo_udp_packets から測ります。
+--reorder を指定すると、その割合のパケットを 1 つ前のパケットと入れ替えて送り、順序の逆転を再現します
+(後から届いた古い方は stale として捨てられるはずです)。
+
+実機は不要です (SERVO_PIN_FACTORY=mock でモックのピンを使用)。
+
+使用方法:
+  python3 bench_udp.py
+  python3 bench_udp.py --senders 4 --duration 5 --rate 1000 --reorder 0.05 --json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import servo_protocol
+from bench_workers import free_port, wait_for_port
+
+HERE = Path(__file__).resolve().parent
+
+
+def free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def sender(port, duration, rate, reorder, seed, result_queue):
+    """duration 秒間データグラムを送り続け、送った数を返す。rate が 0 なら全速力。"""
+    rng = random.Random(seed)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = ("127.0.0.1", port)
+    sent = 0
+    seq = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        if rate:
+            delay = start + sent / rate - now
+            if delay > 0:
+                time.sleep(delay)
+        # スティックを往復させたような角度
+        angle = ((seq % 360) - 180) / 2
+        seq += 1
+        if reorder and rng.random() < reorder:
+            # 次のパケットを先に送ってから、このパケットを送る (順序の逆転)
+            sock.sendto(servo_protocol.encode_datagram(seq, 0, angle), address)
+            sock.sendto(servo_protocol.encode_datagram(seq - 1, 0, angle), address)
+            seq += 1
+            sent += 2
+        else:
+            sock.sendto(servo_protocol.encode_datagram(seq - 1, 0, angle), address)
+            sent += 1
+    sock.close()
+    result_queue.put(sent)
+
+
+def udp_stats(http_port):
+    """GET /metrics から servo_udp_packets{result=...} を読む。"""
+    with urllib.request.urlopen(f"http://127.0.0.1:{http_port}/metrics", timeout=5) as resp:
+        text = resp.read().decode()
+    stats = {}
+    for line in text.splitlines():
+        if line.startswith("servo_udp_packets{"):
+            name, value = line.rsplit(" ", 1)
+            stats[name.split('"')[1]] = int(float(value))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="041_webServo_key.py --udp-port の負荷テスト")
+    parser.add_argument("--senders", type=int, default=2, help="同時に送信するプロセス数 (既定: 2)")
+    parser.add_argument("--duration", type=float, default=3.0, help="送信する秒数 (既定: 3)")
+    parser.add_argument("--rate", type=float, default=0, help="送信プロセスあたりのパケット数/秒 (既定: 0 = 全速力)")
+    parser.add_argument("--reorder", type=float, default=0.0, help="順序を入れ替えて送るパケットの割合 (既定: 0)")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    http_port = free_port()
+    udp_port = free_udp_port()
+    env = dict(os.environ, SERVO_PIN_FACTORY="mock", SERVO_DAEMON="off")
+    server = subprocess.Popen(
+        [sys.executable, str(HERE / "041_webServo_key.py"), "--port", str(http_port), "--udp-port", str(udp_port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(http_port)
+        result_queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=sender,
+                                         args=(udp_port, args.duration, args.rate, args.reorder, i, result_queue))
+                 for i in range(args.senders)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        sent = sum(result_queue.get() for _ in procs)
+        elapsed = time.perf_counter() - start
+        for p in procs:
+            p.join()
+        # 受信バッファに残っている分を処理し終えるまで待つ
+        time.sleep(0.5)
+        stats = udp_stats(http_port)
+    finally:
+        server.terminate()
+        server.wait(5)
+
+    results = {
+        "senders": args.senders,
+        "rate": args.rate,
+        "reorder": args.reorder,
+        "sent": sent,
+        "sent_per_s": sent / elapsed,
+        "received_per_s": stats["received"] / elapsed,
+        "applied_per_s": stats["applied"] / elapsed,
+        "lost": sent - stats["received"],
+        **stats,
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    rate = f"{args.rate:g} パケット/秒" if args.rate else "全速力"
+    print(f"送信: {args.senders} プロセス x {rate}, {args.duration:g}秒, 順序の入れ替え {args.reorder:.0%}")
+    print(f"{'sent/s':>10} {'received/s':>11} {'applied/s':>10} {'lost':>8} {'stale':>7} {'superseded':>11} {'invalid':>8}")
+    print(f"{results['sent_per_s']:>10.0f} {results['received_per_s']:>11.0f} {results['applied_per_s']:>10.0f} "
+          f"{results['lost']:>8} {results['stale']:>7} {results['superseded']:>11} {results['invalid']:>8}")
+
+
+if __name__ == "__main__":
+    main()
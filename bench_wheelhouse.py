@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+bench_wheelhouse.py
+
+Python ライブラリのインストール時間のベンチマーク。新しい仮想環境に対して
+
+  network    : 今までの setup_rpi.py の手順 (pip install --upgrade pip と、ネットワークからの pip install)
+  wheelhouse : wheelhouse.py で作った wheel から --no-index でインストール
+
+を行い、かかった時間と短縮できた時間を表示します。新しい台を想定して pip のキャッシュは使いません
+(--no-cache-dir)。Raspberry Pi 上では network の方に RPi.GPIO のコンパイルが入ります。
+
+使用方法:
+  python3 wheelhouse.py                       # 先に wheelhouse を作る
+  python3 bench_wheelhouse.py
+  python3 bench_wheelhouse.py --dir ~/rpgpiotest/wheelhouse --runs 3 --json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import venv
+
+from setup_rpi import PYTHON_PACKAGES
+from wheelhouse import DEFAULT_DIR, has_lock, install_args
+
+
+def timed_install(mode, directory, tmp):
+    """新しい仮想環境を作り、mode の手順でインストールする秒数 (仮想環境の作成は含めない)。"""
+    env_dir = tempfile.mkdtemp(dir=tmp)
+    venv.create(env_dir, with_pip=True)
+    pip = [os.path.join(env_dir, "bin", "python"), "-m", "pip", "--no-cache-dir", "--disable-pip-version-check",
+           "--quiet"]
+    if mode == "network":
+        commands = [pip + ["install", "--upgrade", "pip"], pip + ["install", *PYTHON_PACKAGES]]
+    else:
+        commands = [pip + ["install", *install_args(directory)]]
+    start = time.monotonic()
+    for cmd in commands:
+        subprocess.run(cmd, check=True)
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ネットワークからと wheelhouse からの pip install の時間の比較")
+    parser.add_argument("--dir", default=DEFAULT_DIR, help=f"wheelhouse のディレクトリ (既定: {DEFAULT_DIR})")
+    parser.add_argument("--runs", type=int, default=1, help="各手順の実行回数 (既定: 1)")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    if not has_lock(args.dir):
+        sys.exit(f"{args.dir} に requirements.lock がありません。先に python3 wheelhouse.py を実行してください")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("network", "wheelhouse"):
+            seconds = [timed_install(mode, args.dir, tmp) for _ in range(args.runs)]
+            results.append({"mode": mode, "runs": args.runs, "median_s": statistics.median(seconds),
+                            "max_s": max(seconds)})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'mode':<11} {'median s':>9} {'max s':>8}")
+    for r in results:
+        print(f"{r['mode']:<11} {r['median_s']:>9.2f} {r['max_s']:>8.2f}")
+    network, wheelhouse = results
+    saved = network["median_s"] - wheelhouse["median_s"]
+    print(f"wheelhouse を使うと 1 台あたり {saved:.1f}秒 短縮できます ({network['median_s'] / wheelhouse['median_s']:.1f} 倍速)")
+
+
+if __name__ == "__main__":
+    main()
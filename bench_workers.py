@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+bench_workers.py
+
+04_webServo.py のマルチワーカー起動 (--workers) の負荷テスト。
+ワーカー数を変えて 04_webServo.py をサブプロセスで起動し、
+複数のクライアントプロセスから POST /move_servo を送り続けて requests/s を測ります。
+
+実機は不要です (SERVO_PIN_FACTORY=mock でモックのピンを使用)。
+
+使用方法:
+  python3 bench_workers.py
+  python3 bench_workers.py --workers 1 2 4 8 --worker-type thread --duration 5
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"サーバーがポート {port} で起動しません")
+
+
+def client_loop(port, duration, result_queue):
+    """duration 秒間 POST を送り続け、(成功数, 失敗数) を返す。"""
+    ok = errors = 0
+    i = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        angle = (i % 180) - 90
+        i += 1
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request(
+                "POST",
+                "/move_servo",
+                body=f"angle={angle}",
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+            )
+            resp = conn.getresponse()
+            resp.read()
+            conn.close()
+            if resp.status < 300:
+                ok += 1
+            else:
+                errors += 1
+        except OSError:
+            errors += 1
+    result_queue.put((ok, errors))
+
+
+def run_one(workers, worker_type, clients, duration):
+    port = free_port()
+    sock_path = os.path.join(tempfile.mkdtemp(), "servo.sock")
+    env = dict(os.environ, SERVO_PIN_FACTORY="mock")
+    server = subprocess.Popen(
+        [sys.executable, str(HERE / "04_webServo.py"), "--workers", str(workers),
+         "--worker-type", worker_type, "--port", str(port), "--ipc-socket", sock_path],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+        result_queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=client_loop, args=(port, duration, result_queue))
+                 for _ in range(clients)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        results = [result_queue.get() for _ in procs]
+        elapsed = time.perf_counter() - start
+        for p in procs:
+            p.join()
+    finally:
+        server.terminate()
+        server.wait(5)
+
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return {
+        "workers": workers,
+        "worker_type": worker_type,
+        "clients": clients,
+        "requests": ok,
+        "errors": errors,
+        "requests_per_s": ok / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="04_webServo.py --workers の負荷テスト")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="試すワーカー数 (既定: 1 2 4)")
+    parser.add_argument("--worker-type", choices=["process", "thread"], default="process")
+    parser.add_argument("--clients", type=int, default=8, help="同時に送信するクライアントプロセス数 (既定: 8)")
+    parser.add_argument("--duration", type=float, default=3.0, help="1 条件あたりの計測秒数 (既定: 3)")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    args = parser.parse_args()
+
+    results = [run_one(n, args.worker_type, args.clients, args.duration) for n in args.workers]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'workers':>7} {'type':<8} {'req/s':>10} {'errors':>7}")
+    for r in results:
+        print(f"{r['workers']:>7} {r['worker_type']:<8} {r['requests_per_s']:>10.1f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
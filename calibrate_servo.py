@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+calibrate_servo.py
+
+サーボのキャリブレーション (角度 -> パルス幅) を測って servo_calibration のプロファイルに保存するツール。
+
+目標の角度ごとにパルス幅を少しずつ変えてサーボを動かし、分度器などで実際の角度が
+目標に合ったところで Enter を押します。角度はサーボの中心を 0 度とした値です。
+保存したプロファイルは servo_client.open_servo() を使う全スクリプト (02〜06) が自動で使います。
+
+使用方法:
+  python3 calibrate_servo.py                                  # GPIO 18 を -90, -45, 0, 45, 90 度で測る
+  python3 calibrate_servo.py --pin 19 --angles -90 -60 -30 0 30 60 90
+  python3 calibrate_servo.py --points=-90:520,0:1460,90:2430  # 測った値をそのまま保存
+  python3 calibrate_servo.py --show                           # 保存済みのプロファイルと線形変換との差を表示
+
+操作 (測定中):
+  +  / -   : パルス幅を 10µs 増やす / 減らす
+  ++ / --  : 50µs 増やす / 減らす
+  数値     : そのパルス幅 (µs) にする
+  Enter    : この角度を決定
+  s        : この角度を飛ばす
+  q        : 中断 (保存しない)
+"""
+
+import argparse
+import os
+import sys
+
+from servo_calibration import CalibrationProfile, default_servo_id, load_profile, profile_path
+
+# 測定中に出してよいパルス幅の範囲 (µs)。SG90 の可動範囲より少し広い
+PULSE_LIMITS = (400, 2600)
+STEPS = {"+": 10, "-": -10, "++": 50, "--": -50}
+
+
+def linear_us(angle, min_angle, max_angle, min_us, max_us):
+    return min_us + (angle - min_angle) / (max_angle - min_angle) * (max_us - min_us)
+
+
+def measure(servo, angle, us):
+    """1 つの角度についてパルス幅を調整してもらい、決定した µs (飛ばしたら None) を返す。"""
+    while True:
+        servo.angle = us
+        line = input(f"  {angle:+7.1f}度: {us:5d}µs > ").strip()
+        if line == "":
+            return us
+        if line == "s":
+            return None
+        if line == "q":
+            raise KeyboardInterrupt
+        if line in STEPS:
+            us += STEPS[line]
+        else:
+            try:
+                us = int(float(line))
+            except ValueError:
+                print("    +, -, ++, --, 数値, Enter, s, q のどれかを入力してください")
+                continue
+        us = max(PULSE_LIMITS[0], min(PULSE_LIMITS[1], us))
+
+
+def show(profile, min_us, max_us, step=15):
+    """プロファイルの点と、step 度ごとの線形変換との差を表示する。"""
+    print(f"servo_id: {profile.servo_id}  ({profile.min_angle:g}〜{profile.max_angle:g}度, "
+          f"{profile.min_pulse_us:g}〜{profile.max_pulse_us:g}µs)")
+    print("測定点: " + ", ".join(f"{a:g}度={us:g}µs" for a, us in profile.points))
+    print(f"{'角度':>6} {'補正後 µs':>10} {'線形 µs':>9} {'差 µs':>7}")
+    angle = profile.min_angle
+    worst = 0.0
+    while angle <= profile.max_angle:
+        calibrated = profile.pulse_us(angle)
+        linear = linear_us(angle, -90, 90, min_us, max_us)
+        worst = max(worst, abs(calibrated - linear))
+        print(f"{angle:6.0f} {calibrated:10.1f} {linear:9.1f} {calibrated - linear:+7.1f}")
+        angle += step
+    # 差 (µs) を線形変換の角度に直すと、補正しない場合の角度の誤差になる
+    print(f"線形変換 ({min_us}〜{max_us}µs) との差は最大 {worst:.1f}µs "
+          f"(約 {worst / (max_us - min_us) * 180:.1f}度)")
+
+
+def parse_points(text):
+    """"-90:520,0:1460,90:2430" -> [(-90.0, 520.0), ...]"""
+    points = []
+    for item in text.split(","):
+        angle, _, us = item.partition(":")
+        try:
+            points.append((float(angle), float(us)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"角度:パルス幅µs をカンマ区切りで指定してください: {text}") from None
+    return points
+
+
+def main():
+    parser = argparse.ArgumentParser(description="サーボのキャリブレーション (角度 -> パルス幅) の測定と保存")
+    parser.add_argument("--pin", type=int, default=18, help="サーボの GPIO 番号 (既定: 18)")
+    parser.add_argument("--servo-id", help="プロファイルの名前 (既定: gpio<ピン番号>)")
+    parser.add_argument("--angles", type=float, nargs="+", default=[-90, -45, 0, 45, 90],
+                        help="測る角度 (既定: -90 -45 0 45 90)")
+    parser.add_argument("--min-pulse", type=int, default=500, help="-90度の初期値・比較用の線形変換の最小 µs (既定: 500)")
+    parser.add_argument("--max-pulse", type=int, default=2400, help="90度の初期値・比較用の線形変換の最大 µs (既定: 2400)")
+    parser.add_argument("--points", type=parse_points, metavar="角度:µs,...",
+                        help="サーボを動かさずに、測った値からプロファイルを作る (負の角度があるので --points=... の形で指定)")
+    parser.add_argument("--show", action="store_true", help="保存済みのプロファイルを表示する")
+    args = parser.parse_args()
+
+    servo_id = args.servo_id or default_servo_id(args.pin)
+    path = profile_path(servo_id)
+
+    if args.show:
+        profile = load_profile(servo_id)
+        if profile is None:
+            sys.exit(f"{path} がありません (SERVO_CALIBRATION=off の場合も読みません)")
+        show(profile, args.min_pulse, args.max_pulse)
+        return
+
+    if args.points:
+        try:
+            profile = CalibrationProfile(servo_id, args.points)
+        except ValueError as e:
+            sys.exit(f"保存できません: {e}")
+        print(f"保存しました: {profile.save(path)}")
+        show(profile, args.min_pulse, args.max_pulse)
+        return
+
+    from pin_factory import create_factory
+    from servo_client import open_servo
+
+    # 初期値は前回のプロファイル (あれば) か、線形変換の値
+    previous = load_profile(servo_id) if os.path.exists(path) else None
+
+    def initial_us(angle):
+        if previous is not None and previous.min_angle <= angle <= previous.max_angle:
+            return int(round(previous.pulse_us(angle)))
+        return int(round(linear_us(angle, -90, 90, args.min_pulse, args.max_pulse)))
+
+    # 角度 = パルス幅 µs になるように開く (測定中はキャリブレーションを使わない)
+    lo, hi = PULSE_LIMITS
+    servo = open_servo(args.pin, min_angle=lo, max_angle=hi, min_pulse_width=lo / 1_000_000,
+                       max_pulse_width=hi / 1_000_000, initial_angle=initial_us(0), factory=create_factory,
+                       calibrate=False)
+    print(f"GPIO {args.pin} ({servo_id}) を測定します。実際の角度が目標に合ったら Enter を押してください")
+    points = []
+    try:
+        for angle in args.angles:
+            us = measure(servo, angle, initial_us(angle))
+            if us is not None:
+                points.append((angle, us))
+    except (KeyboardInterrupt, EOFError):
+        print("\n中断しました (保存していません)")
+        return
+    finally:
+        servo.detach()
+        servo.close()
+
+    try:
+        profile = CalibrationProfile(servo_id, points)
+    except ValueError as e:
+        sys.exit(f"保存できません: {e}")
+    print(f"保存しました: {profile.save(path)}")
+    show(profile, args.min_pulse, args.max_pulse)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""サーボの PWM 周期 (50 Hz = 20 ms) ごとに 1 回だけ書き込む固定周期の制御ループ。
+
+ServoWorker はリクエストが届くたびに書き込むので、1 フレーム (20 ms) の間に何度も書いたり
+(サーボが受け取るのはフレームの頭のパルスだけなので、途中の書き込みは無駄)、
+リクエストが途切れると長い間書かなかったり (カクつき) します。
+
+ControlLoop は ServoWorker と同じ submit() / angle() / stats() を持ち、
+各フロントエンド (Web UI, WebSocket, キーボード, シーケンス) は目標角度を渡すだけです。
+ループはフレームごとに、出力を目標へ向けて最大 max_velocity (度/秒) だけ動かして 1 回書き込みます。
+目標に着いたサーボは書き込みません。
+
+フレームの時刻は絶対時刻 (monotonic) で決めるので遅れは積み上がらず、
+処理が 1 フレーム以上遅れた場合は間のフレームを飛ばします (overruns に数える)。
+pigpiod の PWM の位相は読めないため、周期だけを PWM (frame_width 20 ms) に合わせています。
+
+submit() の Future は、次のフレームで実際に書いた角度 (slew 制限中なら途中の角度) で完了します。
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+FRAME_RATE = 50.0  # Hz (サーボの PWM 周期 20 ms)
+
+
+class ControlLoop:
+    """servo_id -> サーボ の辞書を受け取り、固定周期で目標角度へ向けて書き込む。"""
+
+    def __init__(self, servos, rate=FRAME_RATE, max_velocity=None, write_seconds=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.servos = servos
+        self.period = 1.0 / rate
+        # 1 フレームで動かせる最大の角度 (None なら目標へ 1 フレームで移動)
+        self.max_step = max_velocity * self.period if max_velocity else None
+        # servo.angle の書き込み時間を記録するヒストグラム (servo_metrics.Histogram, 任意)
+        self.write_seconds = write_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self._targets = {}        # servo_id -> 目標角度 (着いたら消す)
+        self._futures = {}        # servo_id -> [次のフレームで完了させる Future]
+        self._outputs = {}        # servo_id -> 最後に書いた角度
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.submitted = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.errors = 0
+        self.frames = 0
+        self.overruns = 0
+        self._thread = threading.Thread(target=self._run, name="servo-control-loop", daemon=True)
+
+    def start(self):
+        for servo_id, servo in self.servos.items():
+            self._outputs[servo_id] = servo.angle
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        self._stopped.set()
+        self._thread.join(timeout)
+
+    def submit(self, servo_id, angle):
+        """目標角度を設定し、次のフレームで書いた角度を返す Future を返す。
+
+        同じフレームの間に届いた目標は最後のものだけが使われます (coalesced に数える)。
+        """
+        if servo_id not in self.servos:
+            raise KeyError(f"unknown servo id: {servo_id}")
+        future = Future()
+        with self._lock:
+            self.submitted += 1
+            futures = self._futures.setdefault(servo_id, [])
+            if futures:
+                self.coalesced += 1
+            futures.append(future)
+            self._targets[servo_id] = angle
+        return future
+
+    def angle(self, servo_id):
+        """現在の角度 (最後に書き込んだ値)。"""
+        return self.servos[servo_id].angle
+
+    def stats(self):
+        """ServoWorker と同じキーに、フレーム数と飛ばしたフレーム数を加えた統計。"""
+        with self._lock:
+            return {
+                "queue_depth": len(self._targets),
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "dropped": 0,
+                "applied": self.applied,
+                "errors": self.errors,
+                "frames": self.frames,
+                "overruns": self.overruns,
+            }
+
+    def tick(self):
+        """1 フレーム分: 目標と出力が違うサーボを max_step だけ目標へ動かして書き込む。"""
+        with self._lock:
+            self.frames += 1
+            targets = dict(self._targets)
+            futures = self._futures
+            self._futures = {}
+        for servo_id, target in targets.items():
+            current = self._outputs.get(servo_id)
+            angle = target
+            if current is not None and self.max_step is not None:
+                angle = current + max(-self.max_step, min(self.max_step, target - current))
+            waiting = futures.get(servo_id, ())
+            if angle == current:
+                reached = True
+            else:
+                try:
+                    start = time.perf_counter()
+                    self.servos[servo_id].angle = angle
+                    if self.write_seconds is not None:
+                        self.write_seconds.observe(time.perf_counter() - start)
+                except Exception as e:
+                    print(f"サーボエラー: {e}", file=sys.stderr)
+                    with self._lock:
+                        self.errors += 1
+                        if self._targets.get(servo_id) == target:
+                            del self._targets[servo_id]
+                    for f in waiting:
+                        f.set_exception(e)
+                    continue
+                self._outputs[servo_id] = angle
+                reached = angle == target
+                with self._lock:
+                    self.applied += 1
+            if reached:
+                with self._lock:
+                    # このフレームの間に新しい目標が来ていなければ完了
+                    if self._targets.get(servo_id) == target:
+                        del self._targets[servo_id]
+            for f in waiting:
+                f.set_result(angle)
+
+    def _run(self):
+        deadline = self.clock()
+        while not self._stopped.is_set():
+            deadline += self.period
+            delay = deadline - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+            elif -delay >= self.period:
+                # 1 フレーム以上遅れた: 間のフレームは飛ばして次の周期に合わせ直す
+                missed = int(-delay / self.period)
+                deadline += missed * self.period
+                with self._lock:
+                    self.overruns += missed
+            self.tick()
@@ -0,0 +1,177 @@
+"""コインプッシャー (06) の往復サイクルが最も速くなるパラメーターの探索。
+
+06_coinpushout.py の 1 往復は
+    移動 (angle2 -> angle1) + 待ち + 移動 (angle1 -> angle2) + 待ち
+で、移動時間は trajectory.plan() の軌道で決まります。ここでは実機を使わず、
+指令角に一定の速さでしか追従できないサーボのモデル (SimulatedServo) を仮想時間で動かして
+1 往復の時間を求め、安全上の制約を満たす中で 1 分あたりの往復回数が最大になる
+(プロファイル, ramp_step, ramp_delay, wait) を探します。
+
+制約:
+  max_speed : 指令の最高速度 (度/秒) = ramp_step / ramp_delay の上限
+  min_dwell : サーボが実際に目標角に着いてから次の移動までの最小待ち時間 (秒)
+  max_accel : 加速度の上限 (度/秒^2)。指定すると加速度が無限大になる linear は候補から外す
+
+待ち時間 (wait) は「指令が目標に届いてからサーボが追いつくまでの遅れ + min_dwell」を
+0.05 秒単位に切り上げた値にします。
+
+結果は JSON の設定ファイルに保存し、06_coinpushout.py --settings で読み込めます。
+"""
+
+import json
+import math
+from typing import NamedTuple
+
+import trajectory
+
+FRAME = 0.02                  # サーボの PWM 周期。これより細かく指令しても意味がない
+RAMP_DELAYS = (0.02, 0.03, 0.04, 0.05, 0.06, 0.08, 0.1)
+SPEED_STEPS = 12              # 速度の候補数 (max_speed を上限に等分)
+WAIT_RESOLUTION = 0.05
+SIM_DT = 0.001                # シミュレーションの刻み (秒)
+ARRIVAL_TOLERANCE = 1.0       # 目標角に着いたとみなす誤差 (度)
+
+# 設定ファイルに保存し、06 の引数の既定値として読み込む項目
+SETTINGS_KEYS = ("angle1", "angle2", "wait", "ramp_step", "ramp_delay", "profile", "max_accel")
+
+
+class CycleResult(NamedTuple):
+    profile: str
+    ramp_step: float | None
+    ramp_delay: float
+    wait: float
+    max_accel: float | None
+    cycle_time: float         # 1 往復の時間 (秒)
+    peak_speed: float         # 指令の最高速度 (度/秒)
+    settle: float             # 指令が目標に届いてからサーボが追いつくまでの最大遅れ (秒)
+    violations: tuple         # 満たしていない制約 (空なら OK)
+
+    @property
+    def cycles_per_min(self):
+        return 60.0 / self.cycle_time if self.cycle_time > 0 else math.inf
+
+
+class SimulatedServo:
+    """指令角に最大 speed 度/秒で追従するサーボのモデル。"""
+
+    def __init__(self, angle, speed):
+        self.angle = float(angle)
+        self.speed = speed
+
+    def advance(self, command, dt):
+        step = self.speed * dt
+        diff = command - self.angle
+        self.angle = command if abs(diff) <= step else self.angle + math.copysign(step, diff)
+
+
+def simulate_move(servo, start, target, ramp_step, ramp_delay, profile, max_accel):
+    """1 回の移動をシミュレーションし、(指令の所要時間, 追従遅れ, 指令の最高速度) を返す。
+
+    move_with_ramp() と同じく、軌道の i 番目の角度を times[i] 秒に指令する。
+    ramp_step が None なら即移動 (指令は一瞬で目標へ)。
+    """
+    if ramp_step is None:
+        times, angles = (0.0,), (float(target),)
+        peak = math.inf
+    else:
+        traj = trajectory.plan(start, target, profile, ramp_step / ramp_delay, max_accel, ramp_delay)
+        times, angles = traj.times, traj.angles
+        prev_t, prev_a = 0.0, start
+        peak = 0.0
+        for t, a in zip(times, angles):
+            peak = max(peak, abs(a - prev_a) / max(t - prev_t, 1e-9))
+            prev_t, prev_a = t, a
+
+    t = 0.0
+    command = start
+    i = 0
+    while i < len(times) or abs(servo.angle - target) > ARRIVAL_TOLERANCE:
+        while i < len(times) and times[i] <= t + 1e-12:
+            command = angles[i]
+            i += 1
+        servo.advance(command, SIM_DT)
+        t += SIM_DT
+    return times[-1], max(0.0, t - times[-1]), peak
+
+
+def evaluate(angle1, angle2, wait, ramp_step, ramp_delay, profile, max_accel,
+             servo_speed, max_speed=None, min_dwell=0.0):
+    """パラメーターで 1 往復 (angle2 -> angle1 -> angle2) したときの結果を返す。"""
+    servo = SimulatedServo(angle2, servo_speed)
+    accel = None if profile == "linear" else max_accel
+    cycle = 0.0
+    settle = 0.0
+    peak = 0.0
+    for start, target in ((angle2, angle1), (angle1, angle2)):
+        duration, lag, move_peak = simulate_move(servo, start, target, ramp_step, ramp_delay, profile, accel)
+        cycle += duration + wait
+        settle = max(settle, lag)
+        peak = max(peak, move_peak)
+
+    violations = []
+    if max_speed is not None and peak > max_speed * (1 + 1e-6):
+        violations.append(f"最高速度 {peak:.0f}度/秒 > {max_speed:g}")
+    if wait - settle < min_dwell - 1e-9:
+        violations.append(f"到着後の待ち {max(wait - settle, 0):.2f}秒 < {min_dwell:g}")
+    return CycleResult(profile, ramp_step, ramp_delay, wait, accel, cycle, peak, settle, tuple(violations))
+
+
+def optimize(angle1, angle2, max_speed, min_dwell, servo_speed, max_accel=None):
+    """制約を満たす中で 1 分あたりの往復回数が最大になる CycleResult を返す。
+
+    同じ周期なら指令速度の低い (サーボに優しい) 方を選ぶ。
+    """
+    profiles = [p for p in trajectory.PROFILES if not (max_accel and p == "linear")]
+    best = None
+    for profile in profiles:
+        for ramp_delay in RAMP_DELAYS:
+            for k in range(1, SPEED_STEPS + 1):
+                velocity = max_speed * k / SPEED_STEPS
+                ramp_step = round(velocity * ramp_delay, 3)
+                if ramp_step <= 0:
+                    continue
+                # まず待ち 0 で追従遅れを求め、それに min_dwell を足した待ち時間で評価し直す
+                probe = evaluate(angle1, angle2, 0.0, ramp_step, ramp_delay, profile, max_accel, servo_speed)
+                wait = math.ceil((probe.settle + min_dwell) / WAIT_RESOLUTION - 1e-9) * WAIT_RESOLUTION
+                result = evaluate(angle1, angle2, round(wait, 3), ramp_step, ramp_delay, profile, max_accel,
+                                  servo_speed, max_speed, min_dwell)
+                if result.violations:
+                    continue
+                if best is None or (result.cycle_time, result.peak_speed) < (best.cycle_time - 1e-9, best.peak_speed):
+                    best = result
+    return best
+
+
+def format_result(label, result):
+    status = "OK" if not result.violations else "制約違反: " + ", ".join(result.violations)
+    step = "即移動" if result.ramp_step is None else f"ramp_step={result.ramp_step:g}, ramp_delay={result.ramp_delay:g}"
+    return (
+        f"{label}: {result.cycles_per_min:.1f} 往復/分 (1 往復 {result.cycle_time:.2f}秒) "
+        f"profile={result.profile}, {step}, wait={result.wait:g}  [{status}]"
+    )
+
+
+def save_settings(path, angle1, angle2, result, bounds):
+    settings = {
+        "angle1": angle1,
+        "angle2": angle2,
+        "wait": result.wait,
+        "ramp_step": result.ramp_step,
+        "ramp_delay": result.ramp_delay,
+        "profile": result.profile,
+        "max_accel": result.max_accel,
+        "cycles_per_min": round(result.cycles_per_min, 2),
+        "bounds": bounds,
+    }
+    with open(path, "w") as f:
+        json.dump(settings, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def load_settings(path):
+    """設定ファイルから 06 の引数として使う項目だけを返す (None の項目は除く)。"""
+    with open(path) as f:
+        settings = json.load(f)
+    if not isinstance(settings, dict):
+        raise ValueError("JSON のオブジェクトではありません")
+    return {k: settings[k] for k in SETTINGS_KEYS if settings.get(k) is not None}
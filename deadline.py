@@ -0,0 +1,99 @@
+"""絶対時刻 (monotonic) のデッドラインでステップを実行するスケジューラー。
+
+「処理 -> sleep(ramp_delay)」の繰り返しだと、1 ステップの周期が
+処理時間 + sleep + 寝過ごし になり、ステップ数が多いほど遅れが積み上がります。
+DeadlineExecutor は各ステップを 移動開始時刻 + 軌道上の時刻 に実行するので遅れが蓄積せず、
+次のステップの時刻を過ぎてしまった場合は途中のステップを飛ばして追いつきます
+(最後のステップ = 目標角は必ず実行)。
+
+各ステップの遅れ (lateness) は JitterStats に記録し、summary() でまとめて確認できます。
+"""
+
+import time
+from array import array
+
+# 遅れのヒストグラムの刻み (秒) と上限。上限を超えた分は最後の箱に入れる
+_BIN = 0.0001
+_BINS = 10000  # 0.1 ms x 10000 = 1 秒
+
+
+class JitterStats:
+    """ステップごとの遅れの統計。長時間動かしてもメモリが増えないようヒストグラムで持つ。"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.steps = 0
+        self.missed = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._hist = array("L", [0]) * (_BINS + 1)
+
+    def record(self, lateness):
+        lateness = max(0.0, lateness)
+        self.steps += 1
+        self.total += lateness
+        if lateness > self.max:
+            self.max = lateness
+        self._hist[min(int(lateness / _BIN), _BINS)] += 1
+
+    def percentile(self, q):
+        if self.steps == 0:
+            return 0.0
+        rank = q / 100 * self.steps
+        seen = 0
+        for i, count in enumerate(self._hist):
+            seen += count
+            if seen >= rank:
+                return min((i + 1) * _BIN, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "steps": self.steps,
+            "missed": self.missed,
+            "mean_ms": (self.total / self.steps * 1000) if self.steps else 0.0,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        return (
+            f"ジッター: steps={s['steps']}, missed={s['missed']}, "
+            f"mean={s['mean_ms']:.2f}ms, p99={s['p99_ms']:.2f}ms, max={s['max_ms']:.2f}ms"
+        )
+
+
+class DeadlineExecutor:
+    """times[i] (開始からの秒) の時刻に step(values[i]) を呼ぶ。"""
+
+    def __init__(self, stats=None, clock=time.monotonic, sleep=time.sleep):
+        self.stats = stats if stats is not None else JitterStats()
+        self._clock = clock
+        self._sleep = sleep
+
+    def run(self, times, values, step):
+        """全ステップを実行する。step の例外 (KeyboardInterrupt など) はそのまま伝わる。"""
+        start = self._clock()
+        last = len(times) - 1
+        i = 0
+        while i <= last:
+            deadline = start + times[i]
+            now = self._clock()
+            if now < deadline:
+                self._sleep(deadline - now)
+                now = self._clock()
+            else:
+                # 遅れている: 時刻を過ぎたステップは飛ばして最新のステップを実行する
+                j = i
+                while j < last and start + times[j + 1] <= now:
+                    j += 1
+                self.stats.missed += j - i
+                i = j
+                deadline = start + times[i]
+            self.stats.record(now - deadline)
+            step(values[i])
+            i += 1
+        return self.stats
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""pigpiod のソケットプロトコルを話すローカルの代役サーバー (ベンチマーク用)。
+
+実機の pigpiod と同じく、クライアントは 16 バイトのコマンド
+(cmd, p1, p2, p3 の uint32 x 4, p3 > 0 なら続けて p3 バイトの拡張データ) を送り、
+サーバーは cmd, p1, p2 と結果 (int32) の 16 バイトを返します。
+
+gpiozero の PiGPIOFactory が接続してサーボのパルス幅を設定できる程度のコマンド
+(モード・レベル・PWM・サーボ・ハードウェアリビジョン・通知ハンドルなど) に対応しているので、
+Raspberry Pi が無い普通の Linux マシンでも 03 / 04 / 041 / 05 / 06 / time_timeout_demo.py を
+そのまま動かして、実際のコマンドレートやテールレイテンシを測れます。
+
+受け取ったコマンドは時刻付きで commands に記録し (history を指定すると最新の history 個だけ)、
+log を指定するとファイルにも書き出します。
+latency / jitter で応答の遅延を、fault_rate で一定確率のエラー応答を注入できます。
+DMA 波形 (wave) のコマンドにも対応しており、登録されたパルス列は waves に、
+送信された chain は chains に記録されます。wave_tx_busy() は chain の再生時間
+(time_scale 倍) が経過するまで 1 を返します。
+
+使用方法:
+  python3 fake_pigpiod.py --port 8888 --log pigpiod.log
+  python3 fake_pigpiod.py --latency 0.002 --jitter 0.003 --fault-rate 0.01
+
+  # 別のターミナルで (gpiozero / pigpio は PIGPIO_ADDR / PIGPIO_PORT を参照します)
+  PIGPIO_ADDR=127.0.0.1 PIGPIO_PORT=8888 python3 04_webServo.py
+"""
+
+import argparse
+import collections
+import random
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+HEADER = struct.Struct("<IIII")
+RESPONSE = struct.Struct("<IIIi")
+
+PULSE = struct.Struct("<III")  # gpioOn, gpioOff, usDelay
+
+# pigpio のコマンド番号 (pigpio.py の _PI_CMD_* と同じ)
+CMD_MODES = 0
+CMD_MODEG = 1
+CMD_PUD = 2
+CMD_READ = 3
+CMD_WRITE = 4
+CMD_PWM = 5
+CMD_PRS = 6
+CMD_PFS = 7
+CMD_SERVO = 8
+CMD_BR1 = 10
+CMD_TICK = 16
+CMD_HWVER = 17
+CMD_NB = 19
+CMD_NC = 21
+CMD_PRG = 22
+CMD_PFG = 23
+CMD_PRRG = 24
+CMD_WVCLR = 27
+CMD_WVAG = 28
+CMD_WVBSY = 32
+CMD_WVHLT = 33
+CMD_WVCRE = 49
+CMD_WVDEL = 50
+CMD_GDC = 83
+CMD_GPW = 84    # get_servo_pulsewidth
+CMD_WVCHA = 93
+CMD_FG = 97
+CMD_NOIB = 99
+
+CMD_NAMES = {v: k[4:] for k, v in globals().items() if k.startswith("CMD_") and isinstance(v, int)}
+
+# 書き込み系コマンド (fault_rate によるエラー注入の既定の対象)
+WRITE_COMMANDS = frozenset({CMD_WRITE, CMD_PWM, CMD_SERVO})
+
+PI_BAD_WAVE_ID = -66
+
+# pigpiod 既定のサンプルレート (5 µs) で設定できる PWM 周波数
+PWM_FREQUENCIES = (8000, 4000, 2000, 1600, 1000, 800, 500, 400, 320, 250, 200, 160, 100, 80, 50, 40, 20, 10)
+
+# Raspberry Pi 3 Model B (gpiozero が確実に知っているリビジョン)
+DEFAULT_REVISION = 0xA02082
+
+
+def chain_duration_us(chain, waves):
+    """wave chain の再生時間 (µs)。無限ループを含む場合は None。"""
+    stack = [0]
+    i = 0
+    while i < len(chain):
+        b = chain[i]
+        if b != 255:
+            stack[-1] += sum(p[2] for p in waves.get(b, ()))
+            i += 1
+            continue
+        op = chain[i + 1]
+        if op == 0:            # ループ開始
+            stack.append(0)
+            i += 2
+        elif op == 1:          # ループ終了 (x + y * 256 回)
+            count = chain[i + 2] + chain[i + 3] * 256
+            body = stack.pop()
+            stack[-1] += body * count
+            i += 4
+        elif op == 2:          # 遅延 (x + y * 256 µs)
+            stack[-1] += chain[i + 2] + chain[i + 3] * 256
+            i += 4
+        elif op == 3:          # 無限ループ
+            return None
+        else:
+            i += 2
+    return stack[0]
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        buf = b""
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            buf += data
+            out = []
+            # 1 回の recv に複数コマンドが入っていれば (パイプライン) まとめて処理する
+            while len(buf) >= HEADER.size:
+                cmd, p1, p2, p3 = HEADER.unpack_from(buf)
+                if len(buf) < HEADER.size + p3:
+                    break
+                ext = buf[HEADER.size:HEADER.size + p3]
+                buf = buf[HEADER.size + p3:]
+                out.append(RESPONSE.pack(cmd, p1, p2, server.execute(cmd, p1, p2, ext)))
+            if out:
+                with server.lock:
+                    server.batches += 1
+                self.request.sendall(b"".join(out))
+
+
+class FakePigpiod(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """pigpiod の代役。with 文または start()/stop() で使う。
+
+    latency     : 1 コマンドごとに加える遅延 (秒)
+    jitter      : 0〜jitter 秒のランダムな遅延を追加
+    fault_rate  : fault_commands のコマンドが fault_code を返す確率 (0〜1)
+    log         : コマンドを 1 行ずつ書き出すファイル (パスまたはファイルオブジェクト)
+    time_scale  : wave chain の再生時間の倍率 (0 にすると一瞬で終わる)
+    history     : commands に残すコマンドの数 (None なら全て。長時間動かすなら指定する)
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, time_scale=1.0, latency=0.0, jitter=0.0,
+                 fault_rate=0.0, fault_code=-1, fault_commands=WRITE_COMMANDS,
+                 log=None, revision=DEFAULT_REVISION, seed=None, history=None):
+        super().__init__((host, port), _Handler)
+        self.lock = threading.Lock()
+        self.commands = collections.deque(maxlen=history)  # (monotonic 時刻, cmd, p1, p2, 結果)
+        self.received = 0           # 受け取ったコマンドの総数 (commands から消えた分も含む)
+        self.batches = 0            # 応答を返した回数 (= クライアントから見た往復回数)
+        self.faults = 0             # 注入したエラーの数
+        self.servo_pulsewidth = {}  # gpio -> µs
+        self.modes = {}             # gpio -> mode
+        self.levels = {}            # gpio -> 0/1
+        self.pwm_dutycycle = {}     # gpio -> dutycycle
+        self.pwm_range = {}         # gpio -> range
+        self.pwm_frequency = {}     # gpio -> Hz
+        self.revision = revision
+        self.latency = latency
+        self.jitter = jitter
+        self.fault_rate = fault_rate
+        self.fault_code = fault_code
+        self.fault_commands = fault_commands
+        self._random = random.Random(seed)
+        self._next_handle = 0
+        self._start = time.monotonic()
+        self._log = open(log, "a", buffering=1) if isinstance(log, str) else log
+        # wave 関連
+        self.time_scale = time_scale
+        self.waves = {}             # wave id -> [(gpioOn, gpioOff, usDelay), ...]
+        self.chains = []            # 送信された chain (bytes)
+        self._pending_pulses = []
+        self._next_wave_id = 0
+        self._busy_until = 0.0
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def execute(self, cmd, p1, p2, ext):
+        """1 コマンドを実行して結果 (int) を返す。"""
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        with self.lock:
+            if (self.fault_rate and cmd in self.fault_commands
+                    and self._random.random() < self.fault_rate):
+                self.faults += 1
+                result = self.fault_code
+            else:
+                result = self._execute(cmd, p1, p2, ext)
+            self.received += 1
+            self.commands.append((time.monotonic(), cmd, p1, p2, result))
+            if self._log is not None:
+                self._log.write(f"{time.time():.6f} {CMD_NAMES.get(cmd, cmd)} {p1} {p2} {result}\n")
+        return result
+
+    def _execute(self, cmd, p1, p2, ext):
+        if cmd == CMD_SERVO:
+            self.servo_pulsewidth[p1] = p2
+            return 0
+        if cmd == CMD_GPW:
+            return self.servo_pulsewidth.get(p1, 0)
+        if cmd == CMD_MODES:
+            self.modes[p1] = p2
+            return 0
+        if cmd == CMD_MODEG:
+            return self.modes.get(p1, 0)
+        if cmd == CMD_READ:
+            return self.levels.get(p1, 0)
+        if cmd == CMD_WRITE:
+            self.levels[p1] = p2
+            self.pwm_dutycycle[p1] = 0
+            self.servo_pulsewidth[p1] = 0
+            return 0
+        if cmd == CMD_BR1:
+            return sum(level << gpio for gpio, level in self.levels.items() if gpio < 31)
+        if cmd == CMD_PWM:
+            self.pwm_dutycycle[p1] = p2
+            self.modes[p1] = 1
+            return 0
+        if cmd == CMD_GDC:
+            return self.pwm_dutycycle.get(p1, 0)
+        if cmd == CMD_PRS:
+            self.pwm_range[p1] = p2
+            return p2
+        if cmd == CMD_PRG:
+            return self.pwm_range.get(p1, 255)
+        if cmd == CMD_PRRG:
+            return 250
+        if cmd == CMD_PFS:
+            freq = min(PWM_FREQUENCIES, key=lambda f: abs(f - p2))
+            self.pwm_frequency[p1] = freq
+            return freq
+        if cmd == CMD_PFG:
+            return self.pwm_frequency.get(p1, 800)
+        if cmd == CMD_HWVER:
+            return self.revision
+        if cmd == CMD_TICK:
+            # pigpio の tick は一周する µs カウンタ (応答は int32 なので 31 ビットに収める)
+            return int((time.monotonic() - self._start) * 1_000_000) & 0x7FFFFFFF
+        if cmd == CMD_NOIB:
+            handle = self._next_handle
+            self._next_handle += 1
+            return handle
+        if cmd in (CMD_WVCLR, CMD_WVAG, CMD_WVCRE, CMD_WVDEL, CMD_WVCHA, CMD_WVBSY, CMD_WVHLT):
+            return self._wave_command(cmd, p1, ext)
+        # PUD, FG, NB, NC などは状態を持たずに成功を返す
+        return 0
+
+    def _wave_command(self, cmd, p1, ext):
+        if cmd == CMD_WVCLR:
+            self.waves.clear()
+            self._pending_pulses = []
+            self._next_wave_id = 0
+            return 0
+        if cmd == CMD_WVAG:
+            self._pending_pulses.extend(PULSE.iter_unpack(ext))
+            return len(self._pending_pulses)
+        if cmd == CMD_WVCRE:
+            wid = self._next_wave_id
+            self._next_wave_id += 1
+            self.waves[wid] = self._pending_pulses
+            self._pending_pulses = []
+            return wid
+        if cmd == CMD_WVDEL:
+            return 0 if self.waves.pop(p1, None) is not None else PI_BAD_WAVE_ID
+        if cmd == CMD_WVCHA:
+            chain = bytes(ext)
+            self.chains.append(chain)
+            duration = chain_duration_us(chain, self.waves)
+            if duration is None:
+                self._busy_until = float("inf")
+            else:
+                self._busy_until = time.monotonic() + duration / 1_000_000 * self.time_scale
+            return 0
+        if cmd == CMD_WVBSY:
+            return 1 if time.monotonic() < self._busy_until else 0
+        # CMD_WVHLT
+        self._busy_until = 0.0
+        return 0
+
+    def pulse_width_us(self, gpio):
+        """gpio に現在出ているパルス幅 (µs)。サーボ命令と PWM のどちらで設定されても求める。"""
+        with self.lock:
+            if self.servo_pulsewidth.get(gpio):
+                return float(self.servo_pulsewidth[gpio])
+            duty = self.pwm_dutycycle.get(gpio, 0)
+            rng = self.pwm_range.get(gpio, 255)
+            freq = self.pwm_frequency.get(gpio, 800)
+            return duty / rng * 1_000_000 / freq
+
+    def reset_stats(self):
+        with self.lock:
+            self.commands.clear()
+            self.received = 0
+            self.batches = 0
+            self.faults = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-pigpiod", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pigpiod の代役サーバー (ベンチマーク用)")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けアドレス (既定: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8888, help="待ち受けポート (既定: 8888 = pigpiod と同じ)")
+    parser.add_argument("--latency", type=float, default=0.0, help="1 コマンドごとの遅延(秒) (既定: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="追加するランダム遅延の最大値(秒) (既定: 0)")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="書き込み系コマンドがエラーを返す確率 (既定: 0)")
+    parser.add_argument("--fault-code", type=int, default=-1, help="注入するエラーコード (既定: -1)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="wave chain 再生時間の倍率 (既定: 1)")
+    parser.add_argument("--log", default="-", help="コマンドログの出力先 ('-' で標準出力, 'none' で出力しない)")
+    parser.add_argument("--history", type=int, default=10000,
+                        help="メモリに残すコマンドの数 (既定: 10000。0 なら残さない)")
+    parser.add_argument("--seed", type=int, default=None, help="遅延・エラー注入の乱数シード")
+    args = parser.parse_args()
+    if args.history < 0:
+        parser.error("--history は 0 以上で指定してください")
+
+    log = {"-": sys.stdout, "none": None}.get(args.log, args.log)
+    daemon = FakePigpiod(
+        args.host,
+        args.port,
+        time_scale=args.time_scale,
+        latency=args.latency,
+        jitter=args.jitter,
+        fault_rate=args.fault_rate,
+        fault_code=args.fault_code,
+        log=log,
+        seed=args.seed,
+        history=args.history,
+    )
+    print(f"fake pigpiod: {args.host}:{daemon.port} で待ち受けます (Ctrl+C で終了)", file=sys.stderr)
+    print(f"  PIGPIO_ADDR={args.host} PIGPIO_PORT={daemon.port} を指定してスクリプトを起動してください", file=sys.stderr)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+        with daemon.lock:
+            print(f"\n受信コマンド数: {daemon.received}, 注入エラー数: {daemon.faults}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
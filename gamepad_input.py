@@ -0,0 +1,213 @@
+"""ゲームパッド・ジョイスティックの Linux 入力イベント (evdev) を読むエンジン。
+
+/dev/input/eventN から読めるのはカーネルの struct input_event の列です:
+    時刻 (timeval: 秒, マイクロ秒), type (uint16), code (uint16), value (int32)
+追加のパッケージ (python-evdev) は使わず、struct で直接解釈します。
+時刻のフィールドは long なので、32 ビットの OS では 16 バイト、64 ビットでは 24 バイトです (ネイティブのまま)。
+
+DeviceSource はデバイスを非ブロッキングで開き、selectors で入力を待って、
+溜まっているイベントを 1 回の read でまとめて読みます (key_input.RawKeyboard と同じ考え方)。
+ReplaySource は記録したファイル (デバイスから読んだバイト列そのまま。DeviceSource の record か
+`cat /dev/input/eventN > pad.bin` で作れます) を記録時刻どおりに返すので、
+実機のデバイス無しで同じ処理を通せます。
+
+どちらも read(timeout) で「最大 timeout 秒待って、届いているイベント全て」を返し、
+入力が終わったら None を返します。
+
+使用例:
+    with DeviceSource("/dev/input/event0") as pad:
+        while (events := pad.read(0.02)) is not None:
+            for t, type_, code, value in events:
+                if type_ == EV_ABS and code == ABS_X:
+                    ...
+"""
+
+import fcntl
+import glob
+import math
+import os
+import selectors
+import struct
+import time
+
+EVENT = struct.Struct("llHHi")
+# struct input_absinfo: value, minimum, maximum, fuzz, flat, resolution
+ABSINFO = struct.Struct("6i")
+
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_ABS = 0x03
+SYN_REPORT = 0
+
+# よく使う軸とボタン (linux/input-event-codes.h)
+AXES = {
+    "ABS_X": 0x00, "ABS_Y": 0x01, "ABS_Z": 0x02,
+    "ABS_RX": 0x03, "ABS_RY": 0x04, "ABS_RZ": 0x05,
+    "ABS_HAT0X": 0x10, "ABS_HAT0Y": 0x11,
+}
+BUTTONS = {
+    "BTN_SOUTH": 0x130, "BTN_EAST": 0x131, "BTN_NORTH": 0x133, "BTN_WEST": 0x134,
+    "BTN_SELECT": 0x13a, "BTN_START": 0x13b,
+}
+
+
+def EVIOCGABS(code):
+    """軸の範囲 (input_absinfo) を読む ioctl の番号 (_IOR('E', 0x40 + code, struct input_absinfo))。"""
+    return (2 << 30) | (ABSINFO.size << 16) | (ord("E") << 8) | (0x40 + code)
+
+
+def encode_event(t, type_, code, value):
+    """(時刻, type, code, value) をデバイスと同じバイト列にする (記録ファイルを作る場合に使う)。"""
+    sec = math.floor(t)
+    return EVENT.pack(sec, int(round((t - sec) * 1e6)), type_, code, value)
+
+
+def parse_events(data):
+    """バイト列をイベントのリストに分解し、(イベント, 末尾の不完全なバイト列) を返す。"""
+    end = len(data) - len(data) % EVENT.size
+    events = [(sec + usec / 1e6, type_, code, value)
+              for sec, usec, type_, code, value in EVENT.iter_unpack(data[:end])]
+    return events, data[end:]
+
+
+def find_device():
+    """最初に見つかったジョイスティック (/dev/input/by-id/*-event-joystick) のパス。無ければ None。"""
+    devices = sorted(glob.glob("/dev/input/by-id/*-event-joystick"))
+    return devices[0] if devices else None
+
+
+def normalize(value, minimum, maximum):
+    """軸の値を -1.0〜1.0 (中央 0) に変換する。範囲が潰れている (minimum >= maximum) なら 0.0。"""
+    if minimum >= maximum:
+        return 0.0
+    half = (maximum - minimum) / 2
+    x = (value - (minimum + maximum) / 2) / half
+    return max(-1.0, min(1.0, x))
+
+
+def shape(x, deadband=0.0, expo=0.0):
+    """-1.0〜1.0 の入力に不感帯と応答曲線をかける。
+
+    |x| が deadband 以下なら 0、その外側を 0〜1 に伸ばしてから
+    (1 - expo) * x + expo * x^3 (ラジコンの expo と同じ) で中央付近を鈍くする。
+    """
+    magnitude = abs(x)
+    if magnitude <= deadband:
+        return 0.0
+    magnitude = min(1.0, (magnitude - deadband) / (1.0 - deadband))
+    magnitude = (1.0 - expo) * magnitude + expo * magnitude ** 3
+    return math.copysign(magnitude, x)
+
+
+class DeviceSource:
+    """with ブロックの間、入力デバイスを非ブロッキングで開いてイベントを読む。
+
+    record にパスを渡すと、読んだバイト列をそのままファイルに書き出す (ReplaySource で再生できる)。
+    """
+
+    def __init__(self, path, record=None):
+        self.path = path
+        self.record = record
+        self.fd = None
+        self._pending = b""
+        self._selector = None
+        self._record_file = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.fd, selectors.EVENT_READ)
+        if self.record is not None:
+            self._record_file = open(self.record, "wb")
+        return self
+
+    def __exit__(self, *exc):
+        self._selector.close()
+        os.close(self.fd)
+        if self._record_file is not None:
+            self._record_file.close()
+
+    def absinfo(self, code):
+        """軸の (現在値, 最小値, 最大値)。"""
+        value, minimum, maximum, _, _, _ = ABSINFO.unpack(
+            fcntl.ioctl(self.fd, EVIOCGABS(code), bytes(ABSINFO.size)))
+        return value, minimum, maximum
+
+    def read(self, timeout=None):
+        """イベントが届くまで (最大 timeout 秒) 待ち、届いているイベントを全て返す。
+
+        タイムアウトした場合は空のリスト、デバイスが外された場合は None を返す。
+        """
+        if not self._selector.select(timeout):
+            return []
+        try:
+            data = os.read(self.fd, EVENT.size * 64)
+        except BlockingIOError:
+            return []
+        except OSError:
+            # ENODEV: デバイスが外された
+            return None
+        if not data:
+            return None
+        if self._record_file is not None:
+            self._record_file.write(data)
+        events, self._pending = parse_events(self._pending + data)
+        return events
+
+
+class ReplaySource:
+    """記録したイベントのファイルを、記録時刻どおり (speed 倍速) に返す。
+
+    clock / sleep を差し替えると (VirtualClock)、実際には待たずに同じ時刻の流れで再生できます。
+    """
+
+    def __init__(self, path, speed=1.0, clock=None, sleep=None):
+        with open(path, "rb") as f:
+            self.events, _ = parse_events(f.read())
+        self.speed = speed
+        self.clock = clock or time.monotonic
+        self.sleep = sleep or time.sleep
+        self._pos = 0
+        self._start = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def _due(self, event):
+        return self._start + (event[0] - self.events[0][0]) / self.speed
+
+    def read(self, timeout=None):
+        """次のイベントの時刻まで (最大 timeout 秒) 待ち、その時刻までのイベントを全て返す。最後まで返したら None。"""
+        if self._pos >= len(self.events):
+            return None
+        now = self.clock()
+        if self._start is None:
+            self._start = now
+        due = self._due(self.events[self._pos])
+        if timeout is not None and due > now + timeout:
+            self.sleep(timeout)
+            return []
+        if due > now:
+            self.sleep(due - now)
+        now = self.clock()
+        events = []
+        while self._pos < len(self.events) and self._due(self.events[self._pos]) <= now:
+            events.append(self.events[self._pos])
+            self._pos += 1
+        return events
+
+
+class VirtualClock:
+    """sleep() で時刻を進めるだけの時計 (ReplaySource を待たずに再生するため)。"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
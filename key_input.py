@@ -0,0 +1,108 @@
+"""端末のキー入力を raw モードのままイベント駆動で読むエンジン。
+
+キー 1 回ごとに tcgetattr / setraw / tcsetattr を繰り返すと、キーリピートの速さに追いつけず
+CPU も無駄に使います。RawKeyboard は with ブロックの間ずっと raw モードを保ち、
+selectors で入力を待って、溜まっているバイトを 1 回の read でまとめて読みます。
+1 回の read_keys() はそのとき届いているキー全てをリストで返すので、
+呼び出し側はまとめて処理 (連打を 1 回の移動に合算) できます。
+
+raw モードでは Ctrl+C もシグナルにならず CTRL_C ('\\x03') として届きます。
+また改行は自動で復帰を伴わないので、出力には '\\r\\n' を使ってください。
+
+使用例:
+    with RawKeyboard() as kb:
+        while True:
+            for key in kb.read_keys():
+                if key == KEY_LEFT:
+                    ...
+"""
+
+import codecs
+import os
+import selectors
+import sys
+import termios
+import tty
+
+KEY_UP = "\x1b[A"
+KEY_DOWN = "\x1b[B"
+KEY_RIGHT = "\x1b[C"
+KEY_LEFT = "\x1b[D"
+KEY_ESC = "\x1b"
+CTRL_C = "\x03"
+CTRL_D = "\x04"
+
+# 単独の ESC キーか、エスケープシーケンスの途中かを見分けるまでの待ち時間 (秒)
+ESC_TIMEOUT = 0.05
+
+
+def parse_keys(data):
+    """文字列をキーのリストに分解し、(キー, 末尾の不完全なエスケープシーケンス) を返す。
+
+    矢印キーなどの CSI / SS3 シーケンス ('\\x1b[C', '\\x1bOC' など) は 1 キーとして扱う。
+    """
+    keys = []
+    i = 0
+    n = len(data)
+    while i < n:
+        ch = data[i]
+        if ch != KEY_ESC:
+            keys.append(ch)
+            i += 1
+            continue
+        if i + 1 >= n:
+            break                       # ESC だけ届いている: 続きを待つ
+        if data[i + 1] not in "[O":
+            keys.append(KEY_ESC)        # ESC + 普通の文字 (Alt+キー) は別々のキーにする
+            i += 1
+            continue
+        # パラメータ (0x30-0x3F) などを読み飛ばし、終端文字 (0x40-0x7E) までを 1 キーにする
+        j = i + 2
+        while j < n and not ("\x40" <= data[j] <= "\x7e"):
+            j += 1
+        if j >= n:
+            break
+        keys.append(data[i:j + 1])
+        i = j + 1
+    return keys, data[i:]
+
+
+class RawKeyboard:
+    """with ブロックの間、端末を raw モードにしてキーを読む。"""
+
+    def __init__(self, fd=None):
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+        self._selector = None
+        self._old_attrs = None
+
+    def __enter__(self):
+        self._old_attrs = termios.tcgetattr(self.fd)
+        tty.setraw(self.fd)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.fd, selectors.EVENT_READ)
+        return self
+
+    def __exit__(self, *exc):
+        self._selector.close()
+        termios.tcsetattr(self.fd, termios.TCSADRAIN, self._old_attrs)
+
+    def read_keys(self, timeout=None):
+        """キーが届くまで (最大 timeout 秒) 待ち、届いているキーを全て返す。
+
+        タイムアウトした場合は空のリストを返す。入力が閉じられた (EOF) 場合は [CTRL_D] を返す。
+        """
+        # エスケープシーケンスの途中なら、続きを短時間だけ待つ
+        wait = ESC_TIMEOUT if self._pending else timeout
+        if not self._selector.select(wait):
+            if self._pending:
+                # 続きが来なかった: 単独の ESC キーとして扱う
+                keys, self._pending = list(self._pending), ""
+                return keys
+            return []
+        data = os.read(self.fd, 4096)
+        if not data:
+            return [CTRL_D]
+        keys, self._pending = parse_keys(self._pending + self._decoder.decode(data))
+        return keys
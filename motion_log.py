@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""サーボへの指令 (servo.angle の書き込み) を記録するバイナリログと、その再生ツール。
+
+現場で起きた動きを再現できるように、servo.angle への書き込みを
+(monotonic 時刻, servo_id, 角度) の 16 バイトのレコードとして mmap したファイルに追記します。
+ファイルは固定サイズのリングバッファなので、長時間動かしても大きくなりません
+(容量を超えると古いレコードから上書き)。detach() は角度 NaN として記録します。
+
+既存のファイルには続きから追記するので、1 つのファイルに複数回の実行 (再起動をまたぐこともある) が入ります。
+monotonic 時刻は実行 (起動) ごとに基準が違うため、記録を開くたびに servo_id = SESSION のレコード
+(区切り) を書き、再生はこの区切りごとに別々に行います (区切りの間の待ち時間は再生しません)。
+
+04 / 041 / 05 / 06 は環境変数 SERVO_MOTION_LOG にログのパスを指定すると記録します。
+  SERVO_MOTION_LOG=motion.bin python3 06_coinpushout.py --ramp-step 2
+  SERVO_MOTION_LOG_SIZE=262144      # 記録するレコード数 (既定: 65536 = 1 MiB)
+
+ファイル形式 (リトルエンディアン):
+  ヘッダー 32 バイト: magic "RPML", version (uint16), 予約 (uint16), capacity (uint32),
+                      count = 書き込んだ総数 (uint64), 記録開始時の時刻 time.time() (float64)
+  レコード 16 バイト x capacity: 時刻 (float64, time.monotonic()), servo_id (uint32), 角度 (float32)
+
+使用方法:
+  python3 motion_log.py dump motion.bin
+  python3 motion_log.py replay motion.bin                   # 記録どおりの速さで再生
+  python3 motion_log.py replay motion.bin --speed 0         # 待たずにできるだけ速く再生
+  SERVO_PIN_FACTORY=mock python3 motion_log.py replay motion.bin --min-angle 0 --max-angle 180
+"""
+
+import argparse
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"RPML"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQd4x")
+RECORD = struct.Struct("<dIf")
+DEFAULT_CAPACITY = 65536
+
+# 実行の区切りを表す servo_id (角度は NaN)
+SESSION = 0xFFFFFFFF
+
+ENV_PATH = "SERVO_MOTION_LOG"
+ENV_SIZE = "SERVO_MOTION_LOG_SIZE"
+
+
+class MotionRecorder:
+    """(時刻, servo_id, 角度) を mmap したリングバッファのファイルに書き込む。"""
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        size = HEADER.size + RECORD.size * capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            existing = os.fstat(fd).st_size
+            if existing >= HEADER.size:
+                magic, version, _, old_capacity, _, _ = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+                if magic != MAGIC or version != VERSION or old_capacity != capacity:
+                    raise ValueError(f"{path} は容量 {capacity} のモーションログではありません (別のファイルを指定してください)")
+            else:
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.path = path
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        if existing < HEADER.size:
+            self.count = 0
+            HEADER.pack_into(self._mm, 0, MAGIC, VERSION, 0, capacity, 0, time.time())
+        else:
+            # 既存のログには続きから追記する
+            self.count = HEADER.unpack_from(self._mm, 0)[4]
+        # ここからが新しい実行 (時刻の基準が前の記録と違うかもしれない)
+        self.record(SESSION, None)
+
+    def record(self, servo_id, angle):
+        t = time.monotonic()
+        with self._lock:
+            offset = HEADER.size + RECORD.size * (self.count % self.capacity)
+            RECORD.pack_into(self._mm, offset, t, servo_id, math.nan if angle is None else angle)
+            self.count += 1
+            struct.pack_into("<Q", self._mm, 12, self.count)
+
+    def close(self):
+        self._mm.flush()
+        self._mm.close()
+
+
+class RecordingServo:
+    """AngularServo を包み、angle への書き込みと detach() を記録する。それ以外はそのまま委譲する。"""
+
+    def __init__(self, servo, recorder, servo_id=0):
+        object.__setattr__(self, "_servo", servo)
+        object.__setattr__(self, "_recorder", recorder)
+        object.__setattr__(self, "_servo_id", servo_id)
+
+    @property
+    def angle(self):
+        return self._servo.angle
+
+    @angle.setter
+    def angle(self, value):
+        self._servo.angle = value
+        self._recorder.record(self._servo_id, value)
+
+    def detach(self):
+        self._servo.detach()
+        self._recorder.record(self._servo_id, None)
+
+    def __getattr__(self, name):
+        return getattr(self._servo, name)
+
+    def __setattr__(self, name, value):
+        if name == "angle":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._servo, name, value)
+
+
+_recorder = None
+
+
+def record_servo(servo, servo_id=0):
+    """環境変数 SERVO_MOTION_LOG が指定されていれば記録する RecordingServo を、無ければ servo をそのまま返す。"""
+    global _recorder
+    path = os.environ.get(ENV_PATH)
+    if not path:
+        return servo
+    if _recorder is None:
+        _recorder = MotionRecorder(path, int(os.environ.get(ENV_SIZE, DEFAULT_CAPACITY)))
+    return RecordingServo(servo, _recorder, servo_id)
+
+
+def read_records(path):
+    """区切りも含めたログの全レコードを古い順に [(時刻, servo_id, 角度 or None), ...] で返す。"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, _, capacity, count, _ = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"モーションログではありません: {path}")
+    n = min(count, capacity)
+    records = []
+    for k in range(count - n, count):
+        t, servo_id, angle = RECORD.unpack_from(data, HEADER.size + RECORD.size * (k % capacity))
+        records.append((t, servo_id, None if math.isnan(angle) else angle))
+    return records
+
+
+def read_sessions(path):
+    """ログを実行ごとに分けて [[(時刻, servo_id, 角度 or None), ...], ...] で返す (区切りのレコードは含まない)。
+
+    区切りの無い古いログでも、時刻が戻ったところ (再起動) で分ける。
+    """
+    sessions = [[]]
+    for record in read_records(path):
+        current = sessions[-1]
+        if record[1] == SESSION or (current and record[0] < current[-1][0]):
+            sessions.append([])
+        if record[1] != SESSION:
+            sessions[-1].append(record)
+    return [session for session in sessions if session]
+
+
+def read_log(path):
+    """ログの全レコード (区切りを除く) を古い順に [(時刻, servo_id, 角度 or None), ...] で返す。"""
+    return [record for session in read_sessions(path) for record in session]
+
+
+def log_info(path):
+    with open(path, "rb") as f:
+        _, _, _, capacity, count, started = HEADER.unpack(f.read(HEADER.size))
+    return {"capacity": capacity, "count": count, "started": started}
+
+
+def coalesce(records):
+    """遅れてまとめて実行するレコードを間引く。
+
+    サーボごとに、後に同じサーボの角度の指令が続く角度の指令だけを飛ばす
+    (detach と、他のサーボの指令は飛ばさない)。(実行するレコード, 飛ばした数) を返す。
+    """
+    last_move = {}
+    for i, (_, servo_id, angle) in enumerate(records):
+        if angle is not None:
+            last_move[servo_id] = i
+    kept = [record for i, record in enumerate(records)
+            if record[2] is None or last_move[record[1]] == i]
+    return kept, len(records) - len(kept)
+
+
+def replay(records, servos, speed=1.0, clock=time.monotonic, sleep=time.sleep, stats=None):
+    """1 回の実行分の records を servos ({servo_id: AngularServo}) に再生する。speed=0 なら待たずに再生。
+
+    記録時刻に遅れた場合は、その時刻までのレコードを coalesce() で間引いてまとめて実行する。
+    """
+    from deadline import JitterStats
+
+    if not records:
+        return stats
+
+    def step(record):
+        _, servo_id, angle = record
+        servo = servos.get(servo_id)
+        if servo is None:
+            return
+        if angle is None:
+            servo.detach()
+        else:
+            servo.angle = max(servo.min_angle, min(servo.max_angle, angle))
+
+    if speed <= 0:
+        for record in records:
+            step(record)
+        return stats
+    stats = stats if stats is not None else JitterStats()
+    t0 = records[0][0]
+    start = clock()
+    i = 0
+    while i < len(records):
+        deadline = start + (records[i][0] - t0) / speed
+        now = clock()
+        if now < deadline:
+            sleep(deadline - now)
+            now = clock()
+        # 時刻を過ぎているレコードをまとめて実行する
+        j = i + 1
+        while j < len(records) and start + (records[j][0] - t0) / speed <= now:
+            j += 1
+        batch, skipped = coalesce(records[i:j])
+        stats.missed += skipped
+        stats.record(now - deadline)
+        for record in batch:
+            step(record)
+        i = j
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="サーボのモーションログの表示と再生")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    dump = sub.add_parser("dump", help="ログの内容を表示する")
+    dump.add_argument("path")
+
+    rep = sub.add_parser("replay", help="ログをサーボに再生する (SERVO_PIN_FACTORY=mock でモック)")
+    rep.add_argument("path")
+    rep.add_argument("--speed", type=float, default=1.0, help="再生速度の倍率。0 で待たずに再生 (既定: 1)")
+    rep.add_argument("--pin", type=int, nargs="+", default=[18], help="servo_id 0, 1, ... に対応する GPIO 番号 (既定: 18)")
+    rep.add_argument("--min-angle", type=float, default=-90, help="サーボの最小角度 (06 は 0, 既定: -90)")
+    rep.add_argument("--max-angle", type=float, default=90, help="サーボの最大角度 (06 は 180, 既定: 90)")
+    rep.add_argument("--min-pulse-width", type=float, default=0.0005, help="最小パルス幅(秒) (既定: 0.0005)")
+    rep.add_argument("--max-pulse-width", type=float, default=0.0024, help="最大パルス幅(秒) (既定: 0.0024)")
+    args = parser.parse_args()
+
+    sessions = read_sessions(args.path)
+    records = [record for session in sessions for record in session]
+    if args.command == "dump":
+        info = log_info(args.path)
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info["started"]))
+        print(f"# 記録開始 {started}, 容量 {info['capacity']}, 書き込み総数 {info['count']}, "
+              f"表示 {len(records)} ({len(sessions)} 回の実行)")
+        for n, session in enumerate(sessions, 1):
+            # 時刻は実行ごとの開始からの秒
+            print(f"# 実行 {n}")
+            t0 = session[0][0]
+            for t, servo_id, angle in session:
+                print(f"{t - t0:10.4f}  servo={servo_id}  {'detach' if angle is None else f'{angle:.2f}'}")
+        return
+
+    from pin_factory import create_factory
+    from servo_client import open_servo
+
+    factory = create_factory()
+    # 記録した角度はキャリブレーション前の値なので、プロファイルがあれば同じように変換して再生する
+    servos = {
+        i: open_servo(pin, min_angle=args.min_angle, max_angle=args.max_angle,
+                      min_pulse_width=args.min_pulse_width, max_pulse_width=args.max_pulse_width,
+                      factory=lambda: factory, use_daemon=False)
+        for i, pin in enumerate(args.pin)
+    }
+    duration = sum(session[-1][0] - session[0][0] for session in sessions)
+    print(f"{len(records)} レコード ({len(sessions)} 回の実行, {duration:.1f}秒分) を再生します "
+          f"(速度: {'最大' if args.speed <= 0 else f'{args.speed:g}x'})")
+    start = time.perf_counter()
+    stats = None
+    try:
+        # 実行ごとに時刻の基準が違うので別々に再生し、実行の間は待たない
+        for session in sessions:
+            stats = replay(session, servos, args.speed, stats=stats)
+    except KeyboardInterrupt:
+        print("\n停止しました (Ctrl+C)")
+    finally:
+        for servo in servos.values():
+            servo.close()
+    print(f"再生時間: {time.perf_counter() - start:.2f}秒")
+    if stats is not None:
+        print(stats.format_summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""複数サーボを 1 回の pigpiod 往復でまとめて動かすエンジン。
+
+gpiozero の AngularServo は 1 台ごと・1 属性ごとに pigpiod へコマンドを送るので、
+N 台のサーボを毎ティック動かすと N 回のソケット往復が発生します。
+MultiServo は pigpiod に直接つなぎ、全サーボ分の SERVO コマンド
+(set_servo_pulsewidth) を 1 回の send にまとめて送り、応答もまとめて受け取ります。
+前回と同じパルス幅のサーボはコマンド自体を省きます。
+
+パルス幅の設定は AngularServo と同じ (min/max_pulse_width は秒, min/max_angle は度)。
+
+使用例:
+    with MultiServo({0: 18, 1: 19}, min_pulse_width=0.0005, max_pulse_width=0.0024) as ms:
+        ms.set_targets({0: -45, 1: 30})
+        ms.set_targets([0, 0])          # 配列なら servo_id の昇順に対応
+"""
+
+import os
+import socket
+import struct
+
+HEADER = struct.Struct("<IIII")
+RESPONSE = struct.Struct("<IIIi")
+
+CMD_SERVO = 8
+
+
+def angle_to_pulse_us(angle, min_angle, max_angle, min_pulse_width, max_pulse_width):
+    """角度 -> パルス幅 (µs)。AngularServo と同じ線形変換。"""
+    if not (min_angle <= angle <= max_angle):
+        raise ValueError(f"角度が範囲外です: {angle}")
+    ratio = (angle - min_angle) / (max_angle - min_angle)
+    width = min_pulse_width + ratio * (max_pulse_width - min_pulse_width)
+    return int(round(width * 1_000_000))
+
+
+class PigpioError(Exception):
+    """pigpiod が負のエラーコードを返したときの例外。"""
+
+
+class MultiServo:
+    """servo_id -> GPIO 番号 の対応を持ち、複数サーボの角度をまとめて設定する。"""
+
+    def __init__(
+        self,
+        pins,
+        min_angle=-90,
+        max_angle=90,
+        min_pulse_width=0.0005,
+        max_pulse_width=0.0024,
+        host=None,
+        port=None,
+        batched=True,
+    ):
+        # pins は {servo_id: gpio} または [gpio, ...]
+        if not isinstance(pins, dict):
+            pins = dict(enumerate(pins))
+        self.pins = dict(sorted(pins.items()))
+        self.min_angle = min_angle
+        self.max_angle = max_angle
+        self.min_pulse_width = min_pulse_width
+        self.max_pulse_width = max_pulse_width
+        # batched=False は比較用 (1 コマンドごとに応答を待つ従来方式)
+        self.batched = batched
+        self.round_trips = 0
+        self.commands_sent = 0
+        self._last_us = {}
+
+        host = host or os.environ.get("PIGPIO_ADDR", "localhost")
+        port = int(port or os.environ.get("PIGPIO_PORT", 8888))
+        self._sock = socket.create_connection((host, port))
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def angle_to_us(self, angle):
+        """角度 -> パルス幅 (µs)。"""
+        return angle_to_pulse_us(angle, self.min_angle, self.max_angle,
+                                 self.min_pulse_width, self.max_pulse_width)
+
+    def set_targets(self, targets):
+        """1 ティック分の目標角度を設定する。
+
+        targets は {servo_id: angle} または servo_id 順の配列。
+        変化のあったサーボだけを 1 回の往復で送ります。送ったコマンド数を返します。
+        """
+        if not isinstance(targets, dict):
+            targets = dict(zip(self.pins, targets))
+        commands = []
+        for servo_id, angle in targets.items():
+            gpio = self.pins[servo_id]
+            us = self.angle_to_us(angle)
+            if self._last_us.get(gpio) == us:
+                continue
+            commands.append((gpio, us))
+        if not commands:
+            return 0
+
+        if self.batched:
+            self._send(commands)
+        else:
+            for command in commands:
+                self._send([command])
+        for gpio, us in commands:
+            self._last_us[gpio] = us
+        return len(commands)
+
+    def detach(self):
+        """全サーボのパルスを止める (パルス幅 0)。"""
+        self._send([(gpio, 0) for gpio in self.pins.values()])
+        self._last_us.clear()
+
+    def close(self):
+        try:
+            self.detach()
+        finally:
+            self._sock.close()
+
+    def _send(self, commands):
+        payload = b"".join(HEADER.pack(CMD_SERVO, gpio, us, 0) for gpio, us in commands)
+        self._sock.sendall(payload)
+        expected = RESPONSE.size * len(commands)
+        buf = b""
+        while len(buf) < expected:
+            chunk = self._sock.recv(expected - len(buf))
+            if not chunk:
+                raise ConnectionError("pigpiod との接続が切断されました")
+            buf += chunk
+        self.round_trips += 1
+        self.commands_sent += len(commands)
+        for cmd, gpio, us, res in RESPONSE.iter_unpack(buf):
+            if res < 0:
+                raise PigpioError(f"set_servo_pulsewidth(gpio={gpio}, {us}us) がエラー {res} を返しました")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,22 @@
+"""サーボ用 pin factory の生成ヘルパー。
+
+通常は pigpiod に接続する PiGPIOFactory を返します。
+環境変数 SERVO_PIN_FACTORY=mock を指定すると gpiozero の MockFactory
+(PWM 対応の MockPWMPin) を返すので、Raspberry Pi や pigpiod がなくても
+Web UI やベンチマークを動かせます。
+"""
+
+import os
+
+
+def create_factory():
+    """環境変数 SERVO_PIN_FACTORY に応じた pin factory を生成する。"""
+    kind = os.environ.get("SERVO_PIN_FACTORY", "pigpio").lower()
+    if kind == "mock":
+        from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+        return MockFactory(pin_class=MockPWMPin)
+
+    from gpiozero.pins.pigpio import PiGPIOFactory
+
+    return PiGPIOFactory()
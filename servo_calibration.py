@@ -0,0 +1,242 @@
+"""サーボごとのキャリブレーション (角度 -> パルス幅の対応表) と、その高速な変換。
+
+gpiozero の AngularServo は角度をパルス幅へ線形に変換しますが、SG90 などの安価なサーボは
+角度とパルス幅の関係が線形ではありません。calibrate_servo.py で実測した何点かの
+(角度, パルス幅) をサーボごとのプロファイル (JSON) に保存し、その点を通る単調な
+3 次補間 (Fritsch-Carlson) で変換します。
+
+補間は読み込み時に LUT_STEP 度刻みの表 (LUT) にしておくので、角度の書き込みごとの変換は
+表の 1 回の参照と 2 点間の線形補間だけです。
+
+プロファイル (~/.config/rpgpiotest/calibration/<servo_id>.json, servo_id の既定は "gpio<ピン番号>"):
+    {"servo_id": "gpio18", "points": [[-90, 520], [-45, 960], [0, 1460], [45, 1930], [90, 2430]]}
+  points は [角度, パルス幅 µs]。角度はサーボの中心を 0 度とした実際の角度で、
+  スクリプトの角度の範囲 (02 の -90〜90, 06 の 0〜180 など) の中央を 0 度に合わせて使います。
+
+servo_client.open_servo() はプロファイルがあれば自動で使うので、
+02 / 03 / 04 / 041 / 05 / 06 はスクリプトを変えずにキャリブレーションが効きます。
+
+環境変数:
+  SERVO_CALIBRATION_DIR : プロファイルの置き場 (既定: ~/.config/rpgpiotest/calibration)
+  SERVO_CALIBRATION=off : プロファイルがあっても使わない (線形の AngularServo に戻す)
+"""
+
+import bisect
+import json
+import math
+import os
+
+DEFAULT_DIR = os.path.expanduser("~/.config/rpgpiotest/calibration")
+LUT_STEP = 0.1  # 度
+
+
+def calibration_dir():
+    return os.environ.get("SERVO_CALIBRATION_DIR", DEFAULT_DIR)
+
+
+def default_servo_id(pin):
+    return f"gpio{pin}"
+
+
+def profile_path(servo_id, directory=None):
+    return os.path.join(directory or calibration_dir(), f"{servo_id}.json")
+
+
+def monotone_cubic(xs, ys):
+    """(xs, ys) を通る単調な 3 次エルミート補間 (Fritsch-Carlson) の関数を返す。
+
+    ys が単調なら補間も単調になる (点の間で行き過ぎない) ので、角度 -> パルス幅が逆転しない。
+    """
+    n = len(xs)
+    slopes = [(ys[i + 1] - ys[i]) / (xs[i + 1] - xs[i]) for i in range(n - 1)]
+    if n == 2:
+        tangents = [slopes[0], slopes[0]]
+    else:
+        tangents = [slopes[0]]
+        for i in range(1, n - 1):
+            if slopes[i - 1] * slopes[i] <= 0:
+                tangents.append(0.0)
+            else:
+                # 重み付き調和平均 (区間の長さが違っても単調性を保つ)
+                h0, h1 = xs[i] - xs[i - 1], xs[i + 1] - xs[i]
+                w0, w1 = 2 * h1 + h0, h1 + 2 * h0
+                tangents.append((w0 + w1) / (w0 / slopes[i - 1] + w1 / slopes[i]))
+        tangents.append(slopes[-1])
+
+    def f(x):
+        i = min(max(bisect.bisect_right(xs, x) - 1, 0), n - 2)
+        h = xs[i + 1] - xs[i]
+        t = (x - xs[i]) / h
+        t2, t3 = t * t, t * t * t
+        return ((2 * t3 - 3 * t2 + 1) * ys[i] + (t3 - 2 * t2 + t) * h * tangents[i]
+                + (-2 * t3 + 3 * t2) * ys[i + 1] + (t3 - t2) * h * tangents[i + 1])
+
+    return f
+
+
+class Table:
+    """等間隔の表 values (start から step 刻み) を線形補間で引く。範囲外は ValueError。"""
+
+    __slots__ = ("start", "stop", "values", "_scale", "_last")
+
+    def __init__(self, start, stop, values):
+        self.start = start
+        self.stop = stop
+        self.values = values
+        self._last = len(values) - 1
+        self._scale = self._last / (stop - start)
+
+    def __call__(self, x):
+        pos = (x - self.start) * self._scale
+        if not 0 <= pos <= self._last:
+            raise ValueError(f"角度が範囲外です: {x} (キャリブレーションの範囲は {self.start:g}〜{self.stop:g})")
+        i = int(pos)
+        if i == self._last:
+            return self.values[i]
+        v = self.values[i]
+        return v + (pos - i) * (self.values[i + 1] - v)
+
+    def map(self, fn, offset=0.0):
+        """値を fn で変換し、引数を offset だけずらした表を返す。"""
+        return Table(self.start + offset, self.stop + offset, [fn(v) for v in self.values])
+
+
+class CalibrationProfile:
+    """1 台のサーボの実測点 [(角度, パルス幅 µs), ...] と、読み込み時に作る LUT。"""
+
+    def __init__(self, servo_id, points, step=LUT_STEP):
+        points = sorted((float(a), float(us)) for a, us in points)
+        if len(points) < 2:
+            raise ValueError("キャリブレーションには 2 点以上が必要です")
+        angles = [a for a, _ in points]
+        pulses = [us for _, us in points]
+        if any(a1 >= a2 for a1, a2 in zip(angles, angles[1:])):
+            raise ValueError(f"同じ角度の点が複数あります: {angles}")
+        if not (all(p1 < p2 for p1, p2 in zip(pulses, pulses[1:]))
+                or all(p1 > p2 for p1, p2 in zip(pulses, pulses[1:]))):
+            raise ValueError(f"パルス幅が角度に対して単調ではありません: {points}")
+        self.servo_id = servo_id
+        self.points = points
+        self.min_angle = angles[0]
+        self.max_angle = angles[-1]
+        self.min_pulse_us = min(pulses)
+        self.max_pulse_us = max(pulses)
+        self.interpolate = monotone_cubic(angles, pulses)
+        count = max(1, math.ceil((self.max_angle - self.min_angle) / step))
+        span = self.max_angle - self.min_angle
+        self.lut = Table(self.min_angle, self.max_angle,
+                         [self.interpolate(self.min_angle + span * i / count) for i in range(count + 1)])
+
+    def pulse_us(self, angle):
+        """角度 (中心 0 度) -> パルス幅 µs。"""
+        return self.lut(angle)
+
+    def save(self, path=None):
+        path = path or profile_path(self.servo_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 1 点 1 行で書く (手で見比べ・修正しやすいように)
+        points = ",\n".join(f"    [{a:g}, {us:g}]" for a, us in self.points)
+        with open(path, "w") as f:
+            f.write(f'{{\n  "servo_id": {json.dumps(self.servo_id)},\n  "points": [\n{points}\n  ]\n}}\n')
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["servo_id"], data["points"])
+
+
+def load_profile(servo_id):
+    """servo_id のプロファイル。無い (または SERVO_CALIBRATION=off) なら None。"""
+    if os.environ.get("SERVO_CALIBRATION", "").lower() == "off":
+        return None
+    path = profile_path(servo_id)
+    if not os.path.exists(path):
+        return None
+    return CalibrationProfile.load(path)
+
+
+class Calibration:
+    """プロファイルを、角度の範囲 min_angle〜max_angle のスクリプトで使うための変換。
+
+    servo_angle(angle) は、下の線形のサーボ (AngularServo や RemoteServo を
+    min/max_pulse_width = プロファイルのパルス幅の範囲で開いたもの) に書けば
+    プロファイルどおりのパルス幅になる角度を、LUT から 1 回の参照で返す。
+    """
+
+    def __init__(self, profile, min_angle=-90, max_angle=90):
+        self.profile = profile
+        # スクリプトの角度の範囲の中央をサーボの中心 (プロファイルの 0 度) に合わせる
+        self.offset = (min_angle + max_angle) / 2
+        self.min_angle = max(min_angle, profile.min_angle + self.offset)
+        self.max_angle = min(max_angle, profile.max_angle + self.offset)
+        self.min_pulse_width = profile.min_pulse_us / 1_000_000
+        self.max_pulse_width = profile.max_pulse_us / 1_000_000
+
+        lo, hi = profile.min_pulse_us, profile.max_pulse_us
+        span = max_angle - min_angle
+
+        def to_servo_angle(us):
+            a = min_angle + (us - lo) / (hi - lo) * span
+            # 丸め誤差で AngularServo の範囲をはみ出さないようにする
+            return min(max(a, min_angle), max_angle)
+
+        self.pulse_us = profile.lut.map(lambda us: us, self.offset)
+        self.servo_angle = profile.lut.map(to_servo_angle, self.offset)
+
+    def wrap(self, servo, initial_angle=None):
+        return CalibratedServo(servo, self, initial_angle)
+
+
+def calibration_for(pin, min_angle=-90, max_angle=90, servo_id=None):
+    """ピン (または servo_id) のプロファイルがあれば Calibration、無ければ None。"""
+    profile = load_profile(servo_id if servo_id is not None else default_servo_id(pin))
+    return Calibration(profile, min_angle, max_angle) if profile is not None else None
+
+
+class CalibratedServo:
+    """角度の書き込みをキャリブレーションの LUT で変換して、下のサーボへ渡す。それ以外はそのまま委譲する。"""
+
+    def __init__(self, servo, calibration, initial_angle=None):
+        object.__setattr__(self, "_servo", servo)
+        object.__setattr__(self, "_calibration", calibration)
+        object.__setattr__(self, "_angle", initial_angle)
+        object.__setattr__(self, "_to_servo", calibration.servo_angle)
+        object.__setattr__(self, "min_angle", calibration.min_angle)
+        object.__setattr__(self, "max_angle", calibration.max_angle)
+
+    @property
+    def calibration(self):
+        return self._calibration
+
+    @property
+    def angle(self):
+        # 下のサーボの角度は線形の換算なので、最後に書いた角度を返す (detach 中は None)
+        if self._servo.angle is None:
+            return None
+        return self._angle
+
+    @angle.setter
+    def angle(self, value):
+        if value is None:
+            self.detach()
+            return
+        self._servo.angle = self._to_servo(value)
+        object.__setattr__(self, "_angle", value)
+
+    def pulse_us(self, angle):
+        """角度 -> パルス幅 µs (wave_engine など gpiozero を通さない出力用)。"""
+        return int(round(self._calibration.pulse_us(angle)))
+
+    def detach(self):
+        self._servo.detach()
+
+    def __getattr__(self, name):
+        return getattr(self._servo, name)
+
+    def __setattr__(self, name, value):
+        if name == "angle":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._servo, name, value)
@@ -0,0 +1,155 @@
+"""servod (servo_daemon.py) のクライアント。gpiozero を import しないので数ミリ秒で使い始められます。
+
+RemoteServo は gpiozero の AngularServo と同じように angle の読み書き・detach()・close() ができます。
+open_servo() は servod が動いていれば RemoteServo を、動いていなければ従来どおり
+このプロセスで AngularServo を作って返すので、スクリプトはどちらでも同じように書けます。
+
+servo_calibration.py のプロファイル (calibrate_servo.py で作成) があれば、どちらの場合も
+角度の書き込みをプロファイルの LUT で変換する CalibratedServo で包んで返します。
+
+環境変数:
+  SERVOD_SOCKET : servod のソケット (既定: /tmp/rpgpiotest-servod.sock)
+  SERVO_DAEMON  : auto (既定, servod があれば使う) / on (servod 必須) / off (常にこのプロセスで持つ)
+
+使用例:
+    from servo_client import open_servo
+    servo = open_servo(18, min_pulse_width=0.0005, max_pulse_width=0.0024)
+    servo.angle = 45
+"""
+
+import json
+import os
+import socket
+import threading
+
+from servo_calibration import calibration_for
+
+DEFAULT_SOCKET_PATH = "/tmp/rpgpiotest-servod.sock"
+
+# open のときに送るサーボの設定 (AngularServo の引数と同じ名前)
+SERVO_CONFIG_KEYS = ("min_angle", "max_angle", "min_pulse_width", "max_pulse_width")
+
+
+class ServoDaemonError(RuntimeError):
+    """servod がエラーを返した。"""
+
+
+def socket_path():
+    return os.environ.get("SERVOD_SOCKET", DEFAULT_SOCKET_PATH)
+
+
+def _check_reply(reply):
+    if not reply["ok"]:
+        if reply.get("type") == "value":
+            raise ValueError(reply["error"])
+        raise ServoDaemonError(reply["error"])
+    return reply
+
+
+def status(path=None):
+    """servod が持っているサーボの一覧 {ピン番号(文字列): {"angle", "clients", 設定...}}。"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path or socket_path())
+        with sock.makefile("rwb") as f:
+            f.write(b'{"op": "status"}\n')
+            f.flush()
+            return _check_reply(json.loads(f.readline()))["servos"]
+
+
+class RemoteServo:
+    """servod が持つ AngularServo の代理。"""
+
+    def __init__(self, pin, min_angle=-90, max_angle=90, min_pulse_width=0.001, max_pulse_width=0.002,
+                 initial_angle=0.0, path=None):
+        self.pin = pin
+        self.min_angle = min_angle
+        self.max_angle = max_angle
+        self.min_pulse_width = min_pulse_width
+        self.max_pulse_width = max_pulse_width
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.connect(path or socket_path())
+        except OSError:
+            self._sock.close()
+            raise
+        self._file = self._sock.makefile("rwb")
+        self._call(
+            op="open", pin=pin, min_angle=min_angle, max_angle=max_angle,
+            min_pulse_width=min_pulse_width, max_pulse_width=max_pulse_width, initial_angle=initial_angle,
+        )
+
+    def _call(self, **msg):
+        with self._lock:
+            self._file.write(json.dumps(msg).encode() + b"\n")
+            self._file.flush()
+            line = self._file.readline()
+        if not line:
+            raise ConnectionError("servod との接続が切れました")
+        return _check_reply(json.loads(line)).get("angle")
+
+    @property
+    def angle(self):
+        return self._call(op="get", pin=self.pin)
+
+    @angle.setter
+    def angle(self, value):
+        self._call(op="set", pin=self.pin, angle=value)
+
+    def detach(self):
+        self._call(op="set", pin=self.pin, angle=None)
+
+    def close(self):
+        """このクライアントの参照を離す (最後のクライアントなら servod がパルスを止める)。"""
+        if self._sock is None:
+            return
+        try:
+            self._call(op="close", pin=self.pin)
+        except (OSError, ServoDaemonError):
+            pass
+        self._file.close()
+        self._sock.close()
+        self._sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_servo(pin, min_angle=-90, max_angle=90, min_pulse_width=0.001, max_pulse_width=0.002,
+               initial_angle=0.0, factory=None, use_daemon=None, calibrate=True, servo_id=None):
+    """servod があれば RemoteServo を、無ければ gpiozero の AngularServo を返す。
+
+    factory は servod を使わないときだけ呼ぶ pin factory の生成関数 (None なら gpiozero の既定)。
+    use_daemon は True / False で環境変数 SERVO_DAEMON の代わりに指定する。
+    calibrate が真で servo_id (既定: "gpio<pin>") のプロファイルがあれば、パルス幅の範囲は
+    プロファイルのものを使い、CalibratedServo で包んで返す。
+    """
+    calibration = calibration_for(pin, min_angle, max_angle, servo_id) if calibrate else None
+    if calibration is None:
+        return _open_servo(pin, min_angle, max_angle, min_pulse_width, max_pulse_width,
+                           initial_angle, factory, use_daemon)
+    servo = _open_servo(pin, min_angle, max_angle, calibration.min_pulse_width, calibration.max_pulse_width,
+                        calibration.servo_angle(initial_angle) if initial_angle is not None else None,
+                        factory, use_daemon)
+    return calibration.wrap(servo, initial_angle)
+
+
+def _open_servo(pin, min_angle, max_angle, min_pulse_width, max_pulse_width, initial_angle, factory, use_daemon):
+    mode = os.environ.get("SERVO_DAEMON", "auto").lower()
+    if use_daemon is not None:
+        mode = "on" if use_daemon else "off"
+    if mode != "off":
+        try:
+            return RemoteServo(pin, min_angle, max_angle, min_pulse_width, max_pulse_width, initial_angle)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if mode == "on":
+                raise
+
+    from gpiozero import AngularServo
+
+    return AngularServo(pin, initial_angle=initial_angle, min_angle=min_angle, max_angle=max_angle,
+                        min_pulse_width=min_pulse_width, max_pulse_width=max_pulse_width,
+                        pin_factory=factory() if factory is not None else None)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""サーボを常駐プロセスで持ち続けるデーモン (servod)。
+
+スクリプトを起動するたびに gpiozero の import, pin factory の作成 (pigpiod への接続),
+AngularServo の初期化 (サーボが initial_angle へ跳ねる) が入り、Pi Zero 2 W では起動に数秒かかります。
+また、同じサーボを 2 つのスクリプトから使うこともできません。
+
+servod は pin factory とすべての AngularServo を 1 つのプロセスで持ち続け、
+Unix ドメインソケットでコマンドを受け付けます。クライアント (servo_client.py) は gpiozero を import しないので、
+02 / 03 / 05 / 06 は servod が動いていればすぐに起動できます。
+
+プロトコル: 1 行 1 メッセージの JSON (改行区切り)
+  {"op": "open", "pin": 18, "min_angle": -90, "max_angle": 90,
+   "min_pulse_width": 0.0005, "max_pulse_width": 0.0024, "initial_angle": 0}
+  {"op": "set", "pin": 18, "angle": 45}        (angle が null なら detach)
+  {"op": "get", "pin": 18}
+  {"op": "close", "pin": 18}
+  {"op": "status"}
+応答は {"ok": true, "angle": ...} または {"ok": false, "error": "...", "type": "value" | "error"}。
+
+AngularServo はクライアントが close しても (接続が切れても) 破棄せず、最後のクライアントが離れた時点で
+detach (パルス停止) するだけです。次に open したときは初期化し直さないのでサーボは跳ねません。
+initial_angle はそのピンの AngularServo を初めて作るときだけ使います。
+同じピンを同じ設定で open すれば複数のクライアントで共有できます。
+
+使用方法:
+  python3 servo_daemon.py                           # pigpiod に接続して待ち受け
+  SERVO_PIN_FACTORY=mock python3 servo_daemon.py    # 実機なしで試す
+  python3 servo_daemon.py --socket /run/servod.sock # ソケットのパスを変える (クライアントは SERVOD_SOCKET)
+"""
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+
+from servo_client import DEFAULT_SOCKET_PATH, SERVO_CONFIG_KEYS
+
+DEFAULTS = {"min_angle": -90.0, "max_angle": 90.0, "min_pulse_width": 0.001, "max_pulse_width": 0.002}
+
+
+class _Entry:
+    def __init__(self, servo, config):
+        self.servo = servo
+        self.config = config
+        self.refs = 0
+
+
+class ServoRegistry:
+    """ピン番号 -> AngularServo を持ち、参照数が 0 になったら detach する。"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def open(self, pin, config, initial_angle=0.0):
+        from gpiozero import AngularServo
+
+        with self._lock:
+            entry = self._entries.get(pin)
+            if entry is not None and entry.config != config:
+                if entry.refs > 0:
+                    raise RuntimeError(f"GPIO {pin} は別の設定で使用中です: {entry.config}")
+                entry.servo.close()
+                entry = None
+            if entry is None:
+                servo = AngularServo(pin, initial_angle=initial_angle, pin_factory=self.factory, **config)
+                entry = self._entries[pin] = _Entry(servo, config)
+            entry.refs += 1
+            return entry.servo.angle
+
+    def release(self, pin):
+        with self._lock:
+            entry = self._entries.get(pin)
+            if entry is None or entry.refs == 0:
+                return
+            entry.refs -= 1
+            if entry.refs == 0:
+                entry.servo.detach()
+
+    def set(self, pin, angle):
+        with self._lock:
+            servo = self._servo(pin)
+            if angle is None:
+                servo.detach()
+            else:
+                servo.angle = angle
+            return servo.angle
+
+    def get(self, pin):
+        with self._lock:
+            return self._servo(pin).angle
+
+    def status(self):
+        with self._lock:
+            return {
+                str(pin): {"angle": e.servo.angle, "clients": e.refs, **e.config}
+                for pin, e in self._entries.items()
+            }
+
+    def close(self):
+        with self._lock:
+            for entry in self._entries.values():
+                entry.servo.close()
+            self._entries.clear()
+
+    def _servo(self, pin):
+        entry = self._entries.get(pin)
+        if entry is None or entry.refs == 0:
+            raise RuntimeError(f"GPIO {pin} は open されていません")
+        return entry.servo
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        registry = self.server.registry
+        opened = []
+        try:
+            for line in self.rfile:
+                try:
+                    reply = self._dispatch(registry, json.loads(line), opened)
+                except ValueError as e:
+                    # 範囲外の角度 (gpiozero の OutputDeviceBadValue) や不正な JSON
+                    reply = {"ok": False, "error": str(e), "type": "value"}
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e), "type": "error"}
+                self.wfile.write(json.dumps(reply).encode() + b"\n")
+        except ConnectionError:
+            pass
+        finally:
+            # 切断されたクライアントが open していたサーボを離す
+            for pin in opened:
+                registry.release(pin)
+
+    def _dispatch(self, registry, msg, opened):
+        op = msg.get("op")
+        if op == "set":
+            return {"ok": True, "angle": registry.set(msg["pin"], msg.get("angle"))}
+        if op == "get":
+            return {"ok": True, "angle": registry.get(msg["pin"])}
+        if op == "open":
+            pin = msg["pin"]
+            config = {k: float(msg.get(k, DEFAULTS[k])) for k in SERVO_CONFIG_KEYS}
+            angle = registry.open(pin, config, msg.get("initial_angle", 0.0))
+            opened.append(pin)
+            return {"ok": True, "angle": angle}
+        if op == "close":
+            pin = msg["pin"]
+            if pin in opened:
+                opened.remove(pin)
+                registry.release(pin)
+            return {"ok": True, "angle": None}
+        if op == "status":
+            return {"ok": True, "servos": registry.status(), "pid": os.getpid()}
+        raise ValueError(f"未知の op です: {op}")
+
+
+class ServoDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, registry, path=DEFAULT_SOCKET_PATH):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.registry = registry
+        super().__init__(path, _Handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="サーボを常駐プロセスで持つデーモン (Unix ソケット)")
+    parser.add_argument("--socket", default=os.environ.get("SERVOD_SOCKET", DEFAULT_SOCKET_PATH),
+                        help=f"待ち受ける Unix ソケット (既定: $SERVOD_SOCKET または {DEFAULT_SOCKET_PATH})")
+    args = parser.parse_args()
+
+    from pin_factory import create_factory
+
+    try:
+        factory = create_factory()
+    except Exception as e:
+        print("--- 🚨 エラー 🚨 ---")
+        print("pigpiod (pigpioデーモン) に接続できません。[ sudo pigpiod ] を実行してから起動してください。")
+        print(f"詳細: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    registry = ServoRegistry(factory)
+    # SIGTERM (systemctl stop など) でもサーボを解放してから終了する
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with ServoDaemon(registry, args.socket) as server:
+        print(f" * servod: {args.socket} で待ち受けます (pid={os.getpid()})")
+        try:
+            server.serve_forever()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            registry.close()
+            if os.path.exists(args.socket):
+                os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""サーボの状態を Server-Sent Events (GET /events) で全ブラウザへ配信する。
+
+今までは角度がページの表示時 (index() の HTML_TEMPLATE) にしか届かないので、
+2 人目の操作者はページを読み込み直すまで古い角度を見ていました。
+
+StateBroadcaster は 1 本のスレッド (producer) で状態を最大 max_rate 回/秒だけ読み、
+変わったときだけ全購読者に知らせます。購読者の数が増えても状態を読む回数は変わらず、
+各購読者は Condition で待つだけなので、変化が無い間は CPU を使いません。
+遅い購読者は途中の状態を飛ばして最新の状態だけを受け取ります。
+購読者がいない間は producer も止まります。
+
+送るイベント (data は JSON):
+  data: {"angle": 12.5, "ready": true}
+変化が無い間は keepalive 秒ごとにコメント行 (": keepalive") を送り、切断を検出します。
+
+1 本の接続が 1 スレッドを使い続けるので、スレッドを 1 本しか持たない
+04 の --workers (prefork / thread ワーカー) では使えません (501 を返します)。
+"""
+
+import json
+import threading
+import time
+
+DEFAULT_MAX_RATE = 20.0   # 回/秒
+DEFAULT_KEEPALIVE = 15.0  # 秒
+
+
+class StateBroadcaster:
+    """get_state() の結果を、変化したときだけ購読者へ配る。"""
+
+    def __init__(self, get_state, max_rate=DEFAULT_MAX_RATE, keepalive=DEFAULT_KEEPALIVE):
+        self.get_state = get_state
+        self.interval = 1.0 / max_rate
+        self.keepalive = keepalive
+        self.subscribers = 0
+        self.version = 0
+        self.polls = 0
+        self._data = None
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _read(self):
+        try:
+            state = self.get_state()
+        except Exception:
+            # 初期化前 (HardwareNotReady) や一時的なエラー
+            state = {"angle": None, "ready": False}
+        return json.dumps(state)
+
+    def _produce(self):
+        while True:
+            with self._cond:
+                if self.subscribers == 0:
+                    self._thread = None
+                    return
+            data = self._read()
+            with self._cond:
+                self.polls += 1
+                if data != self._data:
+                    self._data = data
+                    self.version += 1
+                    self._cond.notify_all()
+            time.sleep(self.interval)
+
+    def subscribe(self):
+        """購読を始め、現在の (version, data) を返す。"""
+        with self._cond:
+            self.subscribers += 1
+            if self._thread is None:
+                # producer が止まっていた間の変化を取りこぼさないよう読み直す
+                data = self._read()
+                if data != self._data:
+                    self._data = data
+                    self.version += 1
+                self._thread = threading.Thread(target=self._produce, name="servo-events", daemon=True)
+                self._thread.start()
+            return self.version, self._data
+
+    def unsubscribe(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def wait(self, version, timeout):
+        """version より新しい状態を timeout 秒まで待つ。(version, data) を返し、来なければ data は None。"""
+        with self._cond:
+            if self._cond.wait_for(lambda: self.version != version, timeout):
+                return self.version, self._data
+            return version, None
+
+    def stream(self):
+        """1 人の購読者に送る SSE のテキストを生成する。"""
+        version, data = self.subscribe()
+        try:
+            yield f"retry: 2000\nid: {version}\ndata: {data}\n\n"
+            while True:
+                version, data = self.wait(version, self.keepalive)
+                if data is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"id: {version}\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe()
+
+    def stats(self):
+        with self._cond:
+            return {"subscribers": self.subscribers, "version": self.version, "polls": self.polls}
+
+
+def add_routes(app, get_broadcaster, http_errors=None):
+    """GET /events を登録する。get_broadcaster() が None を返す構成では 501。"""
+    from flask import Response, jsonify
+
+    @app.route("/events")
+    def events():
+        broadcaster = get_broadcaster()
+        if broadcaster is None:
+            if http_errors is not None:
+                http_errors.labels("/events", "unavailable").inc()
+            return jsonify(error="events are not available with --workers"), 501
+        return Response(
+            broadcaster.stream(),
+            mimetype="text/event-stream",
+            # プロキシや nginx にバッファさせない
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
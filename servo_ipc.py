@@ -0,0 +1,227 @@
+"""ハードウェア所有プロセスと HTTP ワーカー間のローカル IPC (Unix ドメインソケット)。
+
+PiGPIOFactory の接続と AngularServo は 1 つのプロセス (ハードウェア所有プロセス)
+だけが持ち、複数の HTTP ワーカー (スレッドまたは prefork したプロセス) は
+Unix ソケット越しにコマンドを送ります。所有プロセス内では ServoWorker が
+latest-wins のキューでサーボへの書き込みを 1 本のスレッドにまとめます。
+
+メッセージ (リトルエンディアン, 固定長):
+  リクエスト REQUEST: op(uint8) servo_id(uint8) angle x100(int16)
+  応答       REPLY  : status(int8) angle x100(int16) + 統計 6 個(uint32)
+                      (queue_depth, submitted, coalesced, dropped, applied, errors)
+  status は 0 (成功), -1 (エラー), -2 (存在しない servo_id。クライアントは KeyError にする)
+"""
+
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+REQUEST = struct.Struct("<BBh")
+REPLY = struct.Struct("<bh6I")
+
+OP_MOVE = 1   # 目標角度をキューに積む
+OP_GET = 2    # 現在の角度を問い合わせる
+
+STATUS_OK = 0
+STATUS_ERROR = -1
+STATUS_UNKNOWN_SERVO = -2
+
+STAT_KEYS = ("queue_depth", "submitted", "coalesced", "dropped", "applied", "errors")
+
+DEFAULT_SOCKET_PATH = "/tmp/rpgpiotest-servo.sock"
+
+
+def _recv_exact(sock, size):
+    buf = b""
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("IPC 接続が切断されました")
+        buf += chunk
+    return buf
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        worker = self.server.worker
+        while True:
+            try:
+                op, servo_id, raw = REQUEST.unpack(_recv_exact(self.request, REQUEST.size))
+            except ConnectionError:
+                return
+            status = STATUS_OK
+            angle = 0
+            try:
+                if op == OP_MOVE:
+                    worker.submit(servo_id, raw / 100)
+                    angle = raw
+                elif op == OP_GET:
+                    angle = int(round((worker.angle(servo_id) or 0) * 100))
+                else:
+                    status = STATUS_ERROR
+            except KeyError:
+                # ServoWorker / ControlLoop と同じく、呼び出し側で 400 などにできるよう区別して返す
+                status = STATUS_UNKNOWN_SERVO
+            except Exception as e:
+                print(f"IPC エラー: {e}", file=sys.stderr)
+                status = STATUS_ERROR
+            stats = worker.stats()
+            self.request.sendall(REPLY.pack(status, angle, *(stats[k] for k in STAT_KEYS)))
+
+
+class HardwareServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ハードウェア所有プロセス側。ServoWorker へのコマンドを Unix ソケットで受け付ける。"""
+
+    daemon_threads = True
+
+    def __init__(self, worker, path=DEFAULT_SOCKET_PATH):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.worker = worker
+        super().__init__(path, _Handler)
+
+
+class HardwareClient:
+    """HTTP ワーカー側。ServoWorker と同じ submit()/stats()/angle() を提供する。
+
+    接続はスレッドごと・プロセスごとに張るので、fork 前に作っておいても安全です。
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._last_stats = dict.fromkeys(STAT_KEYS, 0)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(self.path)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _call(self, op, servo_id, angle):
+        if not 0 <= servo_id <= 0xff:
+            # REQUEST に収まらない番号のサーボは存在しない
+            raise KeyError(f"unknown servo id: {servo_id}")
+        conn = self._conn()
+        try:
+            conn.sendall(REQUEST.pack(op, servo_id, int(round(angle * 100))))
+            status, raw, *stats = REPLY.unpack(_recv_exact(conn, REPLY.size))
+        except OSError:
+            # 次の呼び出しで接続し直す
+            conn.close()
+            self._local.conn = None
+            raise
+        self._last_stats = dict(zip(STAT_KEYS, stats))
+        if status == STATUS_UNKNOWN_SERVO:
+            raise KeyError(f"unknown servo id: {servo_id}")
+        if status != STATUS_OK:
+            raise RuntimeError(f"ハードウェア所有プロセスがエラーを返しました (op={op}, servo_id={servo_id})")
+        return raw / 100
+
+    def submit(self, servo_id, angle):
+        """目標角度を送る。所有プロセス側のキューに積まれた時点で返る。"""
+        self._call(OP_MOVE, servo_id, angle)
+
+    def stats(self):
+        """最後の応答に載っていたキューの統計。"""
+        return dict(self._last_stats)
+
+    def angle(self, servo_id):
+        return self._call(OP_GET, servo_id, 0)
+
+
+def wait_for_socket(path, timeout=10.0, proc=None):
+    """所有プロセスがソケットを開くまで待つ。proc が先に終了したらエラー。"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and not proc.is_alive():
+            raise RuntimeError("ハードウェア所有プロセスが終了しました (pigpiod を確認してください)")
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(path)
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"ハードウェア所有プロセスが起動しません: {path}")
+
+
+def run_hardware_owner(init_hardware, path=DEFAULT_SOCKET_PATH):
+    """ハードウェア所有プロセスの本体。init_hardware() は ServoWorker を返す関数。"""
+    worker = init_hardware()
+    with HardwareServer(worker, path) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def serve(app, init_hardware, set_backend, host="0.0.0.0", port=8000,
+          workers=4, worker_type="process", socket_path=DEFAULT_SOCKET_PATH):
+    """ハードウェア所有プロセス 1 つ + HTTP ワーカー workers 個で app を起動する。
+
+    worker_type:
+      "process" : 待ち受けソケットを共有する prefork 方式 (各プロセス 1 スレッド)
+      "thread"  : 1 プロセス内で workers 本のスレッドが同じソケットで accept する
+    set_backend(client) は HTTP 側のモジュールに HardwareClient を設定する関数です。
+    """
+    import multiprocessing
+
+    from werkzeug.serving import make_server
+
+    ctx = multiprocessing.get_context("fork")
+    owner = ctx.Process(target=run_hardware_owner, args=(init_hardware, socket_path),
+                        name="servo-hardware-owner")
+    owner.start()
+    wait_for_socket(socket_path, proc=owner)
+    set_backend(HardwareClient(socket_path))
+
+    listener = socket.create_server((host, port))
+    listener.set_inheritable(True)
+    fd = listener.fileno()
+
+    def serve_http():
+        try:
+            make_server(host, port, app, threaded=False, fd=fd).serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    # SIGTERM (systemctl stop など) でも子プロセスを片付けてから終了する
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    print(f" * {workers} 個の HTTP ワーカー ({worker_type}) で http://{host}:{port} を待ち受けます")
+    print(f" * ハードウェア所有プロセス: pid={owner.pid}, ソケット={socket_path}")
+
+    children = []
+    try:
+        if worker_type == "thread":
+            threads = [threading.Thread(target=serve_http, daemon=True) for _ in range(workers)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        else:
+            for _ in range(workers):
+                child = ctx.Process(target=serve_http, name="servo-http-worker")
+                child.start()
+                children.append(child)
+            for child in children:
+                child.join()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for proc in children + [owner]:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join(1.0)
+        listener.close()
@@ -0,0 +1,271 @@
+"""Web サーボサーバー用の軽量なメトリクス (Prometheus テキスト形式)。
+
+prometheus_client は Pi Zero には重いので、必要な分 (カウンター・ゲージ・ヒストグラム) だけを
+自前で持ちます。記録はロック 1 回 + 配列の加算だけで、文字列の組み立ては /metrics を
+読まれたときにだけ行います。
+
+使用例:
+    registry = Registry()
+    errors = registry.counter("servo_http_errors_total", "エラー数", ["endpoint", "reason"])
+    errors.labels("/move", "invalid_angle").inc()
+    instrument_app(app, registry)   # リクエスト数・処理時間の記録と GET /metrics を追加
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+
+# 秒単位のバケット境界 (Pi Zero で数十 ms かかる書き込みまで見分けられるように)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """ラベル値ごとの子を返す (初回だけ作成)。"""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self):
+        """(ラベル値, 子) の一覧。"""
+        return list(self._children.items())
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def samples(self):
+        for values, child in self.collect():
+            yield self.name + _format_labels(self.labelnames, values), child.value
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """読まれたときに function() の値を返す (None や例外ならその系列を出さない)。"""
+        self.function = function
+
+    def get(self):
+        if self.function is None:
+            return self.value
+        try:
+            return self.function()
+        except Exception:
+            return None
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def set_function(self, function):
+        self._children[()].set_function(function)
+
+    def samples(self):
+        for values, child in self.collect():
+            value = child.get()
+            if value is not None:
+                yield self.name + _format_labels(self.labelnames, values), value
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最後は +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        """with 文で囲んだ処理の時間を記録する。"""
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class _Timer:
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+    def samples(self):
+        for values, child in self.collect():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, ("le", _format_value(float(bound))))
+                yield f"{self.name}_bucket{labels}", cumulative
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels}", total
+            yield f"{self.name}_count{labels}", cumulative
+
+
+class Registry:
+    """メトリクスの登録と Prometheus テキスト形式への書き出し。"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample, value in metric.samples():
+                lines.append(f"{sample} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def worker_gauges(registry, get_backend):
+    """ServoWorker / HardwareClient の stats() をメトリクスとして出す。
+
+    get_backend は呼ぶと現在のバックエンドを返す関数 (起動後に差し替わる場合があるため)。
+    """
+    stats = registry.gauge("servo_worker_stat", "サーボワーカーのキュー統計 (queue_depth 以外は起動からの累計)", ["stat"])
+    for key in ("queue_depth", "submitted", "coalesced", "dropped", "applied", "errors"):
+        stats.labels(key).set_function(lambda key=key: get_backend().stats().get(key))
+    return stats
+
+
+def instrument_app(app, registry):
+    """Flask アプリにリクエスト数 (ステータス別)・処理時間の記録と GET /metrics を追加する。
+
+    マルチワーカー (prefork) で動かす場合、値はワーカープロセスごとになります。
+    """
+    from flask import Response, g, request
+
+    requests_total = registry.counter(
+        "servo_http_requests_total", "HTTP リクエスト数", ["endpoint", "method", "status"])
+    duration = registry.histogram(
+        "servo_http_request_duration_seconds", "HTTP ハンドラの処理時間 (秒)", ["endpoint"])
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            duration.labels(endpoint).observe(time.perf_counter() - start)
+            requests_total.labels(endpoint, request.method, response.status_code).inc()
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    return requests_total, duration
@@ -0,0 +1,54 @@
+"""サーボ制御用のコンパクトなバイナリフレーム。
+
+1 フレーム = 3 バイト (リトルエンディアン):
+    servo_id : uint8  サーボ番号 (0 始まり)
+    angle    : int16  角度 x 100 (0.01 度単位, -327.67〜327.67)
+
+WebSocket (041_webServo_key.py の /ws) ではクライアント → サーバーが指令、
+サーバー → クライアントが「実際に設定した角度」の応答で、同じ形式を使います。
+設定に失敗した場合は angle に ANGLE_ERROR を入れて返します。
+
+UDP (servo_udp.py) では、フレームの前に送信側の通し番号を付けた 7 バイトのデータグラムを使います:
+    seq      : uint32 送信側の通し番号 (1 ずつ増やす。2^32 で 0 に戻ってよい)
+    servo_id : uint8
+    angle    : int16  角度 x 100
+"""
+
+import struct
+
+FRAME = struct.Struct("<Bh")
+FRAME_SIZE = FRAME.size
+DATAGRAM = struct.Struct("<IBh")
+DATAGRAM_SIZE = DATAGRAM.size
+
+# 失敗時の応答に使う番兵値 (int16 の最小値)
+ANGLE_ERROR = -32768
+
+
+def encode(servo_id: int, angle: float) -> bytes:
+    """(servo_id, 角度) をフレームに変換する。"""
+    return FRAME.pack(servo_id, int(round(angle * 100)))
+
+
+def decode(frame: bytes) -> tuple[int, float | None]:
+    """フレームを (servo_id, 角度) に変換する。エラー応答の角度は None。"""
+    servo_id, raw = FRAME.unpack(frame)
+    if raw == ANGLE_ERROR:
+        return servo_id, None
+    return servo_id, raw / 100
+
+
+def encode_error(servo_id: int) -> bytes:
+    """エラー応答フレームを作る。"""
+    return FRAME.pack(servo_id, ANGLE_ERROR)
+
+
+def encode_datagram(seq: int, servo_id: int, angle: float) -> bytes:
+    """(通し番号, servo_id, 角度) を UDP のデータグラムに変換する。"""
+    return DATAGRAM.pack(seq & 0xFFFFFFFF, servo_id, int(round(angle * 100)))
+
+
+def decode_datagram(datagram: bytes) -> tuple[int, int, float]:
+    """UDP のデータグラムを (通し番号, servo_id, 角度) に変換する。"""
+    seq, servo_id, raw = DATAGRAM.unpack(datagram)
+    return seq, servo_id, raw / 100
@@ -0,0 +1,297 @@
+"""キーフレームの列 (シーケンス) をサーバー側のタイミングで再生するジョブ。
+
+/move や /move_servo は 1 リクエストで 1 つの目標角度しか送れないので、
+動きを組み立てると 1 ステップごとにネットワークの往復が入り、Wi-Fi の揺らぎで動きがぶれます。
+POST /sequence はキーフレームの列を 1 回で受け取り、サーバー側で軌道 (trajectory.plan) を作って
+DeadlineExecutor の時刻どおりにワーカーへ目標角度を送ります。
+クライアントには job id を返し、GET /sequence/<id> で状態を確認、DELETE /sequence/<id> で中止できます。
+
+キーフレーム = (角度, 所要時間 duration 秒 または 速度 velocity 度/秒)。
+直前の角度 (最初はサーボの現在の角度) からその角度まで等速で動きます。
+角度が同じなら duration 秒その場で止まります。duration=0 は即移動です。
+
+リクエストの形式:
+  JSON   (Content-Type: application/json)
+    {"servo": 0, "keyframes": [{"angle": 45, "duration": 0.5}, {"angle": -45, "velocity": 90}]}
+    (キーフレームの配列だけを送ってもよい。servo の既定は 0)
+  バイナリ (Content-Type: application/octet-stream, リトルエンディアン)
+    servo_id(uint8) + キーフレーム x N
+    キーフレーム 5 バイト: 角度 x100 (int16), 種類 (uint8: 0 = duration ミリ秒, 1 = velocity 度/秒), 値 (uint16)
+
+同じサーボで新しいシーケンスを始めると、実行中のシーケンスは中止されます (latest-wins)。
+"""
+
+import itertools
+import json
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from deadline import DeadlineExecutor, JitterStats
+
+KEYFRAME = struct.Struct("<hBH")
+KIND_DURATION = 0
+KIND_VELOCITY = 1
+
+DT = 0.02                 # サーボの PWM 周期と同じ刻みで目標角度を送る
+MAX_KEYFRAMES = 256
+MAX_DURATION = 60.0       # 1 キーフレームの最大所要時間 (秒)
+MAX_VELOCITY = 1000.0     # 度/秒
+KEEP_JOBS = 32            # 終わったジョブの状態を保持する数
+
+
+class Keyframe(NamedTuple):
+    angle: float
+    duration: float | None = None
+    velocity: float | None = None
+
+
+def _check(keyframes, min_angle, max_angle):
+    if not keyframes:
+        raise ValueError("キーフレームがありません")
+    if len(keyframes) > MAX_KEYFRAMES:
+        raise ValueError(f"キーフレームが多すぎます: {len(keyframes)} > {MAX_KEYFRAMES}")
+    for i, kf in enumerate(keyframes):
+        if not (min_angle <= kf.angle <= max_angle):
+            raise ValueError(f"keyframes[{i}]: 角度が範囲外です: {kf.angle} ({min_angle}〜{max_angle})")
+        if (kf.duration is None) == (kf.velocity is None):
+            raise ValueError(f"keyframes[{i}]: duration と velocity のどちらか一方を指定してください")
+        if kf.duration is not None and not (0 <= kf.duration <= MAX_DURATION):
+            raise ValueError(f"keyframes[{i}]: duration は 0〜{MAX_DURATION:g} 秒で指定してください")
+        if kf.velocity is not None and not (0 < kf.velocity <= MAX_VELOCITY):
+            raise ValueError(f"keyframes[{i}]: velocity は 0 より大きく {MAX_VELOCITY:g} 度/秒以下で指定してください")
+    return keyframes
+
+
+def parse_json(data, min_angle=-90, max_angle=90):
+    """JSON のリクエスト本体を (servo_id, [Keyframe, ...]) に変換する。不正なら ValueError。"""
+    try:
+        body = json.loads(data)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"JSON として読めません: {e}") from None
+    servo_id = 0
+    if isinstance(body, dict):
+        servo_id = body.get("servo", 0)
+        body = body.get("keyframes")
+    if not isinstance(body, list) or not isinstance(servo_id, int) or isinstance(servo_id, bool):
+        raise ValueError('{"servo": 0, "keyframes": [{"angle": 45, "duration": 0.5}, ...]} の形式で送ってください')
+    keyframes = []
+    for i, item in enumerate(body):
+        if not isinstance(item, dict) or "angle" not in item:
+            raise ValueError(f"keyframes[{i}]: angle がありません")
+        try:
+            keyframes.append(Keyframe(
+                float(item["angle"]),
+                None if item.get("duration") is None else float(item["duration"]),
+                None if item.get("velocity") is None else float(item["velocity"]),
+            ))
+        except (TypeError, ValueError):
+            raise ValueError(f"keyframes[{i}]: 数値ではありません") from None
+    return servo_id, _check(keyframes, min_angle, max_angle)
+
+
+def parse_binary(data, min_angle=-90, max_angle=90):
+    """バイナリのリクエスト本体を (servo_id, [Keyframe, ...]) に変換する。不正なら ValueError。"""
+    if len(data) < 1 or (len(data) - 1) % KEYFRAME.size:
+        raise ValueError(f"長さが不正です: servo_id 1 バイト + {KEYFRAME.size} バイト x N で送ってください")
+    keyframes = []
+    for i, (raw, kind, value) in enumerate(KEYFRAME.iter_unpack(data[1:])):
+        if kind == KIND_DURATION:
+            keyframes.append(Keyframe(raw / 100, duration=value / 1000))
+        elif kind == KIND_VELOCITY:
+            keyframes.append(Keyframe(raw / 100, velocity=float(value)))
+        else:
+            raise ValueError(f"keyframes[{i}]: 未知の種類です: {kind}")
+    return data[0], _check(keyframes, min_angle, max_angle)
+
+
+def encode_binary(servo_id, keyframes):
+    """parse_binary() の逆。クライアントやテスト用。"""
+    out = bytearray([servo_id])
+    for kf in keyframes:
+        if kf.velocity is not None:
+            out += KEYFRAME.pack(int(round(kf.angle * 100)), KIND_VELOCITY, int(round(kf.velocity)))
+        else:
+            out += KEYFRAME.pack(int(round(kf.angle * 100)), KIND_DURATION, int(round(kf.duration * 1000)))
+    return bytes(out)
+
+
+def build_steps(start, keyframes, dt=DT):
+    """キーフレームの列を (時刻のリスト, 角度のリスト) に展開する。start が None なら最初は即移動。"""
+    # trajectory は NumPy を import するので、Web アプリの起動を遅くしないよう最初のシーケンスまで遅らせる
+    import trajectory
+
+    times, angles = [], []
+    t = 0.0
+    prev = keyframes[0].angle if start is None else start
+    for kf in keyframes:
+        distance = abs(kf.angle - prev)
+        if kf.velocity is not None:
+            duration = distance / kf.velocity
+        else:
+            duration = kf.duration
+        if distance == 0 or duration == 0:
+            # 即移動、または duration 秒その場で止まる
+            times.append(t)
+            angles.append(kf.angle)
+        else:
+            traj = trajectory.plan(prev, kf.angle, "linear", distance / duration, None, dt)
+            times.extend(t + x for x in traj.times)
+            angles.extend(traj.angles)
+        t += duration
+        prev = kf.angle
+    # 最後の停止 (duration) の終わりまでをジョブの時間とする
+    if times[-1] < t:
+        times.append(t)
+        angles.append(prev)
+    return times, angles
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class SequenceJob:
+    def __init__(self, job_id, servo_id, keyframes, times, angles):
+        self.id = job_id
+        self.servo_id = servo_id
+        self.keyframes = keyframes
+        self.times = times
+        self.angles = angles
+        self.status = "running"
+        self.error = None
+        self.step = 0
+        self.stats = JitterStats()
+        self.started = time.monotonic()
+        self.finished = None
+        self.cancel_event = threading.Event()
+
+    def to_dict(self):
+        end = self.finished if self.finished is not None else time.monotonic()
+        info = {
+            "job": self.id,
+            "servo": self.servo_id,
+            "status": self.status,
+            "keyframes": len(self.keyframes),
+            "steps": len(self.times),
+            "done_steps": self.step,
+            "duration": round(self.times[-1], 3),
+            "elapsed": round(end - self.started, 3),
+            "jitter": self.stats.summary(),
+        }
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+
+class SequenceRunner:
+    """backend (ServoWorker / servo_ipc.HardwareClient) にシーケンスを再生するジョブを管理する。"""
+
+    def __init__(self, backend, dt=DT):
+        self.backend = backend
+        self.dt = dt
+        self._ids = itertools.count(1)
+        self._jobs = OrderedDict()        # job id -> SequenceJob (古い順)
+        self._running = {}                # servo_id -> 実行中の SequenceJob
+        self._lock = threading.Lock()
+
+    def start(self, servo_id, keyframes):
+        """ジョブを開始して SequenceJob を返す。同じサーボの実行中のジョブは中止する。"""
+        current = self.backend.angle(servo_id)
+        times, angles = build_steps(current, keyframes, self.dt)
+        with self._lock:
+            job = SequenceJob(str(next(self._ids)), servo_id, keyframes, times, angles)
+            previous = self._running.get(servo_id)
+            if previous is not None:
+                previous.cancel_event.set()
+            self._running[servo_id] = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > KEEP_JOBS:
+                old_id, old = next(iter(self._jobs.items()))
+                if old.status == "running":
+                    break
+                del self._jobs[old_id]
+        threading.Thread(target=self._run, args=(job,), name=f"sequence-{job.id}", daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """ジョブを中止する。見つからなければ None。"""
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+        return job
+
+    def _run(self, job):
+        def step(angle):
+            if job.cancel_event.is_set():
+                raise _Cancelled()
+            self.backend.submit(job.servo_id, angle)
+            job.step += 1
+
+        # 待ち時間は cancel_event で待つので、中止するとすぐに抜ける
+        executor = DeadlineExecutor(job.stats, sleep=job.cancel_event.wait)
+        try:
+            executor.run(job.times, job.angles, step)
+            job.status = "done"
+        except _Cancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            print(f"シーケンスエラー (job {job.id}): {e}", file=sys.stderr)
+            job.status = "error"
+            job.error = str(e)
+        finally:
+            job.finished = time.monotonic()
+            with self._lock:
+                if self._running.get(job.servo_id) is job:
+                    del self._running[job.servo_id]
+
+
+def add_routes(app, get_runner, http_errors=None, min_angle=-90, max_angle=90):
+    """app に POST /sequence, GET /sequence/<id>, DELETE /sequence/<id> を追加する。
+
+    get_runner() は SequenceRunner を返す関数 (使えない構成では None を返すと 501)。
+    http_errors はエラー数を数える servo_metrics のカウンター (labels: endpoint, reason, 任意)。
+    """
+    from flask import jsonify, request
+
+    def error(reason, message, status):
+        if http_errors is not None:
+            http_errors.labels("/sequence", reason).inc()
+        return jsonify(error=message), status
+
+    @app.route("/sequence", methods=["POST"])
+    def start_sequence():
+        runner = get_runner()
+        if runner is None:
+            return error("unavailable", "この起動構成ではシーケンスは使えません (--worker-type thread で起動してください)", 501)
+        data = request.get_data()
+        try:
+            if request.mimetype == "application/octet-stream":
+                servo_id, keyframes = parse_binary(data, min_angle, max_angle)
+            else:
+                servo_id, keyframes = parse_json(data, min_angle, max_angle)
+        except ValueError as e:
+            return error("invalid_sequence", str(e), 400)
+        try:
+            job = runner.start(servo_id, keyframes)
+        except KeyError as e:
+            return error("invalid_sequence", f"サーボ番号が不正です: {e}", 400)
+        except Exception as e:
+            print(f"シーケンスエラー: {e}", file=sys.stderr)
+            return error("backend", str(e), 500)
+        return jsonify(job.to_dict()), 202, {"Location": f"/sequence/{job.id}"}
+
+    @app.route("/sequence/<job_id>", methods=["GET", "DELETE"])
+    def sequence_job(job_id):
+        runner = get_runner()
+        job = None if runner is None else (runner.cancel(job_id) if request.method == "DELETE" else runner.get(job_id))
+        if job is None:
+            return error("not_found", f"ジョブが見つかりません: {job_id}", 404)
+        return jsonify(job.to_dict())
@@ -0,0 +1,153 @@
+"""UDP で角度の指令を受け付ける低遅延のエンドポイント。
+
+ゲームパッドのスティックやマイコンのように、位置を連続して送り続けるクライアントでは
+最新の 1 パケットだけが意味を持つので、HTTP や TCP の接続・再送は不要な遅延になります。
+UdpListener は servo_protocol の 7 バイトのデータグラム (通し番号, servo_id, 角度) を受け取り、
+POST /move と同じ経路 (submit(servo_id, angle) -> ServoWorker / ControlLoop) に渡します。
+
+パケットの扱い:
+  - 送信元 (アドレス, servo_id) ごとに最後に受け付けた通し番号を覚え、それより古い・同じ番号は捨てる (stale)
+    (通し番号は 2^32 で 0 に戻ってよい。reset_after 秒以上途切れた送信元は番号を問わず受け付けるので、
+    クライアントを再起動して 0 から送り直しても大丈夫です)
+  - 受信バッファに溜まっていた分はまとめて読み、同じ送信元・サーボの古い方を捨てる (superseded)
+  - サイズ違い・範囲外の角度・存在しない servo_id は捨てる (invalid)
+  - ハードウェアの初期化前 (--lazy-init) は捨てる (not_ready)
+応答は返しません。現在の角度は GET /events や /metrics で確認できます。
+"""
+
+import select
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import servo_protocol
+from startup import HardwareNotReady
+
+RESET_AFTER = 1.0   # 秒
+BATCH_SIZE = 256    # 1 回にまとめて読む最大のパケット数
+MAX_SENDERS = 1024  # 通し番号を覚えておく送信元の数 (超えたら一番長く届いていない送信元を忘れる)
+SEQ_MOD = 1 << 32
+
+DROP_REASONS = ("stale", "superseded", "invalid", "not_ready", "errors")
+
+
+def is_newer(seq, last):
+    """通し番号 seq が last より新しいか (2^32 で 0 に戻るのを考慮した比較, RFC 1982)。"""
+    return 0 < (seq - last) % SEQ_MOD < SEQ_MOD // 2
+
+
+class UdpListener:
+    """UDP のデータグラムを受け取り、最新の指令だけを submit(servo_id, angle) に渡す。"""
+
+    def __init__(self, submit, port, host="0.0.0.0", min_angle=-90, max_angle=90,
+                 reset_after=RESET_AFTER, clock=time.monotonic):
+        self.submit = submit
+        self.min_angle = min_angle
+        self.max_angle = max_angle
+        self.reset_after = reset_after
+        self.clock = clock
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        # 溜まっている分を待たずに読み切るため非ブロッキング (待つのは select で)
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()
+        # (送信元アドレス, servo_id) -> (通し番号, 受信時刻)  最後に受け付けた順 = 古い順
+        self._last = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.received = 0
+        self.applied = 0
+        self.drops = dict.fromkeys(DROP_REASONS, 0)
+        self._thread = threading.Thread(target=self._run, name="servo-udp", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        self._stopped.set()
+        self._thread.join(timeout)
+        self.sock.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "received": self.received,
+                "applied": self.applied,
+                "dropped": sum(self.drops.values()),
+                **self.drops,
+            }
+
+    def _drop(self, reason):
+        with self._lock:
+            self.drops[reason] += 1
+
+    def _receive_batch(self):
+        """パケットが届くのを待ち、受信バッファに溜まっている分をまとめて読む。"""
+        # stop() を待たせないよう、0.5 秒ごとに抜けて停止を確認する
+        if not select.select([self.sock], [], [], 0.5)[0]:
+            return []
+        packets = []
+        while len(packets) < BATCH_SIZE:
+            try:
+                packets.append(self.sock.recvfrom(64))
+            except BlockingIOError:
+                break
+        return packets
+
+    def handle(self, packets):
+        """[(データグラム, 送信元), ...] を処理する。送信元・サーボごとに最新の 1 つだけを submit する。"""
+        now = self.clock()
+        latest = {}
+        with self._lock:
+            self.received += len(packets)
+        for data, addr in packets:
+            if len(data) != servo_protocol.DATAGRAM_SIZE:
+                self._drop("invalid")
+                continue
+            seq, servo_id, angle = servo_protocol.decode_datagram(data)
+            if not (self.min_angle <= angle <= self.max_angle):
+                self._drop("invalid")
+                continue
+            key = (addr, servo_id)
+            last = self._last.get(key)
+            if last is not None and now - last[1] < self.reset_after and not is_newer(seq, last[0]):
+                self._drop("stale")
+                continue
+            if last is None:
+                # 送信元を偽装したパケットが大量に来ても増え続けないよう、一番長く届いていない送信元を忘れる
+                while len(self._last) >= MAX_SENDERS:
+                    self._last.popitem(last=False)
+            else:
+                self._last.move_to_end(key)
+            self._last[key] = (seq, now)
+            if key in latest:
+                self._drop("superseded")
+            latest[key] = (servo_id, angle)
+
+        for servo_id, angle in latest.values():
+            try:
+                self.submit(servo_id, angle)
+            except HardwareNotReady:
+                self._drop("not_ready")
+            except KeyError:
+                # 存在しない servo_id
+                self._drop("invalid")
+            except Exception as e:
+                print(f"サーボエラー: {e}", file=sys.stderr)
+                self._drop("errors")
+            else:
+                with self._lock:
+                    self.applied += 1
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                packets = self._receive_batch()
+            except OSError:
+                # ソケットが閉じられた
+                break
+            if packets:
+                self.handle(packets)
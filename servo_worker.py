@@ -0,0 +1,121 @@
+"""サーボ専用ワーカースレッドと latest-wins のコマンドキュー。
+
+Web のリクエストハンドラから直接 servo.angle を書くと、pigpiod との通信が
+遅いときにリクエストがブロックされ、スライダーの連続イベントが同時書き込みとして
+積み重なります。ServoWorker はサーボへの書き込みを 1 本のスレッドに集約し、
+ハンドラはキューに目標角度を積むだけですぐに返れるようにします。
+
+キューの動作:
+  - 同じサーボへの未処理の目標があれば、新しい目標で上書きする (coalesced)
+  - キューが満杯なら、一番古い目標を捨てる (dropped)
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class QueueFull(Exception):
+    """古い目標を捨てたことを Future に伝えるための例外。"""
+
+
+class ServoWorker:
+    """servo_id -> サーボ の辞書を受け取り、1 本のスレッドで角度を書き込む。"""
+
+    def __init__(self, servos, maxsize=8, write_seconds=None):
+        self.servos = servos
+        self.maxsize = maxsize
+        # servo.angle の書き込み時間を記録するヒストグラム (servo_metrics.Histogram, 任意)
+        self.write_seconds = write_seconds
+        # servo_id -> (angle, [Future, ...])  挿入順 = 古い順
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.applied = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="servo-worker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def submit(self, servo_id, angle):
+        """目標角度をキューに積み、実際に設定した角度を返す Future を返す。
+
+        同じサーボの未処理の目標は上書きされ、その Future は新しい目標の結果で完了します。
+        """
+        if servo_id not in self.servos:
+            raise KeyError(f"unknown servo id: {servo_id}")
+        future = Future()
+        with self._cond:
+            self.submitted += 1
+            if servo_id in self._pending:
+                _, futures = self._pending.pop(servo_id)
+                self.coalesced += 1
+            else:
+                futures = []
+                if len(self._pending) >= self.maxsize:
+                    _, (_, old_futures) = self._pending.popitem(last=False)
+                    self.dropped += 1
+                    for f in old_futures:
+                        f.set_exception(QueueFull("dropped by newer commands"))
+            futures.append(future)
+            self._pending[servo_id] = (angle, futures)
+            self._cond.notify()
+        return future
+
+    def angle(self, servo_id):
+        """現在の角度 (最後に書き込んだ値)。"""
+        return self.servos[servo_id].angle
+
+    def stats(self):
+        """クライアントが負荷を判断するための統計 (レスポンスにそのまま載せる)。"""
+        with self._cond:
+            return {
+                "queue_depth": len(self._pending),
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "applied": self.applied,
+                "errors": self.errors,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                servo_id, (angle, futures) = self._pending.popitem(last=False)
+
+            servo = self.servos[servo_id]
+            try:
+                start = time.perf_counter()
+                servo.angle = angle
+                if self.write_seconds is not None:
+                    self.write_seconds.observe(time.perf_counter() - start)
+                result = servo.angle
+            except Exception as e:
+                print(f"サーボエラー: {e}", file=sys.stderr)
+                with self._cond:
+                    self.errors += 1
+                for f in futures:
+                    f.set_exception(e)
+                continue
+
+            with self._cond:
+                self.applied += 1
+            for f in futures:
+                f.set_result(result)
@@ -7,6 +7,7 @@
 # 使用方法:
 #   chmod +x setup.sh
 #   ./setup.sh
+#   WHEELHOUSE=wheelhouse ./setup.sh   # wheelhouse.py で作った wheel からオフラインでインストール
 ###############################################################################
 
 set -e  # エラーで終了
@@ -64,15 +65,23 @@ fi
 # 仮想環境を有効化
 source venv/bin/activate
 
-# pip をアップグレード
-pip install --upgrade pip
-
-# 必要なパッケージをインストール
-pip install \
-    gpiozero \
-    pigpio \
-    flask \
-    RPi.GPIO
+# wheelhouse.py で作った wheelhouse があれば、ネットワークに出ずにそこからインストール
+# (環境変数 WHEELHOUSE で場所を指定、既定は ./wheelhouse)
+WHEELHOUSE="${WHEELHOUSE:-wheelhouse}"
+if [ -f "$WHEELHOUSE/requirements.lock" ]; then
+    echo "  wheelhouse ($WHEELHOUSE) からインストールします"
+    pip install --no-index --find-links "$WHEELHOUSE" --require-hashes -r "$WHEELHOUSE/requirements.lock"
+else
+    # pip をアップグレード
+    pip install --upgrade pip
+
+    # 必要なパッケージをインストール
+    pip install \
+        gpiozero \
+        pigpio \
+        flask \
+        RPi.GPIO
+fi
 
 # 仮想環境を無効化
 deactivate
@@ -8,18 +8,33 @@ rpgiotestプロジェクト用
     python3 setup_rpi.py              # 通常実行（高速、アップデートなし）
     python3 setup_rpi.py --update      # アップデートを実行
     python3 setup_rpi.py -u            # アップデートを実行 (短縮形)
+    python3 setup_rpi.py --dry-run     # コマンドを実行せずに計画と所要時間だけ表示 (普通の Linux でも可)
+    python3 setup_rpi.py --force       # 記録を無視して全ステップを実行
+    python3 setup_rpi.py --wheelhouse wheelhouse  # wheelhouse.py で作った wheel からオフラインで pip install
 
 このスクリプトは以下の処理を自動化します:
     - システムパッケージの更新 (--update で実行可能、デフォルトはスキップ)
     - 必須Pythonライブラリのインストール
     - pigpiod の自動起動設定
     - GPIO アクセス権の設定
+
+再実行を速くするため、各ステップの内容 (コマンド・パッケージ一覧・プロジェクトのコミット) の
+ハッシュを ~/.cache/rpgpiotest/setup_state.json に記録し、前回成功したときと同じステップは飛ばします。
+互いに依存しないステップ (GPIO グループの設定と apt、apt の後の pigpiod / 仮想環境と pip / プロジェクトの更新) は
+同時に実行します。
 """
 
+import argparse
+import functools
+import hashlib
+import json
 import subprocess
 import sys
 import os
 import platform
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 # カラー出力用
 class Colors:
@@ -49,21 +64,35 @@ def print_error(text):
 def print_info(text):
     print(f"{Colors.YELLOW}ℹ {text}{Colors.ENDC}")
 
+# 並列に実行するステップの出力が 1 行の途中で混ざらないようにする
+_print_lock = threading.Lock()
+
+# --dry-run のときはコマンドを実行せずに表示だけする (DRY_RUN_DELAY 秒ずつ待って実行時間を模擬する)
+DRY_RUN = False
+DRY_RUN_DELAY = 0.0
+
 def run_command(cmd, description="", sudo=False):
     """コマンドを実行"""
     try:
         if sudo:
             cmd = f"sudo {cmd}"
-        
+
+        if DRY_RUN:
+            with _print_lock:
+                print(f"  {Colors.YELLOW}[dry-run]{Colors.ENDC} {cmd}")
+            time.sleep(DRY_RUN_DELAY)
+            return ""
         result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=True)
         if description:
-            print_success(description)
+            with _print_lock:
+                print_success(description)
         return result.stdout.strip()
     except subprocess.CalledProcessError as e:
-        if description:
-            print_error(f"{description} - {e.stderr}")
-        else:
-            print_error(f"コマンド実行エラー: {e.stderr}")
+        with _print_lock:
+            if description:
+                print_error(f"{description} - {e.stderr}")
+            else:
+                print_error(f"コマンド実行エラー: {e.stderr}")
         return None
 
 def is_raspberry_pi():
@@ -75,102 +104,297 @@ def is_raspberry_pi():
     except:
         return False
 
+PROJECT_DIR = os.path.expanduser("~/rpgpiotest")
+VENV_PATH = os.path.join(PROJECT_DIR, "venv")
+REPO_URL = "https://github.com/zorosdrone/rpgpiotest.git"
+STATE_PATH = os.path.expanduser("~/.cache/rpgpiotest/setup_state.json")
+
+APT_PACKAGES = [
+    "python3",
+    "python3-pip",
+    "python3-venv",
+    "git",
+    "pigpio",
+    "python3-pigpio",
+]
+
+PYTHON_PACKAGES = [
+    "gpiozero",
+    "pigpio",
+    "flask",
+    "RPi.GPIO",
+]
+
+
+class Step:
+    """セットアップの 1 ステップ。
+
+    commands は (コマンド, 説明, sudo) のリスト。key() はステップの内容を表す文字列
+    (パッケージ一覧やコミットなど) を返し、コマンドと合わせたハッシュが前回成功時と同じなら飛ばす。
+    key が無い (または None を返す) ステップは毎回実行する。after は先に終わっている必要があるステップの名前。
+    prepare は commands の前に実行するがハッシュには含めないコマンド (仮想環境の作成など、状況で変わるもの)。
+    missing() が True を返すとき (成果物が消えているなど) は、内容が同じでも実行する。
+    """
+
+    def __init__(self, name, title, commands, key=None, after=(), note=None, prepare=(), missing=None):
+        self.name = name
+        self.title = title
+        self.commands = commands
+        self.key = key
+        self.after = tuple(after)
+        self.note = note
+        self.prepare = list(prepare)
+        self.missing = missing
+
+    def digest(self):
+        value = self.key() if self.key is not None else None
+        if value is None:
+            return None
+        content = json.dumps([self.commands, value], ensure_ascii=False)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def run(self):
+        """全コマンドを順に実行する。失敗したら False。"""
+        for cmd, description, sudo in self.prepare + self.commands:
+            if run_command(cmd, description, sudo=sudo) is None:
+                return False
+        return True
+
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+@functools.lru_cache(maxsize=None)
+def remote_commit():
+    """GitHub の main のコミット (取得できなければ None = 毎回 pull する)。"""
+    try:
+        out = subprocess.run(["git", "ls-remote", REPO_URL, "refs/heads/main"],
+                             capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return out.stdout.split()[0] if out.returncode == 0 and out.stdout.strip() else None
+
+
+def service_ready(name):
+    """systemd のサービスが有効 (enabled) かつ起動中 (active) か。systemctl が無ければ False。"""
+    try:
+        return all(subprocess.run(["systemctl", check, "--quiet", name],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+                   for check in ("is-enabled", "is-active"))
+    except OSError:
+        return False
+
+
+def build_steps(update, wheelhouse=None):
+    """実行するステップの一覧 (依存関係つき) を作る。
+
+    wheelhouse (wheelhouse.py で作ったディレクトリ) を渡すと、pip はネットワークに出ずにそこから入れる。
+    """
+    steps = []
+    apt_after = ()
+    if update:
+        # システムアップデートは毎回実行する (内容が変わったかは apt が判断する)
+        steps.append(Step("update", "システムパッケージを更新", [
+            ("apt-get update", "apt update", True),
+            ("apt-get upgrade -y", "apt upgrade", True),
+        ], note="これには5〜10分かかる場合があります"))
+        apt_after = ("update",)
+
+    steps.append(Step("apt", "必須パッケージをインストール", [
+        (f"apt-get install -y {' '.join(APT_PACKAGES)}", "必須パッケージをインストール", True),
+    ], key=lambda: " ".join(APT_PACKAGES), after=apt_after))
+
+    # 仮想環境を作るには python3-venv が必要なので、まだ無いときだけ apt の後にする
+    # (仮想環境は PROJECT_DIR の中なので、クローンする前なら project の後にする)
+    venv_exists = os.path.exists(VENV_PATH)
+    pip_cmd = os.path.join(VENV_PATH, "bin", "pip")
+    venv_commands = [] if venv_exists else [(f"python3 -m venv {VENV_PATH}", "仮想環境を作成", False)]
+    pip_after = () if venv_exists else ("apt",) if os.path.exists(PROJECT_DIR) else ("apt", "project")
+    pip_commands = []
+    if wheelhouse is not None:
+        from wheelhouse import install_args, lock_path
+
+        pip_commands.append((f"{pip_cmd} install {' '.join(install_args(wheelhouse))}",
+                             f"Python ライブラリを wheelhouse ({wheelhouse}) からインストール", False))
+        pip_key = lambda: open(lock_path(wheelhouse)).read()
+    else:
+        pip_commands += [
+            (f"{pip_cmd} install --upgrade pip", "pip をアップグレード", False),
+            (f"{pip_cmd} install {' '.join(PYTHON_PACKAGES)}", "Python ライブラリをインストール", False),
+        ]
+        pip_key = lambda: " ".join(PYTHON_PACKAGES)
+    # 記録するのはパッケージ一覧 (ロックファイル) と Python のバージョンだけ。
+    # 仮想環境が無い・消えた場合は missing で実行する
+    steps.append(Step("pip", "Python ライブラリをインストール", pip_commands,
+                      key=lambda: f"{platform.python_version()} {pip_key()}",
+                      after=pip_after, prepare=venv_commands,
+                      missing=lambda: not os.path.exists(pip_cmd)))
+
+    # pigpiod は apt で入れる pigpio パッケージのサービス
+    steps.append(Step("pigpiod", "pigpiod サービスを設定", [
+        ("systemctl enable pigpiod", "pigpiod 自動起動有効化", True),
+        ("systemctl start pigpiod", "pigpiod を起動", True),
+    ], key=lambda: "pigpiod", after=("apt",),
+        # 後から止められた・無効にされた場合は、再実行で直す
+        missing=lambda: not service_ready("pigpiod")))
+
+    current_user = os.getenv('USER', 'pi')
+    steps.append(Step("gpio", "GPIO アクセス権を設定", [
+        (f"usermod -a -G gpio {current_user}", f"ユーザー '{current_user}' を gpio グループに追加", True),
+    ], key=lambda: current_user, note="この変更は再起動後に有効になります"))
+
+    if os.path.exists(PROJECT_DIR):
+        project_command = (f"git -C {PROJECT_DIR} pull origin main", "プロジェクトを更新", False)
+    else:
+        project_command = (f"git clone {REPO_URL} {PROJECT_DIR}", "プロジェクトをクローン", False)
+    # git は apt で入れる
+    steps.append(Step("project", "プロジェクトディレクトリを確認", [project_command], key=remote_commit,
+                      after=("apt",)))
+
+    steps.append(Step("chmod", "実行スクリプトの権限を設定", [
+        (f"cd {PROJECT_DIR} && chmod +x *.py setup.sh", "実行権限を設定しました", False),
+    ], key=remote_commit, after=("project",)))
+    return steps
+
+
+def execute(steps, state, state_path, force=False, jobs=4, dry_run=False):
+    """依存関係を守りながらステップを並列に実行し、[(名前, 状態, 秒)] を返す。
+
+    状態は done / skipped (前回と同じ内容) / failed / blocked (依存するステップが失敗)、
+    dry_run のときは実行したはずのステップが planned になる (記録は更新しない)。
+    """
+    by_name = {step.name: step for step in steps}
+    results = {}
+    lock = threading.Lock()
+
+    def run_one(step, digest):
+        with _print_lock:
+            print(f"{Colors.BOLD}{Colors.BLUE}[{step.name}]{Colors.ENDC} {step.title}...")
+            if step.note:
+                print_info(step.note)
+        start = time.monotonic()
+        ok = step.run()
+        elapsed = time.monotonic() - start
+        if ok and digest is not None and not dry_run:
+            with lock:
+                state[step.name] = digest
+                save_state(state_path, state)
+        if dry_run:
+            return step.name, "planned", elapsed
+        return step.name, ("done" if ok else "failed"), elapsed
+
+    pending = list(steps)
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for step in list(pending):
+                deps = [results.get(name) for name in step.after if name in by_name]
+                if any(d is None for d in deps):
+                    continue  # まだ終わっていない依存がある
+                pending.remove(step)
+                if any(d[0] in ("failed", "blocked") for d in deps):
+                    results[step.name] = ("blocked", 0.0)
+                    continue
+                digest = step.digest()
+                missing = step.missing is not None and step.missing()
+                if not force and not missing and digest is not None and state.get(step.name) == digest:
+                    results[step.name] = ("skipped", 0.0)
+                    with _print_lock:
+                        print(f"{Colors.CYAN}[{step.name}] {step.title}: 前回から変更なし (スキップ){Colors.ENDC}")
+                    continue
+                running[pool.submit(run_one, step, digest)] = step.name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                name, status, elapsed = future.result()
+                results[name] = (status, elapsed)
+    return [(step.name, *results[step.name]) for step in steps]
+
+
+def print_summary(results, elapsed):
+    colors = {"done": Colors.GREEN, "planned": Colors.YELLOW, "skipped": Colors.CYAN, "failed": Colors.RED, "blocked": Colors.RED}
+    print(f"{Colors.BOLD}ステップごとの所要時間:{Colors.ENDC}")
+    for name, status, seconds in results:
+        print(f"  {name:<8} {colors[status]}{status:<8}{Colors.ENDC} {seconds:7.2f}秒")
+    print(f"  合計 {elapsed:.2f}秒 (1 つずつ実行した場合 {sum(r[2] for r in results):.2f}秒)")
+    print()
+
+
 def main():
+    global DRY_RUN, DRY_RUN_DELAY
+    parser = argparse.ArgumentParser(description="Raspberry Pi GPIO テストプロジェクト セットアップ")
+    parser.add_argument("--update", "-u", action="store_true", help="システムアップデート (apt upgrade) も実行する")
+    parser.add_argument("--force", action="store_true", help="前回の記録を無視して全ステップを実行する")
+    parser.add_argument("--dry-run", action="store_true", help="コマンドを実行せず、実行するステップと所要時間だけ表示する")
+    parser.add_argument("--simulate", type=float, default=0.0, metavar="SECONDS",
+                        help="--dry-run で 1 コマンドごとに待つ秒数 (並列化の効果を確認する)")
+    parser.add_argument("--wheelhouse", metavar="DIR",
+                        help="wheelhouse.py で作った wheel からオフラインで pip install する "
+                             "(既定: ~/rpgpiotest/wheelhouse に requirements.lock があれば使う)")
+    parser.add_argument("--jobs", "-j", type=int, default=4, help="同時に実行するステップ数 (既定: 4)")
+    parser.add_argument("--state", default=STATE_PATH, help=f"ステップの記録ファイル (既定: {STATE_PATH})")
+    args = parser.parse_args()
+    DRY_RUN = args.dry_run
+    DRY_RUN_DELAY = args.simulate
+
     print_header("Raspberry Pi GPIO テストプロジェクト セットアップ")
     
-    # コマンドラインオプションの確認
     # Raspberry Pi Zero 2 W では時間がかかるため、デフォルトでスキップ
-    skip_update = not ("--update" in sys.argv or "-u" in sys.argv)
+    skip_update = not args.update
     if skip_update:
         print_info("システムアップデートをスキップします（高速化のため）")
         print_info("アップデートする場合は '--update' オプションを使用してください")
         print()
     
-    # Raspberry Pi チェック
-    if not is_raspberry_pi():
+    # Raspberry Pi チェック (--dry-run は普通の Linux でも確認できるように聞かない)
+    if not args.dry_run and not is_raspberry_pi():
         print_info("このスクリプトは Raspberry Pi 上で実行してください")
         if input("続行しますか? (y/n): ").lower() != 'y':
             print("セットアップをキャンセルしました")
             sys.exit(0)
-    
-    steps = 7
-    
-    # ステップ 1: システム更新
-    print_step(1, steps, "システムパッケージを更新中")
-    if skip_update:
-        print_info("システムアップデートをスキップしました（高速化のため）")
-        print()
-    else:
-        print_info("これには5〜10分かかる場合があります")
-        run_command("apt-get update", "apt update", sudo=True)
-        run_command("apt-get upgrade -y", "apt upgrade", sudo=True)
-    
-    # ステップ 2: 必須パッケージのインストール
-    print_step(2, steps, "必須パッケージをインストール中")
-    packages = [
-        "python3",
-        "python3-pip",
-        "python3-venv",
-        "git",
-        "pigpio",
-        "python3-pigpio",
-    ]
-    run_command(f"apt-get install -y {' '.join(packages)}", 
-                "必須パッケージをインストール", sudo=True)
-    
-    # ステップ 3: Python ライブラリのインストール（仮想環境使用）
-    print_step(3, steps, "Python ライブラリをインストール中")
-    
-    # 仮想環境を作成
-    venv_path = os.path.expanduser("~/rpgpiotest/venv")
-    if not os.path.exists(venv_path):
-        print_info("仮想環境を作成中...")
-        run_command("python3 -m venv ~/rpgpiotest/venv", 
-                   "仮想環境を作成", sudo=False)
-    
-    # 仮想環境内の pip を使用してパッケージをインストール
-    pip_cmd = os.path.expanduser("~/rpgpiotest/venv/bin/pip")
-    
-    run_command(f"{pip_cmd} install --upgrade pip", 
-               "pip をアップグレード", sudo=False)
-    
-    python_packages = [
-        "gpiozero",
-        "pigpio",
-        "flask",
-        "RPi.GPIO",
-    ]
-    run_command(f"{pip_cmd} install {' '.join(python_packages)}", 
-                "Python ライブラリをインストール", sudo=False)
-    
-    # ステップ 4: pigpiod の自動起動設定
-    print_step(4, steps, "pigpiod サービスを設定中")
-    run_command("systemctl enable pigpiod", "pigpiod 自動起動有効化", sudo=True)
-    run_command("systemctl start pigpiod", "pigpiod を起動", sudo=True)
-    
-    # ステップ 5: GPIO グループへの追加
-    print_step(5, steps, "GPIO アクセス権を設定中")
-    current_user = os.getenv('USER', 'pi')
-    run_command(f"usermod -a -G gpio {current_user}", 
-                f"ユーザー '{current_user}' を gpio グループに追加", sudo=True)
-    print_info("この変更は再起動後に有効になります")
-    
-    # ステップ 6: プロジェクトディレクトリの確認
-    print_step(6, steps, "プロジェクトディレクトリを確認中")
-    project_dir = os.path.expanduser("~/rpgpiotest")
-    if not os.path.exists(project_dir):
-        run_command("git clone https://github.com/zorosdrone/rpgpiotest.git ~/rpgpiotest",
-                   "プロジェクトをクローン", sudo=False)
-    else:
-        os.chdir(project_dir)
-        run_command("git pull origin main", "プロジェクトを更新", sudo=False)
-    print_success("プロジェクトディレクトリの確認完了")
-    
-    # ステップ 7: 実行権限の設定
-    print_step(7, steps, "実行スクリプトの権限を設定中")
-    os.chdir(project_dir)
-    subprocess.run("chmod +x *.py setup.sh", shell=True)
-    print_success("実行権限を設定しました")
+
+    wheelhouse = args.wheelhouse
+    if wheelhouse is None and os.path.isfile(os.path.join(PROJECT_DIR, "wheelhouse", "requirements.lock")):
+        wheelhouse = os.path.join(PROJECT_DIR, "wheelhouse")
+    if wheelhouse is not None:
+        wheelhouse = os.path.abspath(wheelhouse)
+        if not os.path.isfile(os.path.join(wheelhouse, "requirements.lock")):
+            print_error(f"{wheelhouse} に requirements.lock がありません (python3 wheelhouse.py で作成してください)")
+            sys.exit(1)
+        print_info(f"Python ライブラリは wheelhouse からインストールします: {wheelhouse}")
+
+    steps = build_steps(update=not skip_update, wheelhouse=wheelhouse)
+    state = load_state(args.state)
+
+    # 並列に実行すると sudo のパスワード入力が重なるので、先に 1 回だけ認証しておく
+    if not args.dry_run and any(sudo for step in steps for _, _, sudo in step.commands):
+        subprocess.run("sudo -v", shell=True)
+
+    start = time.monotonic()
+    results = execute(steps, state, args.state, force=args.force, jobs=args.jobs, dry_run=args.dry_run)
+    print()
+    print_summary(results, time.monotonic() - start)
+
+    if any(status in ("failed", "blocked") for _, status, _ in results):
+        print_error("失敗したステップがあります。上のエラーを確認して再実行してください (成功したステップは飛ばします)")
+        sys.exit(1)
+    if args.dry_run:
+        return
     
     # 完了メッセージ
     print_header("セットアップ完了！")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""サーボの電流 / 位置フィードバックを ADC で常時サンプリングして噛み込み (ストール) を検出する。
+
+指令した角度同士を比べても実際にサーボが止まっているかは分かりません。
+StallMonitor はバックグラウンドのスレッドで ADC (gpiozero の MCP3008 など、value が 0〜1 を返すもの) を
+一定周期で読み、固定長のリングバッファ (array) に書き込みます。ランプ移動のループは
+check() でバッファの最新値を見るだけなのでブロックしません。
+
+検出方法:
+  current  : 電流検出抵抗の電圧。直近 window サンプルの平均が current_limit (A) を超えたらストール
+  position : サーボ内部のポテンショメーター (位置フィードバック)。指令角との差が follow_tolerance 度を超え、
+             かつ 1 ステップでの動きが stuck_threshold 度未満の状態が stuck_max_steps 回続いたらストール
+             (stuck_threshold / stuck_max_steps は check() の呼び出し側 = ランプ移動のループが渡す)
+
+実機が無くても、記録したトレースを MockADC で再生して試せます。
+トレースは 1 行 1 サンプル (0〜1 の ADC 値) のテキストファイルで、'#' で始まる行は無視します。
+
+トレースの記録 (Raspberry Pi 上で):
+  python3 stall_sensor.py record --channel 0 --rate 200 --seconds 10 jam.txt
+"""
+
+import argparse
+import threading
+import time
+from array import array
+
+DEFAULT_RATE = 200        # サンプリング周波数 (Hz)
+DEFAULT_SIZE = 1024       # リングバッファの長さ (200 Hz で約 5 秒分)
+VREF = 3.3                # MCP3008 の基準電圧 (V)
+
+
+class SampleRing:
+    """固定長のリングバッファ。書き込みは 1 スレッドだけ、読み出しはロック無しで行う。"""
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.values = array("d", bytes(8 * size))
+        self.times = array("d", bytes(8 * size))
+        self.count = 0            # 書き込んだ総数 (書き込み後に増やすので、読み手は count 未満だけを見る)
+
+    def append(self, t, value):
+        i = self.count % self.size
+        self.values[i] = value
+        self.times[i] = t
+        self.count += 1
+
+    def latest(self):
+        """(時刻, 値) の最新のサンプル。まだ無ければ None。"""
+        n = self.count
+        if n == 0:
+            return None
+        i = (n - 1) % self.size
+        return self.times[i], self.values[i]
+
+    def mean(self, n):
+        """直近 n サンプルの平均。まだ無ければ None。"""
+        count = self.count
+        n = min(n, count, self.size)
+        if n == 0:
+            return None
+        total = 0.0
+        for k in range(count - n, count):
+            total += self.values[k % self.size]
+        return total / n
+
+
+class MockADC:
+    """記録したトレースを再生する ADC。value を読むたびに次のサンプルを返し、最後の値を保持する。"""
+
+    def __init__(self, samples, loop=False):
+        self.samples = list(samples)
+        if not self.samples:
+            raise ValueError("トレースが空です")
+        self.loop = loop
+        self._index = 0
+
+    @classmethod
+    def from_file(cls, path, loop=False):
+        return cls(load_trace(path), loop)
+
+    @property
+    def value(self):
+        i = self._index
+        if i >= len(self.samples):
+            i = i % len(self.samples) if self.loop else len(self.samples) - 1
+        self._index += 1
+        return self.samples[i]
+
+    def close(self):
+        pass
+
+
+def load_trace(path):
+    with open(path) as f:
+        return [float(line) for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+class StallMonitor:
+    """ADC をバックグラウンドでサンプリングし、check() でストールを判定する。
+
+    mode="current" のとき shunt_ohms (Ω) と current_limit (A) を使い、
+    mode="position" のとき ADC 値 feedback_min / feedback_max がそれぞれ min_angle / max_angle に対応する。
+    """
+
+    def __init__(
+        self,
+        adc,
+        mode="current",
+        rate=DEFAULT_RATE,
+        size=DEFAULT_SIZE,
+        shunt_ohms=0.5,
+        current_limit=0.8,
+        window=10,
+        min_angle=0.0,
+        max_angle=180.0,
+        feedback_min=0.0,
+        feedback_max=1.0,
+        follow_tolerance=10.0,
+    ):
+        if mode not in ("current", "position"):
+            raise ValueError(f"未知の検出方法です: {mode}")
+        self.adc = adc
+        self.mode = mode
+        self.rate = rate
+        self.ring = SampleRing(size)
+        self.shunt_ohms = shunt_ohms
+        self.current_limit = current_limit
+        self.window = window
+        self.min_angle = min_angle
+        self.max_angle = max_angle
+        self.feedback_min = feedback_min
+        self.feedback_max = feedback_max
+        self.follow_tolerance = follow_tolerance
+        self.overruns = 0         # サンプリング周期に間に合わなかった回数
+        self._prev_feedback = None
+        self._stuck_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stall-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(1.0)
+
+    def _run(self):
+        period = 1.0 / self.rate
+        next_t = time.monotonic()
+        while not self._stop.is_set():
+            self.ring.append(time.monotonic(), self.adc.value)
+            next_t += period
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # 遅れた分は取り戻さず、次の周期から数え直す
+                self.overruns += 1
+                next_t = time.monotonic()
+
+    def current(self):
+        """直近 window サンプルの平均電流 (A)。"""
+        mean = self.ring.mean(self.window)
+        return None if mean is None else mean * VREF / self.shunt_ohms
+
+    def feedback_angle(self):
+        """位置フィードバックから求めた現在の角度 (度)。"""
+        mean = self.ring.mean(self.window)
+        if mean is None:
+            return None
+        ratio = (mean - self.feedback_min) / (self.feedback_max - self.feedback_min)
+        return self.min_angle + ratio * (self.max_angle - self.min_angle)
+
+    def reset(self):
+        """移動の開始時に呼ぶ (位置フィードバックの連続カウントを戻す)。"""
+        self._prev_feedback = None
+        self._stuck_count = 0
+
+    def check(self, command, stuck_threshold=0.1, stuck_max_steps=10):
+        """指令角 command を書いた直後に呼ぶ。ストールなら理由 (文字列)、問題なければ None。"""
+        if self.mode == "current":
+            amps = self.current()
+            if amps is not None and amps > self.current_limit:
+                return f"過電流 {amps:.2f}A > {self.current_limit:g}A"
+            return None
+
+        angle = self.feedback_angle()
+        if angle is None:
+            return None
+        moved = abs(angle - self._prev_feedback) if self._prev_feedback is not None else None
+        self._prev_feedback = angle
+        if moved is not None and moved < stuck_threshold and abs(command - angle) > self.follow_tolerance:
+            self._stuck_count += 1
+            if self._stuck_count >= stuck_max_steps:
+                return f"位置が指令に追従していません (指令 {command:.1f}度, 実際 {angle:.1f}度)"
+        else:
+            self._stuck_count = 0
+        return None
+
+
+def record(channel, rate, seconds, path):
+    """MCP3008 の値を rate Hz で seconds 秒記録してトレースファイルに保存する。"""
+    from gpiozero import MCP3008
+
+    adc = MCP3008(channel=channel)
+    monitor = StallMonitor(adc, rate=rate, size=int(rate * seconds) + 1).start()
+    try:
+        time.sleep(seconds)
+    finally:
+        monitor.stop()
+        adc.close()
+    ring = monitor.ring
+    n = min(ring.count, ring.size)
+    with open(path, "w") as f:
+        f.write(f"# MCP3008 channel={channel} rate={rate}\n")
+        for k in range(ring.count - n, ring.count):
+            f.write(f"{ring.values[k % ring.size]:.5f}\n")
+    print(f"{n} サンプルを保存しました: {path} (周期に遅れた回数: {monitor.overruns})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ストール検出用 ADC のトレース記録")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="MCP3008 の値を記録する")
+    rec.add_argument("--channel", type=int, default=0, help="MCP3008 のチャンネル (既定: 0)")
+    rec.add_argument("--rate", type=float, default=DEFAULT_RATE, help=f"サンプリング周波数 Hz (既定: {DEFAULT_RATE})")
+    rec.add_argument("--seconds", type=float, default=10.0, help="記録する秒数 (既定: 10)")
+    rec.add_argument("path", help="保存先")
+    args = parser.parse_args()
+    record(args.channel, args.rate, args.seconds, args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Web サーボアプリ (04 / 041) の起動時間の計測と、ハードウェアの遅延初期化。
+
+起動時間の計測 (--profile-startup または環境変数 SERVO_STARTUP_PROFILE=1):
+  スクリプトの先頭でこのモジュールを import すると、以降の import を 1 モジュールずつ計測し
+  (python -X importtime と同じく 自身の時間 / 子を含む累積時間)、
+  profile.mark("名前") で区切ったフェーズごとの時間と合わせて profile.report() で表示します。
+  Linux ではプロセスの起動からこのモジュールの import までの時間 (インタープリターの起動) も出します。
+
+遅延初期化 (LazyInit):
+  pigpiod への接続とサーボの初期化をバックグラウンドのスレッドで行い、HTTP サーバーは先に起動します。
+  初期化が終わるまでサーボを使うリクエストは HardwareNotReady を送出し、
+  add_not_ready_handler() で登録したハンドラーが 503 {"error": "hardware not ready"} を返します。
+  接続に失敗してもプロセスは終了せず、retry_interval 秒ごとにやり直します。
+"""
+
+import os
+import sys
+import threading
+import time
+
+_T0 = time.perf_counter()
+
+
+def _process_age():
+    """プロセスが起動してからの秒数 (Linux の /proc から。分からなければ None)。"""
+    try:
+        with open("/proc/self/stat") as f:
+            # comm に空白が入る場合があるので ')' 以降を分割する。starttime は全体の 22 番目
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _ImportTimer:
+    """sys.meta_path の先頭に入り、各モジュールの exec_module() の時間を記録する。"""
+
+    def __init__(self):
+        self.records = []         # (モジュール名, 自身の秒, 累積の秒, 深さ)
+        self._stack = []          # [子の累積の秒] (実行中の import の入れ子)
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        # 組み込み・frozen モジュールのローダーはクラスそのもの (全モジュールで共有) なので包まない
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+            loader.exec_module = self._timed(name, loader.exec_module)
+        return spec
+
+    def _timed(self, name, exec_module):
+        def timed_exec_module(module):
+            self._stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                cumulative = time.perf_counter() - start
+                children = self._stack.pop()
+                if self._stack:
+                    self._stack[-1] += cumulative
+                self.records.append((name, cumulative - children, cumulative, len(self._stack)))
+
+        return timed_exec_module
+
+
+class StartupProfile:
+    """フェーズごとの起動時間と import 時間の記録。enabled でなければ何もしない。"""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.phases = []          # (名前, 秒)
+        self._last = _T0
+        self._imports = None
+        if enabled:
+            age = _process_age()
+            if age is not None:
+                self.phases.append(("Python の起動", max(0.0, age - (time.perf_counter() - _T0))))
+            self._imports = _ImportTimer()
+            sys.meta_path.insert(0, self._imports)
+
+    def mark(self, name):
+        """前回の mark() (最初はこのモジュールの import) からここまでをフェーズ name として記録する。"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def report(self, out=sys.stderr, top=15):
+        """フェーズごとの時間と、累積時間の長い import の上位 top 件を表示する。"""
+        if not self.enabled:
+            return
+        if self._imports in sys.meta_path:
+            sys.meta_path.remove(self._imports)
+        print("--- 起動時間 (--profile-startup) ---", file=out)
+        for name, seconds in self.phases:
+            print(f"  {seconds * 1000:9.1f} ms  {name}", file=out)
+        print(f"  {sum(s for _, s in self.phases) * 1000:9.1f} ms  合計 (待ち受け開始まで)", file=out)
+        records = sorted(self._imports.records, key=lambda r: r[2], reverse=True)[:top]
+        print(f"--- import 時間の上位 {len(records)} 件 (累積 / 自身) ---", file=out)
+        for name, self_time, cumulative, depth in records:
+            print(f"  {cumulative * 1000:9.1f} ms {self_time * 1000:9.1f} ms  {'  ' * depth}{name}", file=out)
+
+
+profile = StartupProfile("--profile-startup" in sys.argv or bool(os.environ.get("SERVO_STARTUP_PROFILE")))
+
+
+class HardwareNotReady(Exception):
+    """ハードウェアの初期化が終わっていない (または失敗してやり直し中)。"""
+
+
+class LazyInit:
+    """init() をバックグラウンドのスレッドで成功するまで繰り返し、結果を on_ready(結果) に渡す。"""
+
+    def __init__(self, init, on_ready, retry_interval=5.0):
+        self.init = init
+        self.on_ready = on_ready
+        self.retry_interval = retry_interval
+        self.ready = False
+        self.error = None         # 最後の失敗の内容
+        self.attempts = 0
+        self._thread = threading.Thread(target=self._run, name="hardware-init", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """初期化が終わるまで待つ。終わっていれば True。"""
+        self._thread.join(timeout)
+        return self.ready
+
+    def check(self):
+        """初期化が終わっていなければ HardwareNotReady を送出する。"""
+        if not self.ready:
+            raise HardwareNotReady(self.error or "初期化中です")
+
+    def _run(self):
+        while True:
+            self.attempts += 1
+            start = time.perf_counter()
+            try:
+                result = self.init()
+            except Exception as e:
+                self.error = str(e)
+                print(f"ハードウェアの初期化に失敗しました ({self.retry_interval:g}秒後に再試行): {e}", file=sys.stderr)
+                time.sleep(self.retry_interval)
+                continue
+            self.on_ready(result)
+            self.ready = True
+            self.error = None
+            print(f" * ハードウェアの準備ができました ({time.perf_counter() - start:.2f}秒)", file=sys.stderr)
+            return
+
+
+def add_not_ready_handler(app, http_errors=None):
+    """HardwareNotReady を 503 {"error": "hardware not ready", "detail": ...} にするハンドラーを登録する。"""
+    from flask import jsonify, request
+
+    @app.errorhandler(HardwareNotReady)
+    def hardware_not_ready(e):
+        if http_errors is not None:
+            rule = request.url_rule
+            http_errors.labels(rule.rule if rule is not None else request.path, "not_ready").inc()
+        return jsonify(error="hardware not ready", detail=str(e)), 503, {"Retry-After": "1"}
@@ -3,6 +3,8 @@ import time
 from gpiozero import AngularServo
 from gpiozero.pins.pigpio import PiGPIOFactory
 
+import trajectory
+
 
 SERVO_PIN = 18
 
@@ -22,8 +24,9 @@ def move_servo_with_timeout(
 
     current = servo.angle if servo.angle is not None else 0.0
     delta = abs(target_angle - current)
-    steps = max(1, int(delta / ramp_step))
-    theoretical = steps * ramp_delay
+    # 経路は trajectory.plan() で一括生成 (等速: ramp_step / ramp_delay 度/秒)
+    traj = trajectory.plan(current, target_angle, "linear", ramp_step / ramp_delay, None, ramp_delay)
+    theoretical = len(traj.angles) * ramp_delay
     # 実験用に「かなり厳しい」タイムアウトにする: 理論時間の半分
     timeout = theoretical * 0.5
 
@@ -34,20 +37,14 @@ def move_servo_with_timeout(
 
     start_t = time.monotonic()
     angle = current
-    step = ramp_step if target_angle > current else -ramp_step
 
-    for i in range(steps):
+    for i, angle in enumerate(traj.angles):
         elapsed = time.monotonic() - start_t
         if elapsed > timeout:
             print(f"[TIMEOUT] 経過{elapsed:.3f}s > timeout{timeout:.3f}s → サーボ解放して停止")
             servo.detach()
             return
 
-        angle += step
-        # オーバーシュート防止
-        if (step > 0 and angle > target_angle) or (step < 0 and angle < target_angle):
-            angle = target_angle
-
         servo.angle = angle
         print(f"[STEP {i}] angle={angle:.1f}, 経過{elapsed:.3f}s")
         time.sleep(ramp_delay)
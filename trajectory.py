@@ -0,0 +1,121 @@
+"""サーボ移動の角度プロファイル (軌道) をまとめて生成するモジュール。
+
+1 ステップずつ角度を足していく代わりに、移動全体の「時刻 -> 角度」を一度に計算します。
+
+プロファイル:
+  linear    : 等速 (従来の ramp_step / ramp_delay と同じ動き)
+  trapezoid : 台形速度 (一定加速度で加速 -> 等速 -> 減速)
+  scurve    : S 字 (加速度を 0 から滑らかに立ち上げる。ジャークが有限になり始動・停止の衝撃が小さい)
+
+NumPy があればベクトル演算で、無ければ純 Python で計算します。
+同じ (開始角, 目標角, 制限値) の軌道はキャッシュするので、コインプッシャーのように
+同じ往復を何千回も繰り返す場合は 2 回目以降の計算がほぼゼロになります。
+
+使用例:
+    traj = plan(20, 175, "trapezoid", max_velocity=100, max_accel=1500, dt=0.02)
+    for a in traj.angles:
+        servo.angle = a
+        sleep(0.02)
+"""
+
+import math
+from functools import lru_cache
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # Pi Zero で NumPy を入れていない場合
+    np = None
+
+PROFILES = ("linear", "trapezoid", "scurve")
+
+
+class Trajectory(NamedTuple):
+    times: tuple      # 各ステップの時刻 (秒, 移動開始から)
+    angles: tuple     # 各ステップの角度 (度)。最後の要素は必ず目標角
+    duration: float   # 移動にかかる理論時間 (秒)
+
+
+def _timing(distance, profile, max_velocity, max_accel):
+    """(到達速度, 加速時間, 移動時間) を返す。"""
+    if profile == "linear" or not max_accel:
+        return max_velocity, 0.0, distance / max_velocity
+    # 加速区間の移動量は どちらの形でも v * ta / 2。S 字は最大加速度が平均の 2 倍になる
+    shape = 1.0 if profile == "trapezoid" else 2.0
+    v = max_velocity
+    ta = shape * v / max_accel
+    if v * ta > distance:
+        # 最高速度に届かない (三角形 / 釣鐘型)
+        v = math.sqrt(distance * max_accel / shape)
+        ta = shape * v / max_accel
+    cruise = (distance - v * ta) / v
+    return v, ta, 2 * ta + cruise
+
+
+def _accel_distance(t, v, ta, profile):
+    """加速区間の開始から t 秒後までの移動量 (純 Python 版)。"""
+    if profile == "trapezoid":
+        return v * t * t / (2 * ta)
+    w = 2 * math.pi / ta
+    return (v / ta) * (t * t / 2 + (math.cos(w * t) - 1) / (w * w))
+
+
+def _positions_python(ts, distance, v, ta, total, profile):
+    out = []
+    for t in ts:
+        if ta == 0:
+            s = v * t
+        elif t < ta:
+            s = _accel_distance(t, v, ta, profile)
+        elif t > total - ta:
+            s = distance - _accel_distance(total - t, v, ta, profile)
+        else:
+            s = v * ta / 2 + v * (t - ta)
+        out.append(min(s, distance))
+    return out
+
+
+def _positions_numpy(ts, distance, v, ta, total, profile):
+    t = np.asarray(ts)
+    if ta == 0:
+        return np.minimum(v * t, distance).tolist()
+    if profile == "trapezoid":
+        def accel(x):
+            return v * x * x / (2 * ta)
+    else:
+        w = 2 * math.pi / ta
+
+        def accel(x):
+            return (v / ta) * (x * x / 2 + (np.cos(w * x) - 1) / (w * w))
+    s = np.where(
+        t < ta,
+        accel(t),
+        np.where(t > total - ta, distance - accel(np.maximum(total - t, 0.0)), v * ta / 2 + v * (t - ta)),
+    )
+    return np.minimum(s, distance).tolist()
+
+
+@lru_cache(maxsize=256)
+def plan(start, target, profile="linear", max_velocity=100.0, max_accel=None, dt=0.02):
+    """start -> target の軌道を dt 秒刻みで生成する (結果はキャッシュされる)。
+
+    max_velocity は度/秒, max_accel は度/秒^2 (linear では未使用)。
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"未知のプロファイルです: {profile} (選択肢: {', '.join(PROFILES)})")
+    if max_velocity <= 0 or dt <= 0:
+        raise ValueError("max_velocity と dt は正の値を指定してください")
+    distance = abs(target - start)
+    if distance == 0:
+        return Trajectory((0.0,), (float(target),), 0.0)
+
+    v, ta, total = _timing(distance, profile, max_velocity, max_accel)
+    steps = max(1, math.ceil(total / dt - 1e-9))
+    ts = [min(k * dt, total) for k in range(1, steps + 1)]
+    positions = _positions_numpy if np is not None else _positions_python
+    s = positions(ts, distance, v, ta, total, profile)
+
+    sign = 1.0 if target > start else -1.0
+    angles = [start + sign * x for x in s]
+    angles[-1] = float(target)  # 丸め誤差で目標に届かないのを防ぐ
+    return Trajectory(tuple(ts), tuple(angles), total)
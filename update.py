@@ -6,11 +6,30 @@ GitHub から最新コードを自動的に取得します
 
 使用方法:
     python3 update.py
+    python3 update.py --fleet fleet.txt            # 複数台をまとめて更新
+    python3 update.py --fleet fleet.txt --jobs 16 --force
+
+フリートモード (--fleet):
+    GitHub からの取得はこのマシンのローカルミラー (bare リポジトリ) に 1 回だけ行い、
+    そこから各台へ git push で配ります (最大 --jobs 台を同時に)。
+    すでに目的のコミットになっている台は push しません。
+    インベントリファイルは 1 行 1 台で「名前 git の URL」または「URL」だけを書きます ('#' 以降はコメント)。
+
+        pi-01  ssh://pi@pi-01.local/home/pi/rpgpiotest
+        pi-02  pi@pi-02.local:rpgpiotest
+        /srv/test/device-03.git                   # ローカルの bare リポジトリでも試せる
+
+    各台のチェックアウト (作業ツリーのあるリポジトリ) に push するため、各台で一度だけ
+        git config receive.denyCurrentBranch updateInstead
+    を実行しておいてください (push と同時に作業ツリーも更新されます)。
 """
 
+import argparse
 import subprocess
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 class Colors:
     HEADER = '\033[95m'
@@ -53,6 +72,118 @@ def run_command(cmd, description=""):
             print_error(f"コマンド実行エラー: {e.stderr}")
         return None
 
+def git(*args, cwd=None, timeout=None):
+    """git コマンドを実行して標準出力を返す。失敗したら RuntimeError (git のエラーメッセージ付き)。"""
+    try:
+        result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"git {args[0]} が {timeout} 秒でタイムアウトしました") from None
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        # push の出力は "To <URL>" から始まるので、エラーの行 (fatal: / error: / " ! [rejected]") を優先する
+        errors = [line.strip() for line in lines if line.startswith(("fatal:", "error:", " ! "))]
+        raise RuntimeError((errors or lines or [f"git {args[0]} が失敗しました"])[0])
+    return result.stdout.strip()
+
+
+def load_inventory(path):
+    """インベントリファイルを [(名前, URL), ...] で返す。"""
+    targets = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) == 1:
+                targets.append((fields[0], fields[0]))
+            else:
+                targets.append((fields[0], fields[1]))
+    return targets
+
+
+def sync_mirror(mirror, remote, branch):
+    """remote をローカルミラーに 1 回だけ取得し、branch のコミットを返す。"""
+    if os.path.isdir(mirror):
+        git("remote", "set-url", "origin", remote, cwd=mirror)
+        git("fetch", "--prune", "origin", cwd=mirror)
+    else:
+        git("clone", "--mirror", remote, mirror)
+    return git("rev-parse", f"refs/heads/{branch}", cwd=mirror)
+
+
+def update_target(mirror, name, url, branch, commit, force=False, timeout=None):
+    """1 台を更新して (名前, 状態, 更新前のコミット, 秒, エラー) を返す。状態は updated / skipped / failed。"""
+    start = time.monotonic()
+    before = None
+    try:
+        out = git("ls-remote", url, f"refs/heads/{branch}", timeout=timeout)
+        before = out.split()[0] if out else None
+        if before == commit:
+            return name, "skipped", before, time.monotonic() - start, None
+        refspec = f"{'+' if force else ''}{commit}:refs/heads/{branch}"
+        git("push", "--quiet", url, refspec, cwd=mirror, timeout=timeout)
+        return name, "updated", before, time.monotonic() - start, None
+    except RuntimeError as e:
+        return name, "failed", before, time.monotonic() - start, str(e)
+
+
+def fleet_main(args):
+    print_header("rpgpiotest フリート更新")
+    targets = load_inventory(args.fleet)
+    if not targets:
+        print_error(f"インベントリに更新する台がありません: {args.fleet}")
+        return 1
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    remote = args.remote
+    if not remote:
+        try:
+            remote = git("remote", "get-url", "origin", cwd=script_dir)
+        except RuntimeError as e:
+            print_error(f"取得元のリポジトリがわかりません - {e}")
+            print_info("--remote で取得元の URL を指定してください")
+            return 1
+
+    # ステップ 1: GitHub からローカルミラーへ 1 回だけ取得
+    print_step(1, 2, f"{remote} をローカルミラーに取得中")
+    start = time.monotonic()
+    try:
+        commit = sync_mirror(args.mirror, remote, args.branch)
+    except RuntimeError as e:
+        print_error(f"ミラーの更新に失敗しました - {e}")
+        return 1
+    print_success(f"{args.branch} = {commit[:10]} ({time.monotonic() - start:.1f}秒)")
+
+    # ステップ 2: ミラーから各台へ同時に push
+    print_step(2, 2, f"{len(targets)} 台を更新中 (同時に最大 {args.jobs} 台)")
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [
+            pool.submit(update_target, args.mirror, name, url, args.branch, commit, args.force, args.timeout)
+            for name, url in targets
+        ]
+        results = [future.result() for future in futures]
+    elapsed = time.monotonic() - start
+
+    print()
+    width = max(len(name) for name, *_ in results)
+    colors = {"updated": Colors.GREEN, "skipped": Colors.CYAN, "failed": Colors.RED}
+    for name, status, before, seconds, error in sorted(results, key=lambda r: r[3], reverse=True):
+        change = f"{before[:10] if before else '(なし)'} -> {commit[:10]}" if status == "updated" else ""
+        print(f"  {name:<{width}}  {colors[status]}{status:<8}{Colors.ENDC} {seconds:6.2f}秒  {change}{error or ''}")
+    counts = {s: sum(1 for r in results if r[1] == s) for s in ("updated", "skipped", "failed")}
+    print()
+    print(
+        f"{Colors.BOLD}更新 {counts['updated']} 台, 更新済み {counts['skipped']} 台, 失敗 {counts['failed']} 台"
+        f"  (所要 {elapsed:.1f}秒, 1 台ずつなら合計 {sum(r[3] for r in results):.1f}秒){Colors.ENDC}"
+    )
+    if counts["failed"]:
+        print_info("失敗した台は、各台で git config receive.denyCurrentBranch updateInstead を設定したか、"
+                   "作業ツリーに未コミットの変更が無いかを確認してください (履歴が分かれている場合は --force)")
+        return 1
+    return 0
+
+
 def main():
     print_header("rpgpiotest プロジェクト更新スクリプト")
     
@@ -88,7 +219,22 @@ def main():
     print()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="rpgpiotest プロジェクト更新スクリプト")
+    parser.add_argument("--fleet", metavar="INVENTORY", help="インベントリファイルの全台をまとめて更新する")
+    parser.add_argument("--jobs", "-j", type=int, default=8, help="同時に更新する台数 (既定: 8)")
+    parser.add_argument("--remote", help="取得元の URL (既定: このチェックアウトの origin)")
+    parser.add_argument("--branch", default="main", help="配るブランチ (既定: main)")
+    parser.add_argument(
+        "--mirror",
+        default=os.path.expanduser("~/.cache/rpgpiotest-mirror.git"),
+        help="ローカルミラーの場所 (既定: ~/.cache/rpgpiotest-mirror.git)",
+    )
+    parser.add_argument("--force", "-f", action="store_true", help="履歴が分かれている台も強制的に上書きする")
+    parser.add_argument("--timeout", type=float, default=120, help="1 台あたりの git のタイムアウト秒 (既定: 120)")
+    args = parser.parse_args()
     try:
+        if args.fleet:
+            sys.exit(fleet_main(args))
         main()
     except KeyboardInterrupt:
         print(f"\n{Colors.YELLOW}更新をキャンセルしました{Colors.ENDC}")
@@ -0,0 +1,134 @@
+"""pigpio の DMA 波形 (wave) でサーボ移動を再生するエンジン。
+
+ランプ移動を Python のループで 20 ms ごとに書き込むと、GIL や GC の一時停止が
+そのままサーボのカクつきになります。このモジュールは移動全体 (またはコインプッシャーの
+往復サイクル全体) を 1 フレーム = 「パルス幅 µs だけ High -> 残りを Low」の
+パルス列に変換し、pigpiod に wave / wave chain としてまとめて渡します。
+再生は pigpiod の DMA が行い、Python は終了を待つだけです。
+
+  - 移動: trajectory.plan() の軌道を 1 フレーム (20 ms) 刻みで 1 つの wave に変換
+  - 待ち (保持): 1 フレーム分の wave を chain のループで繰り返す
+  - 往復 × loops 回: chain のループで繰り返す (pigpiod 側で完結)
+"""
+
+import time
+
+import pigpio
+
+import trajectory
+from multi_servo import angle_to_pulse_us
+
+FRAME_US = 20000        # サーボの PWM 周期 (50 Hz)
+FRAME_S = FRAME_US / 1_000_000
+MAX_LOOP = 65535        # chain のループ回数の上限 (x + y * 256)
+
+
+class ServoWave:
+    """1 台のサーボ用の wave を組み立てて pigpiod で再生する。"""
+
+    def __init__(self, pi, gpio, min_angle=-90, max_angle=90,
+                 min_pulse_width=0.0005, max_pulse_width=0.0024, pulse_us=None):
+        self.pi = pi
+        self.gpio = gpio
+        self.min_angle = min_angle
+        self.max_angle = max_angle
+        self.min_pulse_width = min_pulse_width
+        self.max_pulse_width = max_pulse_width
+        # 角度 -> パルス幅 µs (キャリブレーション済みのサーボの pulse_us など)。None なら線形
+        self.pulse_us = pulse_us
+        self._waves = {}   # キー -> wave id (同じ移動は 1 つの wave を使い回す)
+
+    def frame_pulses(self, angle):
+        """1 フレーム分のパルス (High, Low) を返す。"""
+        if self.pulse_us is not None:
+            us = self.pulse_us(angle)
+        else:
+            us = angle_to_pulse_us(angle, self.min_angle, self.max_angle,
+                                   self.min_pulse_width, self.max_pulse_width)
+        mask = 1 << self.gpio
+        return [pigpio.pulse(mask, 0, us), pigpio.pulse(0, mask, FRAME_US - us)]
+
+    def move_pulses(self, start, target, profile="linear", max_velocity=None, max_accel=None):
+        """start -> target の移動をフレーム列に変換する。max_velocity が None なら即移動。"""
+        if max_velocity is None or start == target:
+            angles = (target,)
+        else:
+            angles = trajectory.plan(start, target, profile, max_velocity, max_accel, FRAME_S).angles
+        pulses = []
+        for a in angles:
+            pulses.extend(self.frame_pulses(a))
+        return pulses
+
+    def _wave(self, key, pulses):
+        wid = self._waves.get(key)
+        if wid is None:
+            self.pi.wave_add_generic(pulses)
+            wid = self.pi.wave_create()
+            self._waves[key] = wid
+        return wid
+
+    def move(self, start, target, profile="linear", max_velocity=None, max_accel=None):
+        """移動用の wave id を返す。"""
+        key = ("move", start, target, profile, max_velocity, max_accel)
+        return self._wave(key, self.move_pulses(start, target, profile, max_velocity, max_accel))
+
+    def hold(self, angle, seconds):
+        """angle を seconds 秒保持する chain 断片を返す。"""
+        wid = self._wave(("hold", angle), self.frame_pulses(angle))
+        return repeat([wid], max(1, round(seconds / FRAME_S)))
+
+    def prepare(self):
+        """wave を作り直す前に既存の wave を全て消し、ピンを出力にする。"""
+        self.pi.wave_tx_stop()
+        self.pi.wave_clear()
+        self._waves.clear()
+        self.pi.set_mode(self.gpio, pigpio.OUTPUT)
+
+    def play(self, chain, poll=0.05):
+        """chain を送信し、再生が終わるまで待つ。Ctrl+C で再生を止める。"""
+        self.pi.wave_chain(chain)
+        try:
+            while self.pi.wave_tx_busy():
+                time.sleep(poll)
+        except KeyboardInterrupt:
+            self.pi.wave_tx_stop()
+            raise
+
+    def stop(self):
+        self.pi.wave_tx_stop()
+        self.pi.write(self.gpio, 0)
+
+
+def repeat(body, count):
+    """chain の断片 body を count 回繰り返す (count が None なら無限)。"""
+    if count is None:
+        return [255, 0] + body + [255, 3]
+    if count <= 0:
+        return []
+    if count == 1:
+        return list(body)
+    chain = []
+    while count > 0:
+        n = min(count, MAX_LOOP)
+        chain += [255, 0] + body + [255, 1, n & 0xFF, n >> 8]
+        count -= n
+    return chain
+
+
+def coin_cycle_chain(sw, current, angle1, angle2, wait_time, loops,
+                     profile="linear", max_velocity=None, max_accel=None):
+    """06_coinpushout.py の run() と同じ動きを 1 本の chain にする。
+
+    current -> angle2 へ移動して待ち、その後 loops 回 angle1 へ往復する
+    (最後は angle1 で待って終わる)。loops が None なら無限に繰り返す。
+    """
+    opts = (profile, max_velocity, max_accel)
+    go = [sw.move(angle2, angle1, *opts)] + sw.hold(angle1, wait_time)
+    back = [sw.move(angle1, angle2, *opts)] + sw.hold(angle2, wait_time)
+
+    chain = [sw.move(current, angle2, *opts)] + sw.hold(angle2, wait_time)
+    if loops is None:
+        chain += repeat(go + back, None)
+    else:
+        chain += repeat(go + back, loops - 1) + go
+    return chain
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""
+ローカルの wheelhouse (ビルド済み wheel の置き場) を作るスクリプト
+
+setup_rpi.py / setup.sh は毎回ネットワークから gpiozero, pigpio, flask, RPi.GPIO を pip install し、
+RPi.GPIO は Raspberry Pi 上でソースからコンパイルされるため時間がかかります。
+一度だけ wheel を作っておけば、以降の台は --no-index でローカルのディレクトリからすぐに入れられます。
+
+使用方法:
+    python3 wheelhouse.py                                  # このマシン用の wheel を ./wheelhouse に作る
+    python3 wheelhouse.py --platform linux_armv7l --python-version 3.11
+                                                           # 普通の Linux で Pi 用の wheel を piwheels から集める
+    python3 wheelhouse.py --platform linux_aarch64 --python-version 3.11 --add
+                                                           # 別のアーキテクチャの wheel を追加する
+
+作った wheelhouse はプロジェクトと一緒にコピーし、セットアップで使います:
+    python3 setup_rpi.py --wheelhouse wheelhouse
+    WHEELHOUSE=wheelhouse ./setup.sh
+
+wheelhouse には wheel と、全 wheel の sha256 を書いた requirements.lock ができます。
+インストールは pip install --no-index --find-links wheelhouse --require-hashes -r wheelhouse/requirements.lock で、
+ネットワークに出ず、ハッシュが一致しない wheel は入りません。
+ネットワークから入れる場合との時間の比較は bench_wheelhouse.py で測れます。
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from setup_rpi import PYTHON_PACKAGES, Colors, print_error, print_info, print_success
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wheelhouse")
+LOCK_NAME = "requirements.lock"
+
+# Raspberry Pi OS 用のビルド済み wheel (RPi.GPIO など PyPI に wheel が無いものもある)
+PIWHEELS_URL = "https://www.piwheels.org/simple"
+
+
+def lock_path(directory):
+    return os.path.join(directory, LOCK_NAME)
+
+
+def install_args(directory):
+    """wheelhouse からオフラインで入れる pip install の引数。"""
+    return ["--no-index", "--find-links", directory, "--require-hashes", "-r", lock_path(directory)]
+
+
+def has_lock(directory):
+    return directory is not None and os.path.isfile(lock_path(directory))
+
+
+def _canonical(name):
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def write_lock(directory):
+    """ディレクトリの全 wheel から「名前==バージョン --hash=sha256:...」の一覧を作る。
+
+    同じパッケージの別プラットフォームの wheel はハッシュを並べ (pip はどれか 1 つと一致すればよい)、
+    同じパッケージでバージョンが違う wheel があれば ValueError。
+    """
+    hashes = defaultdict(list)
+    versions = defaultdict(set)
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".whl"):
+            continue
+        # 名前-バージョン(-ビルド)-python-abi-プラットフォーム.whl
+        name, version = filename.split("-")[:2]
+        with open(os.path.join(directory, filename), "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        hashes[_canonical(name)].append(digest)
+        versions[_canonical(name)].add(version)
+    if not hashes:
+        raise ValueError(f"{directory} に wheel がありません")
+    lines = []
+    for name in sorted(hashes):
+        if len(versions[name]) > 1:
+            raise ValueError(f"{name} のバージョンが混在しています: {sorted(versions[name])} (--add を付けずに作り直してください)")
+        (version,) = versions[name]
+        lines.append(f"{name}=={version} " + " ".join(f"--hash=sha256:{h}" for h in hashes[name]))
+    with open(lock_path(directory), "w") as f:
+        f.write("# wheelhouse.py で生成 (手で編集しないでください)\n")
+        f.write("\n".join(lines) + "\n")
+    return len(lines)
+
+
+def build(directory, packages, platform=None, python_version=None, add=False):
+    """wheel を directory に集めて requirements.lock を書く。"""
+    os.makedirs(directory, exist_ok=True)
+    if not add:
+        for filename in os.listdir(directory):
+            if filename.endswith(".whl"):
+                os.remove(os.path.join(directory, filename))
+
+    if platform is None:
+        # このマシンのアーキテクチャ・Python 用にビルドする (sdist しか無いものはここでコンパイル)
+        cmd = [sys.executable, "-m", "pip", "wheel", "--wheel-dir", directory, *packages]
+    else:
+        # 別の環境用はコンパイルできないので、ビルド済みの wheel だけを集める
+        cmd = [
+            sys.executable, "-m", "pip", "download", "--dest", directory,
+            "--only-binary=:all:", "--platform", platform, "--extra-index-url", PIWHEELS_URL,
+        ]
+        if python_version:
+            cmd += ["--python-version", python_version]
+        cmd += packages
+    subprocess.run(cmd, check=True)
+    return write_lock(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ハッシュ固定のローカル wheelhouse を作る")
+    parser.add_argument("--dir", default=DEFAULT_DIR, help=f"wheelhouse のディレクトリ (既定: {DEFAULT_DIR})")
+    parser.add_argument("--platform", help="別の環境用に集める (例: linux_armv7l, linux_aarch64)。省略時はこのマシン用にビルド")
+    parser.add_argument("--python-version", help="--platform と一緒に使う対象の Python (例: 3.11)")
+    parser.add_argument("--add", action="store_true", help="既存の wheel を消さずに追加する (複数アーキテクチャ用)")
+    parser.add_argument("packages", nargs="*", help=f"入れるパッケージ (既定: {' '.join(PYTHON_PACKAGES)})")
+    args = parser.parse_args()
+
+    packages = args.packages or PYTHON_PACKAGES
+    print_info(f"{args.dir} に wheel を作成します: {' '.join(packages)}")
+    start = time.monotonic()
+    try:
+        count = build(args.dir, packages, args.platform, args.python_version, args.add)
+    except subprocess.CalledProcessError:
+        print_error("pip が失敗しました (上の出力を確認してください)")
+        sys.exit(1)
+    except ValueError as e:
+        print_error(str(e))
+        sys.exit(1)
+    print_success(f"{count} パッケージを {lock_path(args.dir)} に固定しました ({time.monotonic() - start:.1f}秒)")
+    print(f"{Colors.BOLD}インストール:{Colors.ENDC} pip install {' '.join(install_args(args.dir))}")
+
+
+if __name__ == "__main__":
+    main()